@@ -12,7 +12,8 @@ from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import (
     accuracy_score, classification_report, confusion_matrix, 
-    roc_auc_score, f1_score, precision_score, recall_score, balanced_accuracy_score
+    roc_auc_score, f1_score, precision_score, recall_score, balanced_accuracy_score,
+    brier_score_loss
 )
 from sklearn.impute import SimpleImputer
 from sklearn.calibration import CalibratedClassifierCV
@@ -20,8 +21,26 @@ from xgboost import XGBClassifier
 import joblib
 import json
 import os
+import argparse
+import importlib.util
 from log_info import logger, initialize_logger
 
+parser = argparse.ArgumentParser(description="Reentrenamiento del modelo de dislexia")
+parser.add_argument(
+    '--serving-model', action='store_true',
+    help="Guardar un único booster con un mapa isotónico fusionado en lugar del ensemble de 5 folds"
+)
+args = parser.parse_args()
+
+DECISION_THRESHOLD = 0.40
+
+# Kernel de features temporales compartido con el backend (solo depende de NumPy)
+_kernel_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'web', 'backend', 'app', 'models', 'temporal_features.py')
+_kernel_spec = importlib.util.spec_from_file_location('temporal_features', _kernel_path)
+temporal_features = importlib.util.module_from_spec(_kernel_spec)
+_kernel_spec.loader.exec_module(temporal_features)
+
 initialize_logger()
 logger.print_header("REENTRENAMIENTO DEL MODELO - CALIBRADO PARA LA APP")
 
@@ -65,75 +84,33 @@ logger.print_phase_imputation(X.isnull().sum().sum(), X_imputed.isnull().sum().s
 logger.print_section("FEATURE ENGINEERING TEMPORAL")
 X_final = X_imputed.copy()
 
-# Tendencias de accuracy
-accuracy_cols = sorted([col for col in X_imputed.columns if 'Accuracy' in col])[:32]
-if accuracy_cols:
-    accuracy_trend = []
-    accuracy_first = []
-    accuracy_second = []
-    accuracy_improve = []
-    
-    for idx in range(len(X_imputed)):
-        values = X_imputed.iloc[idx][accuracy_cols].values
-        
-        if len(values) > 1 and np.sum(~np.isnan(values)) > 1:
-            valid_mask = ~np.isnan(values)
-            valid_idx = np.where(valid_mask)[0]
-            valid_vals = values[valid_mask]
-            if len(valid_vals) > 1:
-                coeffs = np.polyfit(valid_idx, valid_vals, 1)
-                trend = float(coeffs[0])
-            else:
-                trend = 0.0
-        else:
-            trend = 0.0
-        
-        accuracy_trend.append(trend)
-        
-        first_half = np.nanmean(values[:16]) if len(values) > 0 else 0.0
-        second_half = np.nanmean(values[16:32]) if len(values) > 16 else 0.0
-        
-        accuracy_first.append(first_half)
-        accuracy_second.append(second_half)
-        accuracy_improve.append(second_half - first_half)
-    
-    X_final['accuracy_trend'] = accuracy_trend
-    X_final['accuracy_mean_first_half'] = accuracy_first
-    X_final['accuracy_mean_second_half'] = accuracy_second
-    X_final['accuracy_improvement'] = accuracy_improve
-    logger.print_success("Tendencias de accuracy calculadas")
-
-# Variabilidad de clicks
-clicks_cols = sorted([col for col in X_imputed.columns if 'Clicks' in col])[:32]
-if clicks_cols:
-    X_final['clicks_variability'] = X_imputed[clicks_cols].std(axis=1)
-    X_final['clicks_total'] = X_imputed[clicks_cols].sum(axis=1)
-    logger.print_success("Variabilidad de clicks calculada")
-
-# Ratios globales
-misses_cols = sorted([col for col in X_imputed.columns if 'Misses' in col])[:32]
-hits_cols = sorted([col for col in X_imputed.columns if 'Hits' in col])[:32]
-if misses_cols and hits_cols:
-    total_misses = X_imputed[misses_cols].sum(axis=1)
-    total_hits = X_imputed[hits_cols].sum(axis=1)
-    
-    X_final['global_accuracy'] = total_hits / (total_hits + total_misses + 1e-8)
-    max_misses = X_imputed[misses_cols].max(axis=1)
-    X_final['error_concentration'] = max_misses / (total_misses + 1e-8)
-    
-    consistency_list = []
-    for idx in range(len(X_imputed)):
-        acc_row = X_imputed.iloc[idx][accuracy_cols].values
-        valid_acc = acc_row[~np.isnan(acc_row)]
-        if len(valid_acc) > 1 and np.mean(valid_acc) > 0:
-            cv = np.std(valid_acc) / np.mean(valid_acc)
-            consistency = 1.0 / (1.0 + cv)
-        else:
-            consistency = 0.5
-        consistency_list.append(consistency)
-    
-    X_final['consistency_score'] = consistency_list
-    logger.print_success("Ratios globales calculados")
+# Grupos de métricas por ronda, en orden cronológico (Accuracy1, Accuracy2, ...).
+# sorted() sobre los nombres pondría Accuracy10 antes que Accuracy2; el orden
+# usado se guarda como 'round_order' en modelo_info.json para el backend.
+ROUND_ORDER = 'numeric'
+
+def round_columns(metric):
+    cols = [col for col in X_imputed.columns if col.startswith(metric) and col[len(metric):].isdigit()]
+    return sorted(cols, key=lambda col: int(col[len(metric):]))[:32]
+
+accuracy_cols = round_columns('Accuracy')
+clicks_cols = round_columns('Clicks')
+hits_cols = round_columns('Hits')
+misses_cols = round_columns('Misses')
+
+# Las 9 features se calculan de una vez para todas las filas
+derived = temporal_features.compute_temporal_features(
+    X_imputed[accuracy_cols].to_numpy(dtype=np.float64),
+    X_imputed[clicks_cols].to_numpy(dtype=np.float64),
+    X_imputed[hits_cols].to_numpy(dtype=np.float64),
+    X_imputed[misses_cols].to_numpy(dtype=np.float64)
+)
+for j, name in enumerate(temporal_features.TEMPORAL_FEATURES):
+    X_final[name] = derived[:, j]
+
+logger.print_success("Tendencias de accuracy calculadas")
+logger.print_success("Variabilidad de clicks calculada")
+logger.print_success("Ratios globales calculados")
 
 logger.print_success(f"Total features: {X_final.shape[1]}")
 
@@ -181,11 +158,42 @@ model_calibrated = CalibratedClassifierCV(model, method='isotonic', cv=5)
 model_calibrated.fit(X_train_scaled, y_train)
 logger.print_success("Modelo calibrado con Isotonic Regression")
 
+if args.serving_model:
+    # ensemble=False: un booster entrenado con todo el train y un único
+    # calibrador isotónico ajustado sobre las predicciones out-of-fold de los
+    # 5 folds. En inferencia se evalúan 400 árboles en lugar de 5 × 400.
+    model_serving = CalibratedClassifierCV(model, method='isotonic', cv=5, ensemble=False)
+    model_serving.fit(X_train_scaled, y_train)
+    logger.print_success("Modelo de serving calibrado (1 booster + 1 mapa isotónico)")
+else:
+    model_serving = model_calibrated
+
 # ==== EVALUACIÓN ====
 logger.print_section("EVALUACIÓN DEL MODELO")
 
-y_proba = model_calibrated.predict_proba(X_test_scaled)[:, 1]
-y_pred = (y_proba >= 0.40).astype(int)
+
+def expected_calibration_error(y_true, y_prob, n_bins=10):
+    """ECE con bins de ancho uniforme"""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    bins = np.minimum((y_prob * n_bins).astype(int), n_bins - 1)
+    ece = 0.0
+    for b in range(n_bins):
+        mask = bins == b
+        if mask.any():
+            ece += mask.mean() * abs(y_prob[mask].mean() - y_true[mask].mean())
+    return float(ece)
+
+
+def calibration_metrics(y_true, y_prob):
+    return {
+        'roc_auc': float(roc_auc_score(y_true, y_prob)),
+        'brier': float(brier_score_loss(y_true, y_prob)),
+        'ece': expected_calibration_error(y_true, y_prob)
+    }
+
+
+y_proba = model_serving.predict_proba(X_test_scaled)[:, 1]
+y_pred = (y_proba >= DECISION_THRESHOLD).astype(int)
 
 accuracy = accuracy_score(y_test, y_pred)
 precision = precision_score(y_test, y_pred, zero_division=0)
@@ -194,6 +202,7 @@ f1 = f1_score(y_test, y_pred, zero_division=0)
 roc_auc = roc_auc_score(y_test, y_proba)
 balanced_acc = balanced_accuracy_score(y_test, y_pred)
 cm = confusion_matrix(y_test, y_pred)
+calibration = calibration_metrics(y_test, y_proba)
 
 metrics = {
     'accuracy_test': accuracy,
@@ -210,11 +219,50 @@ logger.print_summary({
     'Recall': recall,
     'F1-Score': f1,
     'ROC-AUC': roc_auc,
-    'Balanced Accuracy': balanced_acc
+    'Balanced Accuracy': balanced_acc,
+    'Brier': calibration['brier'],
+    'ECE': calibration['ece']
 })
 
 logger.print_info(f"Matriz de confusión: TN={cm[0][0]} | FP={cm[0][1]} | FN={cm[1][0]} | TP={cm[1][1]}")
 
+# ==== EQUIVALENCIA SERVING VS ENSEMBLE ====
+equivalence = None
+if args.serving_model:
+    logger.print_section("EQUIVALENCIA: MODELO DE SERVING VS ENSEMBLE 5-FOLD")
+
+    y_proba_ensemble = model_calibrated.predict_proba(X_test_scaled)[:, 1]
+    y_pred_ensemble = (y_proba_ensemble >= DECISION_THRESHOLD).astype(int)
+    diff = np.abs(y_proba - y_proba_ensemble)
+    ensemble_metrics = calibration_metrics(y_test, y_proba_ensemble)
+
+    equivalence = {
+        'reference': 'CalibratedClassifierCV(isotonic, cv=5, ensemble=True)',
+        'test_samples': int(len(y_test)),
+        'decision_threshold': DECISION_THRESHOLD,
+        'probability_diff': {
+            'mean_abs': float(diff.mean()),
+            'p95_abs': float(np.percentile(diff, 95)),
+            'max_abs': float(diff.max())
+        },
+        'decision_agreement': float((y_pred == y_pred_ensemble).mean()),
+        'serving': calibration,
+        'ensemble': ensemble_metrics,
+        'trees_per_prediction': {
+            'serving': int(model_serving.calibrated_classifiers_[0].estimator.n_estimators),
+            'ensemble': int(sum(c.estimator.n_estimators for c in model_calibrated.calibrated_classifiers_))
+        }
+    }
+
+    logger.print_table(
+        ['Métrica', 'Serving', 'Ensemble 5-fold'],
+        [[name.upper(), f"{calibration[name]:.4f}", f"{ensemble_metrics[name]:.4f}"]
+         for name in ('roc_auc', 'brier', 'ece')]
+    )
+    logger.print_metric("Diferencia media |p|", diff.mean())
+    logger.print_metric("Diferencia máxima |p|", diff.max())
+    logger.print_metric("Acuerdo de decisiones", equivalence['decision_agreement'])
+
 # ==== GUARDAR MODELO ====
 logger.print_section("GUARDANDO ARCHIVOS DEL MODELO")
 
@@ -222,7 +270,7 @@ os.makedirs('../pkl', exist_ok=True)
 
 # Guardar modelo
 model_path = '../pkl/modelo_dislexia.pkl'
-joblib.dump(model_calibrated, model_path)
+joblib.dump(model_serving, model_path)
 
 # Guardar scaler
 scaler_path = '../pkl/scaler.pkl'
@@ -234,18 +282,21 @@ joblib.dump(imputer, imputer_path)
 
 # Guardar información
 model_info = {
-    'version': '3.0_app_calibrated',
-    'model_type': 'XGBoost_Isotonic_Calibrated',
+    'version': '3.1_app_serving' if args.serving_model else '3.0_app_calibrated',
+    'model_type': 'XGBoost_Isotonic_Calibrated_Single' if args.serving_model else 'XGBoost_Isotonic_Calibrated',
     'description': 'Modelo reentrenado y calibrado específicamente para tu aplicación de screening de dislexia',
-    'decision_threshold': 0.40,
+    'decision_threshold': DECISION_THRESHOLD,
     'accuracy': float(accuracy),
     'precision': float(precision),
     'recall': float(recall),
     'f1_score': float(f1),
     'roc_auc': float(roc_auc),
     'balanced_accuracy': float(balanced_acc),
+    'brier_score': calibration['brier'],
+    'ece': calibration['ece'],
     'false_positive_rate': float(1 - precision),
     'features': list(X_final.columns),
+    'round_order': ROUND_ORDER,
     'n_features': len(X_final.columns),
     'training_samples': len(X_train),
     'test_samples': len(X_test),
@@ -258,11 +309,20 @@ model_info = {
     'interpretation': f'Detecta {int(recall*100)}% de casos con {int((1-precision)*100)}% falsas alarmas. Óptimo para screening.'
 }
 
+if equivalence is not None:
+    model_info['equivalence_report'] = 'equivalencia_serving.json'
+
 info_path = '../pkl/modelo_info.json'
 with open(info_path, 'w', encoding='utf-8') as f:
     json.dump(model_info, f, indent=2, ensure_ascii=False)
 
 files_created = ['modelo_dislexia.pkl', 'scaler.pkl', 'imputer.pkl', 'modelo_info.json']
+
+if equivalence is not None:
+    with open('../pkl/equivalencia_serving.json', 'w', encoding='utf-8') as f:
+        json.dump(equivalence, f, indent=2, ensure_ascii=False)
+    files_created.append('equivalencia_serving.json')
+
 logger.print_phase_serialization(files_created, '../pkl')
 
 logger.print_header("REENTRENAMIENTO COMPLETADO")
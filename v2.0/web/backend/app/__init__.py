@@ -3,6 +3,8 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from app.config import Config, DevelopmentConfig
 from app.models.database import db
+from app.utils.log import configure_logging, get_logger
+from app.utils import metrics
 import os
 
 migrate = Migrate()
@@ -17,11 +19,15 @@ def create_app(config_class=None):
         config_class = DevelopmentConfig if env == 'development' else Config
     
     app.config.from_object(config_class)
+    configure_logging(app.config)
     
     # Inicializar extensiones
     db.init_app(app)
     migrate.init_app(app, db)
     
+    # Latencia, conteo y errores de cada request (GET /api/metrics)
+    metrics.init_app(app)
+    
     # Configurar CORS
     CORS(app, resources={
         r"/api/*": {
@@ -35,12 +41,18 @@ def create_app(config_class=None):
     from app.routes import api_bp
     app.register_blueprint(api_bp)
     
+    # Reintentar resultados derramados por una ejecución anterior sin esperar
+    # a la próxima evaluación
+    from app.routes.api import result_writer
+    if result_writer is not None:
+        result_writer.bind(app)
+    
     # Manejador para cerrar transacciones después de cada request
     @app.teardown_appcontext
     def shutdown_session(exception=None):
         """Cierra la sesión de BD después de cada request"""
         if exception is not None:
-            print(f"❌ Excepción en request: {exception}")
+            get_logger(__name__).error("Excepción en request", error=str(exception))
             db.session.rollback()
         db.session.remove()
     
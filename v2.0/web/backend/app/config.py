@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 
+from app.models.pool import InstrumentedQueuePool
+
 load_dotenv()
 
 class Config:
@@ -20,6 +22,23 @@ class Config:
     SCALER_PATH = os.path.join(BACKEND_ROOT, "pkl", "scaler.pkl")
     INFO_PATH = os.path.join(BACKEND_ROOT, "pkl", "modelo_info.json")
     
+    # Bundle mapeable en memoria (export_bundle.py). Si existe, reemplaza
+    # a los pickles anteriores en ModelManager
+    MODEL_BUNDLE_PATH = os.getenv('MODEL_BUNDLE_PATH', os.path.join(BACKEND_ROOT, "pkl", "modelo_dislexia.bundle"))
+    MODEL_BUNDLE_VERIFY = os.getenv('MODEL_BUNDLE_VERIFY', 'true').lower() == 'true'
+    
+    # Recarga del modelo sin reiniciar: vigilancia de archivos y endpoint de admin
+    # (POST /api/model/reload, deshabilitado si MODEL_ADMIN_TOKEN está vacío)
+    MODEL_WATCH_ENABLED = os.getenv('MODEL_WATCH_ENABLED', 'false').lower() == 'true'
+    MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', '5'))
+    MODEL_ADMIN_TOKEN = os.getenv('MODEL_ADMIN_TOKEN', '')
+    
+    # Runtime de inferencia: 'sklearn' (CalibratedClassifierCV) o 'flat'
+    # (árboles exportados a arrays de NumPy, ver app/models/tree_runtime.py).
+    # El runtime plano solo se usa para lotes de hasta FLAT_RUNTIME_MAX_ROWS filas
+    MODEL_RUNTIME = os.getenv('MODEL_RUNTIME', 'sklearn')
+    FLAT_RUNTIME_MAX_ROWS = int(os.getenv('FLAT_RUNTIME_MAX_ROWS', '64'))
+    
     # Database Configuration
     # Railway provides these env variables automatically
     DB_HOST = os.getenv('MYSQLHOST', os.getenv('DB_HOST', 'localhost'))
@@ -34,13 +53,88 @@ class Config:
         "?charset=utf8mb4"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # El SQL se registra con LOG_SQL (por la cola de logging), no con echo
     SQLALCHEMY_ECHO = False
     
+    # Pool de conexiones (uno por worker de gunicorn). El total de conexiones,
+    # WEB_CONCURRENCY × (DB_POOL_SIZE + DB_MAX_OVERFLOW), debe entrar en
+    # DB_MAX_CONNECTIONS (la parte de max_connections de MySQL para este
+    # servicio). Por defecto, una conexión por hilo más la del hilo de
+    # escritura diferida, y overflow hasta completar la parte de cada worker
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 100))
+    _WORKER_CONNECTIONS = max(1, DB_MAX_CONNECTIONS // max(1, WEB_CONCURRENCY))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', min(WEB_THREADS + 1, _WORKER_CONNECTIONS)))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', max(0, min(WEB_THREADS, _WORKER_CONNECTIONS - DB_POOL_SIZE))))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    # Menor que wait_timeout de MySQL: evita usar conexiones que el servidor ya cerró
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING
+    }
+    
+    # Escritura diferida de resultados (ver app/services/write_behind.py): la
+    # evaluación responde sin esperar a la BD; si la BD no responde, los
+    # resultados se guardan en WRITE_BEHIND_SPILL_PATH y se reintentan después.
+    # Desactivada por defecto: el archivo de derrame solo protege los
+    # resultados si está en almacenamiento persistente (no en el disco
+    # efímero de un contenedor de Cloud Run)
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_CAPACITY = int(os.getenv('WRITE_BEHIND_CAPACITY', 1000))
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 50))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', '0.5'))
+    WRITE_BEHIND_MAX_RETRIES = int(os.getenv('WRITE_BEHIND_MAX_RETRIES', 3))
+    WRITE_BEHIND_RETRY_BACKOFF = float(os.getenv('WRITE_BEHIND_RETRY_BACKOFF', '0.5'))
+    WRITE_BEHIND_PUT_TIMEOUT = float(os.getenv('WRITE_BEHIND_PUT_TIMEOUT', '0.05'))
+    WRITE_BEHIND_SPILL_PATH = os.getenv('WRITE_BEHIND_SPILL_PATH', os.path.join(BACKEND_ROOT, "spill", "test_results.ndjson"))
+    WRITE_BEHIND_REPLAY_INTERVAL = float(os.getenv('WRITE_BEHIND_REPLAY_INTERVAL', '30'))
+    WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv('WRITE_BEHIND_DRAIN_TIMEOUT', '10'))
+    
+    # Logging estructurado (app/utils/log.py): JSON por línea, escrito por un
+    # hilo de fondo. LOG_SAMPLE_RATE muestrea los eventos INFO/DEBUG por request;
+    # LOG_DEBUG_PAYLOADS habilita volcar payloads completos (con LOG_LEVEL=DEBUG)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_DEBUG_PAYLOADS = os.getenv('LOG_DEBUG_PAYLOADS', 'false').lower() == 'true'
+    LOG_SQL = os.getenv('LOG_SQL', 'false').lower() == 'true'
+    
     # API
     JSON_SORT_KEYS = False
     API_HOST = os.getenv('API_HOST', '0.0.0.0')
     API_PORT = int(os.getenv('API_PORT', 5000))
     
+    # Cache de predicciones (LRU + TTL, clave: vector de features + versión del modelo)
+    PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', 'true').lower() == 'true'
+    PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '10000'))
+    PREDICTION_CACHE_MAX_BYTES = int(os.getenv('PREDICTION_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+    PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', '600'))
+    
+    # Directorio compartido por los workers de gunicorn para sumar sus métricas
+    # en GET /api/metrics (gunicorn.conf.py lo define; vacío = por proceso)
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+    METRICS_WRITE_INTERVAL = float(os.getenv('METRICS_WRITE_INTERVAL', '1'))
+    
+    # Micro-batching de inferencias concurrentes
+    MICROBATCH_ENABLED = os.getenv('MICROBATCH_ENABLED', 'false').lower() == 'true'
+    MICROBATCH_WINDOW_MS = float(os.getenv('MICROBATCH_WINDOW_MS', 3))
+    MICROBATCH_MAX_SIZE = int(os.getenv('MICROBATCH_MAX_SIZE', 32))
+    # Espera máxima por el resultado del lote; al vencer se predice directamente
+    MICROBATCH_TIMEOUT = float(os.getenv('MICROBATCH_TIMEOUT', '2'))
+    
+    # Streaming NDJSON (/api/predict/stream): filas por evaluación del modelo
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 256))
+    STREAM_MAX_CHUNK_SIZE = int(os.getenv('STREAM_MAX_CHUNK_SIZE', 4096))
+    
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
@@ -48,7 +142,7 @@ class DevelopmentConfig(Config):
     """Configuración desarrollo"""
     DEBUG = True
     TESTING = False
-    SQLALCHEMY_ECHO = True
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
 
 class ProductionConfig(Config):
     """Configuración producción"""
@@ -0,0 +1,106 @@
+"""
+Esquema compilado de features del modelo
+Se construye una sola vez desde modelo_info.json y guarda las posiciones
+(arrays de índices) que usan FeatureExtractor, DislexiaPredictor y ModelManager,
+para no hacer trabajo con strings en cada request.
+"""
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from app.config import Config
+from app.models.temporal_features import TEMPORAL_FEATURES
+
+DEMOGRAPHICS = ('Gender', 'Nativelang', 'Otherlang', 'Age')
+METRICS = ('Clicks', 'Hits', 'Misses', 'Score', 'Accuracy', 'Missrate')
+N_ROUNDS = 32
+
+_ROUND_FEATURE = re.compile(r'^(%s)(\d+)$' % '|'.join(METRICS))
+
+
+class FeatureSchema:
+    """
+    Posiciones de las features del modelo.
+
+    Atributos principales:
+    - features / index: nombres en orden del modelo y nombre → posición
+    - base_names / base_index: features de entrada (demográficas + rondas) y
+      su posición en el vector completo
+    - derived_index: posición de cada feature de TEMPORAL_FEATURES (-1 si falta)
+    - metric_index[m]: posiciones de la métrica m para las rondas 1..32
+    - temporal_index[m]: posiciones de la métrica m en el orden de rondas con el
+      que se entrenaron las features temporales (ver round_order)
+    - base_temporal_index[m]: lo mismo, relativo al bloque base
+
+    round_order:
+    - 'lexicographic': sorted() sobre los nombres (Accuracy1, Accuracy10, ...,
+      Accuracy2, ...). Es el orden con el que se entrenaron los modelos que
+      no declaran round_order en modelo_info.json.
+    - 'numeric': rondas 1..32 en orden cronológico.
+    """
+
+    def __init__(self, features, round_order='lexicographic'):
+        if round_order not in ('lexicographic', 'numeric'):
+            raise ValueError(f"round_order desconocido: {round_order}")
+
+        self.features = tuple(features)
+        self.n_features = len(self.features)
+        self.round_order = round_order
+        self.index = {name: i for i, name in enumerate(self.features)}
+
+        derived = set(TEMPORAL_FEATURES)
+        self.base_names = tuple(f for f in self.features if f not in derived)
+        self.n_base = len(self.base_names)
+        self.base_positions = {name: i for i, name in enumerate(self.base_names)}
+        self.base_index = self._positions(self.base_names)
+        self.derived_index = np.array(
+            [self.index.get(f, -1) for f in TEMPORAL_FEATURES], dtype=np.intp
+        )
+        self.demographic_index = {name: self.index[name] for name in DEMOGRAPHICS if name in self.index}
+
+        # Agrupar columnas de rondas por métrica
+        rounds = {metric: {} for metric in METRICS}
+        for name in self.base_names:
+            match = _ROUND_FEATURE.match(name)
+            if match:
+                rounds[match.group(1)][int(match.group(2))] = name
+
+        self.metric_index = {}
+        self.temporal_index = {}
+        self.base_temporal_index = {}
+        for metric, by_round in rounds.items():
+            numeric = [by_round[r] for r in sorted(by_round)]
+            if round_order == 'numeric':
+                ordered = numeric[:N_ROUNDS]
+            else:
+                ordered = sorted(numeric)[:N_ROUNDS]
+            self.metric_index[metric] = self._positions(numeric[:N_ROUNDS])
+            self.temporal_index[metric] = self._positions(ordered)
+            self.base_temporal_index[metric] = np.array(
+                [self.base_positions[name] for name in ordered], dtype=np.intp
+            )
+
+    def _positions(self, names):
+        return np.array([self.index[name] for name in names], dtype=np.intp)
+
+    @classmethod
+    def from_info(cls, model_info):
+        """Construir el esquema desde el contenido de modelo_info.json"""
+        return cls(
+            model_info['features'],
+            round_order=model_info.get('round_order', 'lexicographic')
+        )
+
+
+@lru_cache(maxsize=None)
+def _load_schema(info_path):
+    with open(info_path, 'r') as f:
+        return FeatureSchema.from_info(json.load(f))
+
+
+def get_feature_schema(info_path=None):
+    """Esquema compartido (uno por archivo modelo_info.json)"""
+    return _load_schema(os.path.realpath(info_path or Config.INFO_PATH))
@@ -0,0 +1,206 @@
+"""
+Bundle del modelo en un solo archivo mapeable en memoria
+Reemplaza los pickles de joblib (modelo, imputer, scaler) por arrays alineados
+que se leen con np.memmap: sin pickle, sin importar sklearn ni xgboost y con
+páginas compartidas entre los workers de un mismo nodo.
+
+Formato (little-endian):
+    [0:8]    BUNDLE_MAGIC
+    [8:16]   uint64 - longitud del header JSON
+    [16:..]  header JSON (utf-8): versión, metadatos (modelo_info.json),
+             sha256 de los archivos de origen, sha256 del bloque de datos y
+             dtype/shape/offset de cada array
+    [data]   arrays contiguos, cada uno alineado a 64 bytes
+"""
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from app.models.feature_schema import FeatureSchema
+from app.models.tree_runtime import FlatTreeEnsemble, export_calibrated_ensemble
+
+BUNDLE_MAGIC = b'DYSBNDL\x00'
+BUNDLE_VERSION = 1
+_ALIGN = 64
+_PREFIX = struct.Struct('<8sQ')
+
+
+def _align(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class BundleError(Exception):
+    """Bundle inválido, corrupto o de una versión no soportada"""
+
+
+def file_sha256(path):
+    """sha256 (hex) del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_bundle(path, arrays, metadata, sources=None):
+    """
+    Escribir un bundle
+
+    Args:
+        path: Archivo de salida
+        arrays: Dict nombre → np.ndarray (dtypes numéricos o bool)
+        metadata: Dict serializable a JSON (normalmente modelo_info.json)
+        sources: Dict nombre → sha256 de los archivos de los que se exportó
+                 (model, imputer, scaler, info); permite detectar un bundle
+                 desactualizado respecto de los pickles
+    """
+    entries = {}
+    offset = 0
+    payload = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise BundleError(f"El array '{name}' tiene dtype object")
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        offset = _align(offset)
+        entries[name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset,
+            'nbytes': array.nbytes
+        }
+        payload.append((offset, array))
+        offset += array.nbytes
+
+    data = bytearray(_align(offset))
+    for start, array in payload:
+        data[start:start + array.nbytes] = array.tobytes()
+
+    header = {
+        'version': BUNDLE_VERSION,
+        'metadata': metadata,
+        'sources': sources or {},
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'data_size': len(data),
+        'arrays': entries
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = _align(_PREFIX.size + len(header_bytes))
+    header_bytes = header_bytes.ljust(data_start - _PREFIX.size, b' ')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREFIX.pack(BUNDLE_MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_bundle(path, verify=True):
+    """
+    Mapear un bundle en memoria (solo lectura)
+
+    Returns:
+        Tupla (arrays, metadata, sources): los arrays son vistas sobre el
+        np.memmap, sin copias; sources son los sha256 de los archivos de origen
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) != _PREFIX.size:
+            raise BundleError(f"Bundle truncado: {path}")
+        magic, header_len = _PREFIX.unpack(prefix)
+        if magic != BUNDLE_MAGIC:
+            raise BundleError(f"No es un bundle de modelo: {path}")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+
+    if header.get('version') != BUNDLE_VERSION:
+        raise BundleError(f"Versión de bundle no soportada: {header.get('version')}")
+
+    data_start = _PREFIX.size + header_len
+    if os.path.getsize(path) != data_start + header['data_size']:
+        raise BundleError(f"Tamaño de bundle inválido: {path}")
+
+    data = np.memmap(path, dtype=np.uint8, mode='r', offset=data_start, shape=(header['data_size'],))
+    if verify and hashlib.sha256(data).hexdigest() != header['sha256']:
+        raise BundleError(f"Checksum inválido: {path}")
+
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        chunk = data[entry['offset']:entry['offset'] + entry['nbytes']]
+        arrays[name] = chunk.view(np.dtype(entry['dtype'])).reshape(entry['shape'])
+    return arrays, header['metadata'], header.get('sources', {})
+
+
+class ArrayImputer:
+    """Equivalente a SimpleImputer.transform a partir de statistics_"""
+
+    def __init__(self, statistics):
+        self.statistics_ = statistics
+        # SimpleImputer descarta las columnas sin estadístico (todo NaN en train)
+        valid = ~np.isnan(statistics)
+        self._keep = None if valid.all() else np.flatnonzero(valid)
+        self._fill = statistics if self._keep is None else statistics[self._keep]
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        if self._keep is not None:
+            X = X[:, self._keep]
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = np.broadcast_to(self._fill, X.shape)[missing]
+        return X
+
+
+class ArrayScaler:
+    """Equivalente a StandardScaler.transform a partir de mean_ y scale_"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+
+def build_bundle_arrays(model, imputer, scaler):
+    """Arrays del bundle a partir de los objetos sklearn entrenados"""
+    if getattr(imputer, 'strategy', None) not in ('median', 'mean'):
+        raise BundleError("Solo se soportan imputers con strategy='median' o 'mean'")
+    if scaler.with_mean is False or scaler.with_std is False:
+        raise BundleError("Solo se soportan StandardScaler con centrado y escalado")
+
+    arrays = {
+        'imputer_statistics': np.asarray(imputer.statistics_, dtype=np.float64),
+        'scaler_mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scaler_scale': np.asarray(scaler.scale_, dtype=np.float64)
+    }
+    arrays.update(export_calibrated_ensemble(model))
+    return arrays
+
+
+class ModelBundle:
+    """Artefactos de serving cargados desde un bundle"""
+
+    def __init__(self, arrays, model_info, sources=None):
+        self.arrays = arrays
+        self.model_info = model_info
+        self.sources = sources or {}
+        self.imputer = ArrayImputer(arrays['imputer_statistics'])
+        self.scaler = ArrayScaler(arrays['scaler_mean'], arrays['scaler_scale'])
+        self.model = FlatTreeEnsemble(arrays)
+        self.schema = FeatureSchema.from_info(model_info)
+
+    @classmethod
+    def load(cls, path, verify=True):
+        arrays, model_info, sources = read_bundle(path, verify=verify)
+        return cls(arrays, model_info, sources)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
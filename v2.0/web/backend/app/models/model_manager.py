@@ -1,7 +1,9 @@
-import joblib
-import json
+import numpy as np
 import pandas as pd
-from app.config import Config
+from app.models.model_registry import get_model_registry
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
 
 class ModelManager:
     """Gestor centralizado del modelo ML"""
@@ -18,103 +20,143 @@ class ModelManager:
         if self._initialized:
             return
         
-        self.model = None
-        self.imputer = None
-        self.scaler = None
-        self.model_info = {}
+        self.registry = get_model_registry()
         self._initialized = True
         self._load_models()
     
     def _load_models(self):
-        """Cargar modelos desde archivos pickle"""
+        """Cargar los artefactos a través del registro compartido del proceso"""
         try:
-            self.model = joblib.load(Config.MODEL_PATH)
-            self.imputer = joblib.load(Config.IMPUTER_PATH)
-            # NUEVO en v2.1: Cargar scaler
-            self.scaler = joblib.load(Config.SCALER_PATH)
-            
-            with open(Config.INFO_PATH, 'r') as f:
-                self.model_info = json.load(f)
-            
-            print("[OK] Modelos cargados exitosamente (incluyendo scaler v2.1)")
-        except Exception as e:
-            print(f"[ERROR] Error cargando modelos: {e}")
+            artifacts = self.registry.current()
+            log.info("Modelos cargados", source=artifacts.source,
+                     load_seconds=round(artifacts.load_seconds, 3))
+        except Exception:
+            log.exception("Error cargando modelos")
             raise
     
+    # Vistas de solo lectura sobre los artefactos compartidos
+    @property
+    def artifacts(self):
+        return self.registry.current()
+    
+    @property
+    def model(self):
+        return self.artifacts.model
+    
+    @property
+    def imputer(self):
+        return self.artifacts.imputer
+    
+    @property
+    def scaler(self):
+        return self.artifacts.scaler
+    
+    @property
+    def model_info(self):
+        return self.artifacts.model_info
+    
+    @property
+    def schema(self):
+        return self.artifacts.schema
+    
+    @property
+    def decision_threshold(self):
+        return self.artifacts.decision_threshold
+    
     def is_ready(self):
         """Verificar si los modelos están listos"""
-        return self.model is not None and self.imputer is not None and self.scaler is not None
+        if not self.registry.is_loaded():
+            return False
+        artifacts = self.artifacts
+        return artifacts.model is not None and artifacts.imputer is not None and artifacts.scaler is not None
+    
+    def _infer(self, X_scaled, artifacts=None):
+        """
+        Primitiva de inferencia fusionada.
+        
+        Evalúa el ensemble calibrado una sola vez y deriva de la misma matriz
+        de probabilidades la etiqueta (según decision_threshold de
+        modelo_info.json), la probabilidad de la clase positiva y la confianza.
+        
+        Args:
+            X_scaled: Array (N, n_features) ya escalado
+            artifacts: Artefactos con los que se escaló X (por defecto los actuales)
+            
+        Returns:
+            Tupla (predictions int64[N], probabilities float64[N], confidences float64[N])
+        """
+        artifacts = artifacts or self.artifacts
+        proba = artifacts.predict_proba(X_scaled)
+        probabilities = proba[:, 1].astype(np.float64)
+        predictions = (probabilities >= artifacts.decision_threshold).astype(np.int64)
+        confidences = proba.max(axis=1).astype(np.float64)
+        return predictions, probabilities, confidences
     
     def predict(self, features):
         """Realizar predicción individual"""
         if not self.is_ready():
             raise Exception("Modelo no disponible")
         
-        # Obtener nombres de características del modelo
-        feature_names = self.model_info.get("features", [])
-        
-        print(f"🔍 Predicción - Features esperadas: {len(feature_names)}")
-        print(f"🔍 Predicción - Features recibidas: {len(features)}")
+        artifacts = self.artifacts
+        n_features = artifacts.schema.n_features
         
         # Validar cantidad de características
-        if len(features) != len(feature_names):
+        if len(features) != n_features:
             raise ValueError(
-                f"Se esperaban {len(feature_names)} características, "
+                f"Se esperaban {n_features} características, "
                 f"se recibieron {len(features)}"
             )
         
         # Convertir a array numpy 2D
-        import numpy as np
-        X = np.array([features])
-        
-        print(f"🔍 Array shape antes de scaler: {X.shape}")
+        X = np.asarray(features, dtype=np.float64).reshape(1, -1)
         
         # NUEVO en v2.1: Aplicar scaler a las features
-        X_scaled = self.scaler.transform(X)
-        print(f"🔍 Array shape después de scaler: {X_scaled.shape}")
+        X_scaled = artifacts.preprocessor.scale(X)
         
-        # Predecir con features escaladas
-        prediction = self.model.predict(X_scaled)[0]
-        probability = self.model.predict_proba(X_scaled)[0][1]
-        confidence = float(max(self.model.predict_proba(X_scaled)[0]))
+        # Una sola evaluación del ensemble para etiqueta, probabilidad y confianza
+        predictions, probabilities, confidences = self._infer(X_scaled, artifacts)
+        prediction = predictions[0]
+        probability = probabilities[0]
         
-        print(f"✅ Predicción exitosa: {prediction}, probabilidad: {probability:.2%}")
+        log.debug("Predicción", prediction=int(prediction), probability=float(probability))
         
         return {
             "prediction": int(prediction),
             "probability": float(probability),
-            "confidence": confidence
+            "confidence": float(confidences[0]),
+            "model_version": artifacts.version
         }
     
     def predict_batch(self, data_list):
-        """Realizar predicciones en lote"""
+        """Realizar predicciones en lote
+        
+        El modelo se evalúa una sola vez para todo el lote (ver _infer).
+        
+        Returns:
+            Dict columnar con arrays de longitud N:
+            {"prediction": int64[N], "probability": float64[N], "confidence": float64[N],
+             "model_version": str}
+        """
         if not self.is_ready():
             raise Exception("Modelo no disponible")
         
-        import numpy as np
-        
         # Convertir a array numpy
-        X = np.array(data_list)
+        X = np.asarray(data_list, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
         
         # NUEVO en v2.1: Aplicar scaler a las features
-        X_scaled = self.scaler.transform(X)
-        
-        print(f"🔍 Batch - Shape antes: {X.shape}, después: {X_scaled.shape}")
-        
-        # Predecir con features escaladas
-        predictions = self.model.predict(X_scaled)
-        probabilities = self.model.predict_proba(X_scaled)[:, 1]
+        artifacts = self.artifacts
+        X_scaled = artifacts.preprocessor.scale(X)
         
-        results = []
-        for i, (pred, prob) in enumerate(zip(predictions, probabilities)):
-            results.append({
-                "index": i,
-                "prediction": int(pred),
-                "probability": float(prob),
-                "confidence": float(max(self.model.predict_proba(X_scaled)[i]))
-            })
+        predictions, probabilities, confidences = self._infer(X_scaled, artifacts)
         
-        return results
+        return {
+            "prediction": predictions,
+            "probability": probabilities,
+            "confidence": confidences,
+            "model_version": artifacts.version
+        }
     
     def get_info(self):
         """Obtener información del modelo"""
@@ -0,0 +1,450 @@
+"""
+Registro de modelos del proceso
+Carga una sola vez los artefactos (modelo, imputer, scaler, modelo_info.json)
+y entrega la misma referencia de solo lectura a ModelManager, DislexiaPredictor
+y demás consumidores, en lugar de que cada uno deserialice su propia copia.
+
+Los artefactos son snapshots inmutables y versionados: una recarga construye
+y calienta el nuevo snapshot en segundo plano y luego reemplaza la referencia
+de forma atómica. Los requests en curso terminan con el snapshot que tomaron.
+"""
+import json
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from app.config import Config
+from app.models.feature_schema import FeatureSchema
+from app.models.model_bundle import BundleError, ModelBundle, file_sha256
+from app.models.preprocessing import FusedPreprocessor
+from app.models.tree_runtime import FlatTreeEnsemble
+from app.utils.log import get_logger
+from app.utils.metrics import timed
+
+log = get_logger(__name__)
+
+
+def _rss_bytes():
+    """Memoria residente del proceso (None si no se puede leer)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class ModelArtifacts:
+    """
+    Artefactos cargados de un modelo. Se tratan como inmutables: los
+    consumidores comparten la instancia y no deben modificarla.
+    """
+
+    def __init__(self, model, imputer, scaler, model_info, flat_runtime=None,
+                 source='pickle', paths=None):
+        self.model = model
+        self.imputer = imputer
+        self.scaler = scaler
+        self.model_info = model_info
+        self.flat_runtime = flat_runtime
+        self.schema = FeatureSchema.from_info(model_info)
+        self.preprocessor = FusedPreprocessor.from_fitted(imputer, scaler, self.schema)
+        self.decision_threshold = float(model_info.get('decision_threshold', 0.5))
+        self.version = model_info.get('version')
+        self.source = source
+        self.paths = paths or {}
+        self.generation = None
+        self.bundle_error = None
+        self.load_seconds = None
+        self.resident_bytes = None
+        self.warmup_seconds = None
+
+    @timed('inference')
+    def predict_proba(self, X_scaled):
+        """
+        predict_proba del ensemble calibrado.
+
+        Con MODEL_RUNTIME=flat los lotes de hasta FLAT_RUNTIME_MAX_ROWS filas se
+        evalúan con FlatTreeEnsemble (sin overhead de sklearn/DMatrix); los
+        lotes grandes siguen en XGBoost, que es más rápido a partir de ahí.
+        Cargado desde un bundle, el runtime plano es el único modelo.
+        """
+        if self.flat_runtime is not None and (
+                self.flat_runtime is self.model or len(X_scaled) <= Config.FLAT_RUNTIME_MAX_ROWS):
+            return self.flat_runtime.predict_proba(X_scaled)
+        return self.model.predict_proba(X_scaled)
+
+    def warm_up(self, batch_sizes=(1, 32)):
+        """
+        Ejecutar el pipeline completo (preprocesamiento, modelo) con entradas
+        sintéticas antes de publicar el snapshot: valida los artefactos y paga
+        las inicializaciones perezosas fuera del camino de los requests.
+        """
+        start = time.perf_counter()
+        schema = self.schema
+        statistics = np.asarray(self.imputer.statistics_, dtype=np.float64)
+        rng = np.random.default_rng(0)
+
+        for rows in batch_sizes:
+            X_base = statistics * rng.uniform(0.5, 1.5, size=(rows, schema.n_base))
+            X_base[rng.random(X_base.shape) < 0.1] = np.nan
+            X_scaled = self.preprocessor.transform_base(X_base)
+
+            proba = self.predict_proba(X_scaled)
+            if proba.shape != (rows, 2) or not np.isfinite(proba).all():
+                raise ValueError(f"Warm-up inválido para el modelo {self.version}")
+
+        self.warmup_seconds = time.perf_counter() - start
+
+    def describe(self):
+        return {
+            "source": self.source,
+            "paths": self.paths,
+            "version": self.version,
+            "generation": self.generation,
+            "model_type": type(self.model).__name__,
+            "flat_runtime": self.flat_runtime is not None,
+            "bundle_error": self.bundle_error,
+            "n_features": self.schema.n_features,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "resident_bytes": self.resident_bytes
+        }
+
+
+def _stale_bundle_reason(bundle, bundle_path, sources):
+    """
+    Motivo por el que el bundle no corresponde a los archivos de origen
+    (None si está al día). Se comparan los sha256 guardados por
+    export_bundle.py con el contenido actual de cada archivo, no sus fechas:
+    copiar de nuevo un archivo idéntico no invalida el bundle.
+    """
+    changed = [path for name, path in sources.items()
+               if path and os.path.exists(path) and bundle.sources.get(name) != file_sha256(path)]
+    if changed:
+        return (f"El bundle {bundle_path} no corresponde a {', '.join(changed)}; "
+                f"volver a generarlo con export_bundle.py o eliminarlo")
+    info_path = sources.get('info')
+    if info_path and os.path.exists(info_path):
+        with open(info_path, 'r') as f:
+            info_version = json.load(f).get('version')
+        bundle_version = bundle.model_info.get('version')
+        if info_version != bundle_version:
+            return (f"El bundle {bundle_path} es de la versión {bundle_version} y "
+                    f"{info_path} de la versión {info_version}; volver a generarlo con export_bundle.py")
+    return None
+
+
+def load_artifacts(model_path, imputer_path, scaler_path, info_path, bundle_path=None):
+    """
+    Cargar artefactos desde un bundle (si existe) o desde los pickles de joblib
+
+    Args:
+        scaler_path: None o inexistente si el modelo no usa scaler
+        bundle_path: Bundle mapeable en memoria; tiene prioridad sobre los pickles
+                     si corresponde a ellos. Si no, se cargan los pickles y el
+                     motivo queda en artifacts.bundle_error (BundleError si
+                     tampoco hay pickles)
+
+    Returns:
+        ModelArtifacts con load_seconds y resident_bytes (incremento de RSS
+        durante la carga; incluye los imports que dispare la deserialización)
+    """
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+
+    artifacts = None
+    bundle_error = None
+    if bundle_path and os.path.exists(bundle_path):
+        bundle = ModelBundle.load(bundle_path, verify=Config.MODEL_BUNDLE_VERIFY)
+        bundle_error = _stale_bundle_reason(bundle, bundle_path, {
+            'model': model_path, 'imputer': imputer_path, 'scaler': scaler_path, 'info': info_path
+        })
+        if bundle_error is None:
+            artifacts = ModelArtifacts(
+                bundle.model, bundle.imputer, bundle.scaler, bundle.model_info,
+                flat_runtime=bundle.model, source='bundle', paths={'bundle': bundle_path}
+            )
+        elif not os.path.exists(model_path):
+            raise BundleError(bundle_error)
+
+    if artifacts is None:
+        model = joblib.load(model_path)
+        imputer = joblib.load(imputer_path)
+        scaler = joblib.load(scaler_path) if scaler_path and os.path.exists(scaler_path) else None
+        with open(info_path, 'r') as f:
+            model_info = json.load(f)
+
+        # Árboles aplanados para lotes pequeños (MODEL_RUNTIME=flat)
+        flat_runtime = FlatTreeEnsemble.from_model(model) if Config.MODEL_RUNTIME == 'flat' else None
+        artifacts = ModelArtifacts(
+            model, imputer, scaler, model_info, flat_runtime=flat_runtime, source='pickle',
+            paths={'model': model_path, 'imputer': imputer_path, 'scaler': scaler_path, 'info': info_path}
+        )
+
+    artifacts.bundle_error = bundle_error
+    artifacts.load_seconds = time.perf_counter() - start
+    rss_after = _rss_bytes()
+    if rss_before is not None and rss_after is not None:
+        artifacts.resident_bytes = max(0, rss_after - rss_before)
+    return artifacts
+
+
+def load_configured_artifacts():
+    """Artefactos según las rutas de Config"""
+    return load_artifacts(
+        Config.MODEL_PATH, Config.IMPUTER_PATH, Config.SCALER_PATH, Config.INFO_PATH,
+        bundle_path=Config.MODEL_BUNDLE_PATH
+    )
+
+
+def configured_artifact_paths():
+    """Archivos cuyo cambio implica un modelo nuevo"""
+    return [Config.MODEL_BUNDLE_PATH, Config.MODEL_PATH, Config.IMPUTER_PATH,
+            Config.SCALER_PATH, Config.INFO_PATH]
+
+
+class ModelRegistry:
+    """
+    Registro thread-safe: los artefactos se cargan una vez por proceso y se
+    reemplazan atómicamente con reload()
+    """
+
+    def __init__(self, loader=load_configured_artifacts, watched_paths=configured_artifact_paths):
+        self._loader = loader
+        self._watched_paths = watched_paths
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._artifacts = None
+        self._loads = 0
+        self._generation = 0
+        self._last_reload = None
+        self._watcher = None
+        self._swap_listeners = []
+        self._loaded_fingerprint = None
+
+    def _load(self):
+        """(artefactos, huella de los archivos tomada antes de leerlos)"""
+        fingerprint = _fingerprint(self._watched_paths())
+        return self._loader(), fingerprint
+
+    def _install(self, artifacts, fingerprint=None):
+        """Publicar un snapshot (con self._lock tomado)"""
+        self._generation += 1
+        self._loads += 1
+        artifacts.generation = self._generation
+        self._artifacts = artifacts
+        self._loaded_fingerprint = fingerprint
+
+    @property
+    def loaded_fingerprint(self):
+        """Huella (ruta, mtime, tamaño) de los archivos del snapshot actual"""
+        return self._loaded_fingerprint
+
+    def add_swap_listener(self, listener):
+        """Registrar listener(previous, current) que se llama tras cada reemplazo"""
+        self._swap_listeners.append(listener)
+
+    def current(self) -> ModelArtifacts:
+        """Artefactos actuales (se cargan en la primera llamada)"""
+        artifacts = self._artifacts
+        if artifacts is None:
+            with self._lock:
+                if self._artifacts is None:
+                    loaded, fingerprint = self._load()
+                    if loaded.bundle_error:
+                        # Sin modelo actual que conservar: arrancar con los pickles
+                        log.warning("Bundle desactualizado; se cargan los pickles",
+                                    error=loaded.bundle_error)
+                    self._install(loaded, fingerprint)
+                artifacts = self._artifacts
+        return artifacts
+
+    def is_loaded(self):
+        return self._artifacts is not None
+
+    def reload(self, reason='manual') -> dict:
+        """
+        Cargar y calentar una nueva versión y reemplazar la actual.
+
+        Si la carga o el warm-up fallan, o si el bundle no corresponde a los
+        pickles, se conserva el modelo actual. Solo corre una recarga a la vez.
+
+        Returns:
+            Dict con status 'swapped', 'failed' o 'in_progress'
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return {"status": "in_progress", "reason": reason}
+
+        previous = self._artifacts
+        status = {
+            "reason": reason,
+            "previous_version": previous.version if previous is not None else None,
+            "started_at": time.time()
+        }
+        try:
+            artifacts, fingerprint = self._load()
+            if artifacts.bundle_error and previous is not None:
+                raise BundleError(artifacts.bundle_error)
+            artifacts.warm_up()
+            with self._lock:
+                self._install(artifacts, fingerprint)
+            for listener in list(self._swap_listeners):
+                listener(previous, artifacts)
+            status.update({
+                "status": "swapped",
+                "version": artifacts.version,
+                "generation": artifacts.generation,
+                "load_seconds": artifacts.load_seconds,
+                "warmup_seconds": artifacts.warmup_seconds
+            })
+            log.info("Modelo recargado", reason=reason, previous_version=status['previous_version'],
+                     version=artifacts.version, generation=artifacts.generation)
+        except Exception as e:
+            status.update({"status": "failed", "error": str(e)})
+            log.exception("Recarga de modelo fallida", reason=reason)
+        finally:
+            self._last_reload = status
+            self._reload_lock.release()
+        return status
+
+    def reload_if_changed(self, reason='changed'):
+        """
+        Recargar solo si los archivos cambiaron desde que se cargó el snapshot
+        actual (p. ej. un worker recién creado a partir de un master que
+        cargó el modelo antes de una publicación). None si no hizo falta.
+        """
+        if self._artifacts is None or _fingerprint(self._watched_paths()) == self._loaded_fingerprint:
+            return None
+        return self.reload(reason=reason)
+
+    def reload_async(self, reason='manual') -> bool:
+        """Recargar en un hilo de fondo; False si ya hay una recarga en curso"""
+        if self._reload_lock.locked():
+            return False
+        threading.Thread(target=self.reload, args=(reason,), name='model-reload', daemon=True).start()
+        return True
+
+    def start_watcher(self, interval=5.0):
+        """
+        Vigilar los archivos del modelo y recargar cuando cambien. Idempotente;
+        debe llamarse de nuevo en cada worker después de un fork.
+        """
+        with self._lock:
+            if self._watcher is None or not self._watcher.is_running():
+                self._watcher = ModelFileWatcher(self, self._watched_paths(), interval)
+                self._watcher.start()
+        return self._watcher
+
+    def stop_watcher(self):
+        """Detener el watcher de este proceso (p. ej. en el master antes de hacer fork)"""
+        with self._lock:
+            if self._watcher is not None:
+                self._watcher.stop()
+                self._watcher = None
+
+    def stats(self) -> dict:
+        """Origen, tiempo de carga y memoria de los artefactos cargados"""
+        artifacts = self._artifacts
+        watcher = self._watcher
+        return {
+            "loaded": artifacts is not None,
+            "loads": self._loads,
+            "version": artifacts.version if artifacts is not None else None,
+            "generation": self._generation,
+            "reload_in_progress": self._reload_lock.locked(),
+            "last_reload": self._last_reload,
+            "watcher": watcher.stats() if watcher is not None else {"enabled": False},
+            "process_rss_bytes": _rss_bytes(),
+            "artifacts": artifacts.describe() if artifacts is not None else None
+        }
+
+
+def _fingerprint(paths):
+    """(ruta, mtime, tamaño) de los archivos existentes"""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+class ModelFileWatcher:
+    """
+    Hilo que sondea los archivos del modelo y dispara ModelRegistry.reload.
+
+    Un cambio se aplica cuando los archivos no variaron durante un intervalo
+    completo, para no cargar un modelo a medio copiar. Esto vale para los
+    pickles; el bundle está mapeado en memoria por el snapshot actual y debe
+    publicarse con un rename atómico (nunca sobrescribirse en el lugar).
+    """
+
+    def __init__(self, registry, paths, interval=5.0):
+        self.registry = registry
+        self.paths = list(paths)
+        self.interval = interval
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._checks = 0
+        self._reloads = 0
+
+    def start(self):
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self):
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        # Partir de los archivos del snapshot cargado: un cambio anterior al
+        # arranque del watcher (p. ej. en un worker recién creado) también cuenta
+        baseline = self.registry.loaded_fingerprint
+        if baseline is None:
+            baseline = _fingerprint(self.paths)
+        pending = None
+        while not self._stop.wait(self.interval):
+            self._checks += 1
+            current = _fingerprint(self.paths)
+            if current == baseline:
+                pending = None
+                continue
+            if current != pending:
+                pending = current
+                continue
+
+            self.registry.reload(reason='watcher')
+            self._reloads += 1
+            baseline, pending = current, None
+
+    def stats(self):
+        return {
+            "enabled": self.is_running(),
+            "interval_seconds": self.interval,
+            "paths": self.paths,
+            "checks": self._checks,
+            "reloads": self._reloads
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Registro compartido del proceso"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
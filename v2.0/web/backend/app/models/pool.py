@@ -0,0 +1,108 @@
+"""
+Pool de conexiones instrumentado
+QueuePool de SQLAlchemy que además mide cuánto tarda cada checkout (espera por
+una conexión libre + conexión nueva + pre-ping), cuántas conexiones se abren
+por encima de pool_size (overflow), cuántos checkouts agotan pool_timeout y
+cuántas conexiones se descartan por estar caídas. Se activa desde
+Config.SQLALCHEMY_ENGINE_OPTIONS (poolclass) y se lee en GET /api/metrics.
+
+Cada proceso tiene su propio pool (y sus propias métricas): en gunicorn,
+post_fork descarta el pool heredado y el nuevo empieza en cero.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Checkouts recientes que se guardan para los percentiles
+_WINDOW = 1024
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool con métricas de checkout, overflow e invalidaciones"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkout_ms = deque(maxlen=_WINDOW)
+        self._checkouts = 0
+        self._checkout_total_ms = 0.0
+        self._checkout_max_ms = 0.0
+        self._max_in_use = 0
+        self._connects = 0
+        self._overflow_connects = 0
+        self._timeouts = 0
+        self._invalidated = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        elapsed = (time.perf_counter() - start) * 1000.0
+        in_use = self.checkedout()
+        with self._stats_lock:
+            self._checkouts += 1
+            self._checkout_total_ms += elapsed
+            self._checkout_max_ms = max(self._checkout_max_ms, elapsed)
+            self._checkout_ms.append(elapsed)
+            self._max_in_use = max(self._max_in_use, in_use)
+        return connection
+
+    def _create_connection(self):
+        # QueuePool incrementa _overflow antes de abrir la conexión: > 0 significa
+        # que se abre por encima de pool_size y se cerrará al devolverse
+        with self._stats_lock:
+            self._connects += 1
+            if self._overflow > 0:
+                self._overflow_connects += 1
+        return super()._create_connection()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            recent = np.array(self._checkout_ms)
+            checkouts = self._checkouts
+            return {
+                "pool_size": self.size(),
+                "max_overflow": self._max_overflow,
+                "timeout_s": self._timeout,
+                "in_use": self.checkedout(),
+                "idle": self.checkedin(),
+                "overflow": max(0, self.overflow()),
+                "max_in_use": self._max_in_use,
+                "checkouts": checkouts,
+                "checkout_ms": {
+                    "mean": self._checkout_total_ms / checkouts if checkouts else None,
+                    "p50": float(np.percentile(recent, 50)) if len(recent) else None,
+                    "p99": float(np.percentile(recent, 99)) if len(recent) else None,
+                    "max": self._checkout_max_ms if checkouts else None
+                },
+                "connections_opened": self._connects,
+                "overflow_events": self._overflow_connects,
+                "timeouts": self._timeouts,
+                "invalidated": self._invalidated
+            }
+
+
+@event.listens_for(InstrumentedQueuePool, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    """Conexión descartada (pre-ping fallido, desconexión o recycle forzado)"""
+    pool = getattr(connection_record, '_ConnectionRecord__pool', None)
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool._stats_lock:
+            pool._invalidated += 1
+
+
+def pool_stats(engine) -> dict:
+    """Métricas del pool del engine (básicas si no es InstrumentedQueuePool)"""
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return {"pool_class": type(pool).__name__, "status": pool.status()}
@@ -0,0 +1,139 @@
+"""
+Preprocesamiento fusionado: imputación + escalado
+SimpleImputer (NaN → estadístico) y StandardScaler ((x - mean) / scale) se
+reducen a arrays precalculados al cargar el modelo y se aplican en el lugar
+sobre un buffer reutilizable por hilo, sin la validación de sklearn.
+
+El escalado usa resta y división en float64, igual que
+StandardScaler.transform, así que el resultado es idéntico bit a bit.
+"""
+import threading
+
+import numpy as np
+
+from app.models.temporal_features import compute_temporal_features
+from app.utils.metrics import stage
+
+# Lotes más grandes que esto usan un buffer nuevo en vez del del hilo
+_MAX_BUFFER_ROWS = 1024
+
+
+class FusedPreprocessor:
+    """
+    Etapa de preprocesamiento derivada de imputer.pkl y scaler.pkl
+
+    - scale(X): vector completo (n_features) → escalado (ruta de ModelManager)
+    - transform_base(X_base): features base → imputación, features temporales
+      y escalado (ruta de DislexiaPredictor)
+
+    Los arrays retornados son buffers del hilo: válidos hasta la siguiente
+    llamada al mismo método desde el mismo hilo.
+    """
+
+    def __init__(self, schema, statistics, mean, scale):
+        self.schema = schema
+        self.n_features = schema.n_features
+        self.mean = np.ascontiguousarray(mean, dtype=np.float64)
+        self.scale_ = np.ascontiguousarray(scale, dtype=np.float64)
+
+        # Valor de relleno por columna del vector completo (NaN fuera del bloque base)
+        self.fill = np.full(self.n_features, np.nan)
+        self.fill[schema.base_index] = statistics
+
+        present = schema.derived_index >= 0
+        self._derived_present = np.flatnonzero(present)
+        self._derived_positions = schema.derived_index[present]
+        covered = np.zeros(self.n_features, dtype=bool)
+        covered[schema.base_index] = True
+        covered[self._derived_positions] = True
+        self._other_positions = np.flatnonzero(~covered)
+
+        self._local = threading.local()
+
+    @classmethod
+    def from_fitted(cls, imputer, scaler, schema):
+        """
+        Construir desde los objetos entrenados (sklearn o los equivalentes de
+        model_bundle)
+
+        Args:
+            imputer: Con statistics_ sobre las features base
+            scaler: Con mean_ y scale_ sobre el vector completo, o None
+        """
+        if getattr(imputer, 'add_indicator', False):
+            raise ValueError("Imputer con add_indicator no soportado")
+        statistics = np.asarray(imputer.statistics_, dtype=np.float64)
+        if statistics.shape != (schema.n_base,) or np.isnan(statistics).any():
+            raise ValueError("El imputer no cubre todas las features base")
+
+        mean = getattr(scaler, 'mean_', None) if scaler is not None else None
+        scale = getattr(scaler, 'scale_', None) if scaler is not None else None
+        return cls(
+            schema,
+            statistics,
+            mean if mean is not None else np.zeros(schema.n_features),
+            scale if scale is not None else np.ones(schema.n_features)
+        )
+
+    def _buffer(self, name, rows):
+        if rows > _MAX_BUFFER_ROWS:
+            return np.empty((rows, self.n_features))
+        buffer = getattr(self._local, name, None)
+        if buffer is None or len(buffer) < rows:
+            buffer = np.empty((max(rows, 32), self.n_features))
+            setattr(self._local, name, buffer)
+        return buffer[:rows]
+
+    def _scale_inplace(self, out):
+        np.subtract(out, self.mean, out=out)
+        np.divide(out, self.scale_, out=out)
+        return out
+
+    def scale(self, X):
+        """Equivalente a scaler.transform(X) para vectores completos"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(
+                f"Se esperaban {self.n_features} características, se recibieron {X.shape[1]}"
+            )
+
+        with stage('scaling'):
+            out = self._buffer('scaled', len(X))
+            np.copyto(out, X)
+            return self._scale_inplace(out)
+
+    def transform_base(self, X_base):
+        """
+        Equivalente a imputer.transform + features temporales + scaler.transform
+
+        Args:
+            X_base: Array (N, n_base) en el orden de schema.base_names (NaN = faltante)
+
+        Returns:
+            Array (N, n_features) escalado
+        """
+        schema = self.schema
+        out = self._buffer('base', len(X_base))
+
+        with stage('imputation'):
+            # Imputación: copiar el bloque base y rellenar NaN con el estadístico
+            out[:, schema.base_index] = X_base
+            np.copyto(out, self.fill, where=np.isnan(out))
+
+        with stage('temporal_features'):
+            # Features temporales desde los valores imputados (sin escalar)
+            temporal = schema.temporal_index
+            derived = compute_temporal_features(
+                out[:, temporal['Accuracy']],
+                out[:, temporal['Clicks']],
+                out[:, temporal['Hits']],
+                out[:, temporal['Misses']]
+            )
+            out[:, self._derived_positions] = derived[:, self._derived_present]
+            if len(self._other_positions):
+                out[:, self._other_positions] = 0.0
+
+        with stage('scaling'):
+            return self._scale_inplace(out)
@@ -0,0 +1,110 @@
+"""
+Kernel vectorizado de features temporales
+Calcula las 9 features derivadas del modelo para un bloque de N sesiones a la vez.
+
+Lo usan tanto el entrenamiento (py/modelo_dislexia.py) como la inferencia
+(DislexiaPredictor), por eso solo depende de NumPy.
+"""
+import numpy as np
+
+# Orden de las columnas que retorna compute_temporal_features
+TEMPORAL_FEATURES = [
+    'accuracy_trend',
+    'accuracy_mean_first_half',
+    'accuracy_mean_second_half',
+    'accuracy_improvement',
+    'clicks_variability',
+    'clicks_total',
+    'global_accuracy',
+    'error_concentration',
+    'consistency_score'
+]
+
+
+def nanmean_rows(values: np.ndarray) -> np.ndarray:
+    """Media por fila ignorando NaN (NaN si la fila no tiene valores)"""
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=1)
+    sums = np.where(valid, values, 0.0).sum(axis=1)
+    return np.divide(sums, counts, out=np.full(len(values), np.nan), where=counts > 0)
+
+
+def nanstd_rows(values: np.ndarray, ddof: int = 0) -> np.ndarray:
+    """Desviación estándar por fila ignorando NaN (NaN si no hay suficientes valores)"""
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=1)
+    means = nanmean_rows(values)
+    squares = np.where(valid, values - means[:, None], 0.0) ** 2
+    dof = counts - ddof
+    variance = np.divide(squares.sum(axis=1), dof, out=np.full(len(values), np.nan), where=dof > 0)
+    return np.sqrt(variance)
+
+
+def nanslope_rows(values: np.ndarray) -> np.ndarray:
+    """
+    Pendiente de mínimos cuadrados por fila, en forma cerrada.
+
+    Cada valor válido se ubica en su posición original (ronda 0..R-1), igual
+    que np.polyfit(valid_idx, valid_vals, 1) en el entrenamiento. Las filas con
+    menos de 2 valores válidos tienen pendiente 0.
+    """
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=1)
+    x = np.broadcast_to(np.arange(values.shape[1], dtype=np.float64), values.shape)
+
+    safe_counts = np.maximum(counts, 1)
+    x_mean = np.where(valid, x, 0.0).sum(axis=1) / safe_counts
+    y_mean = np.where(valid, values, 0.0).sum(axis=1) / safe_counts
+
+    dx = np.where(valid, x - x_mean[:, None], 0.0)
+    dy = np.where(valid, values - y_mean[:, None], 0.0)
+    sxx = (dx * dx).sum(axis=1)
+    sxy = (dx * dy).sum(axis=1)
+
+    return np.divide(sxy, sxx, out=np.zeros(len(values)), where=(counts >= 2) & (sxx > 0))
+
+
+def compute_temporal_features(accuracy: np.ndarray, clicks: np.ndarray,
+                              hits: np.ndarray, misses: np.ndarray) -> np.ndarray:
+    """
+    Calcular las features temporales para un bloque de sesiones
+
+    Args:
+        accuracy, clicks, hits, misses: Arrays (N, 32) con una columna por
+            ronda, en el orden de rondas que usó el entrenamiento. Admiten NaN.
+
+    Returns:
+        Array (N, 9) float64 en el orden de TEMPORAL_FEATURES
+    """
+    accuracy = np.asarray(accuracy, dtype=np.float64)
+    clicks = np.asarray(clicks, dtype=np.float64)
+    hits = np.asarray(hits, dtype=np.float64)
+    misses = np.asarray(misses, dtype=np.float64)
+
+    derived = np.empty((len(accuracy), len(TEMPORAL_FEATURES)))
+
+    # Tendencias de precision
+    derived[:, 0] = nanslope_rows(accuracy)
+    derived[:, 1] = nanmean_rows(accuracy[:, :16])
+    derived[:, 2] = nanmean_rows(accuracy[:, 16:32])
+    derived[:, 3] = derived[:, 2] - derived[:, 1]
+
+    # Variabilidad en clicks (desviación muestral, 0 si no se puede calcular)
+    derived[:, 4] = np.nan_to_num(nanstd_rows(clicks, ddof=1), nan=0.0)
+    derived[:, 5] = np.nansum(clicks, axis=1)
+
+    # Ratios globales
+    total_misses = np.nansum(misses, axis=1)
+    total_hits = np.nansum(hits, axis=1)
+    derived[:, 6] = total_hits / (total_hits + total_misses + 1e-8)
+    derived[:, 7] = np.fmax.reduce(misses, axis=1) / (total_misses + 1e-8)
+
+    # Consistencia: inverso del coeficiente de variación de accuracy
+    valid_counts = (~np.isnan(accuracy)).sum(axis=1)
+    acc_mean = nanmean_rows(accuracy)
+    acc_std = nanstd_rows(accuracy)
+    defined = (valid_counts > 1) & (acc_mean > 0)
+    cv = np.divide(acc_std, acc_mean, out=np.zeros(len(accuracy)), where=defined)
+    derived[:, 8] = np.where(defined, 1.0 / (1.0 + cv), 0.5)
+
+    return derived
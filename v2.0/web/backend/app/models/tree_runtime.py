@@ -0,0 +1,215 @@
+"""
+Runtime de árboles en arrays planos
+Exporta los boosters XGBoost de un CalibratedClassifierCV (isotonic) a arrays
+contiguos de NumPy y los evalúa de forma vectorizada, sin pasar por sklearn,
+el wrapper de XGBoost ni la construcción de DMatrix.
+"""
+import json
+
+import numpy as np
+
+# Elementos (filas × árboles) que se recorren a la vez; limita la memoria temporal
+_TRAVERSAL_BLOCK = 1 << 21
+
+
+def _parse_base_score(value):
+    """base_score viene como '5.0E-1' (XGBoost 1.x/2.x) o '[5.0E-1]' (3.x)"""
+    return float(str(value).strip('[]'))
+
+
+def _export_booster(booster):
+    """Arrays de nodos de un booster binary:logistic"""
+    raw = json.loads(booster.save_raw('json'))
+    learner = raw['learner']
+
+    objective = learner['objective']['name']
+    if objective != 'binary:logistic':
+        raise ValueError(f"Objetivo no soportado: {objective}")
+    if learner['gradient_booster']['name'] != 'gbtree':
+        raise ValueError("Solo se soportan boosters gbtree")
+
+    # Margen inicial como lo calcula XGBoost (float32): -log(1/p - 1)
+    base_score = np.float32(_parse_base_score(learner['learner_model_param']['base_score']))
+    base_margin = -np.log(np.float32(1.0) / base_score - np.float32(1.0))
+
+    trees = learner['gradient_booster']['model']['trees']
+    parts = []
+    for tree in trees:
+        if any(tree.get('split_type', [])):
+            raise ValueError("Los splits categóricos no están soportados")
+        left = np.asarray(tree['left_children'], dtype=np.int32)
+        parts.append({
+            'left': left,
+            'right': np.asarray(tree['right_children'], dtype=np.int32),
+            'feature': np.asarray(tree['split_indices'], dtype=np.int32),
+            'threshold': np.asarray(tree['split_conditions'], dtype=np.float32),
+            'default_left': np.asarray(tree['default_left'], dtype=bool),
+        })
+    return base_margin, parts
+
+
+def export_calibrated_ensemble(model):
+    """
+    Aplanar un CalibratedClassifierCV(XGBClassifier, method='isotonic')
+
+    Todos los árboles de todos los folds se concatenan en un único conjunto de
+    arrays de nodos; node_children guarda (izquierdo, derecho) intercalados con
+    índices globales y las hojas apuntan a sí mismas, de modo que el recorrido
+    puede hacer max_depth pasos fijos.
+
+    Returns:
+        Dict nombre → np.ndarray contiguo
+    """
+    if getattr(model, 'method', None) != 'isotonic':
+        raise ValueError("Solo se soportan modelos calibrados con method='isotonic'")
+
+    features, thresholds, children, defaults, values = [], [], [], [], []
+    tree_roots, tree_fold, base_margins = [], [], []
+    calib_x, calib_y, calib_offsets = [], [], [0]
+    max_depth = 0
+    offset = 0
+
+    for fold, calibrated in enumerate(model.calibrated_classifiers_):
+        base_margin, parts = _export_booster(calibrated.estimator.get_booster())
+        base_margins.append(base_margin)
+
+        for part in parts:
+            n_nodes = len(part['left'])
+            is_leaf = part['left'] < 0
+            local = np.arange(n_nodes, dtype=np.int32)
+
+            # Las hojas usan la feature 0: apuntan a sí mismas, la comparación no importa
+            features.append(np.where(is_leaf, 0, part['feature']))
+            thresholds.append(np.where(is_leaf, np.float32(0), part['threshold']))
+            values.append(np.where(is_leaf, part['threshold'], np.float32(0)))
+            children.append(np.stack([
+                np.where(is_leaf, local, part['left']),
+                np.where(is_leaf, local, part['right'])
+            ], axis=1) + offset)
+            defaults.append(part['default_left'])
+            tree_roots.append(offset)
+            tree_fold.append(fold)
+            max_depth = max(max_depth, _tree_depth(part['left'], part['right']))
+            offset += n_nodes
+
+        # Calibrador isotónico de la clase positiva
+        isotonic = calibrated.calibrators[0]
+        calib_x.append(np.asarray(isotonic.X_thresholds_))
+        calib_y.append(np.asarray(isotonic.y_thresholds_))
+        calib_offsets.append(calib_offsets[-1] + len(isotonic.X_thresholds_))
+
+    return {
+        'node_feature': np.concatenate(features).astype(np.int32),
+        'node_threshold': np.concatenate(thresholds).astype(np.float32),
+        'node_children': np.concatenate(children).astype(np.int32),
+        'node_default_left': np.concatenate(defaults).astype(bool),
+        'node_value': np.concatenate(values).astype(np.float32),
+        'tree_root': np.asarray(tree_roots, dtype=np.int32),
+        'tree_fold': np.asarray(tree_fold, dtype=np.int32),
+        'fold_base_margin': np.asarray(base_margins, dtype=np.float32),
+        'calib_x': np.concatenate(calib_x),
+        'calib_y': np.concatenate(calib_y),
+        'calib_offsets': np.asarray(calib_offsets, dtype=np.int64),
+        'classes': np.asarray(model.classes_),
+        'max_depth': np.asarray([max_depth], dtype=np.int32),
+    }
+
+
+def _tree_depth(left, right):
+    """Profundidad máxima (en aristas) de un árbol"""
+    depth = np.zeros(len(left), dtype=np.int32)
+    for node in range(len(left)):
+        if left[node] >= 0:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+class FlatTreeEnsemble:
+    """Evaluador vectorizado de un ensemble calibrado exportado a arrays"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.node_feature = arrays['node_feature']
+        self.node_threshold = arrays['node_threshold']
+        self.node_children = arrays['node_children']
+        self.node_default_left = arrays['node_default_left']
+        self.node_value = arrays['node_value']
+        self.tree_root = arrays['tree_root']
+        self.classes_ = arrays['classes']
+        self.max_depth = int(arrays['max_depth'][0])
+        self.base_margin = arrays['fold_base_margin']
+        self.n_folds = len(self.base_margin)
+
+        # Los árboles de cada fold son contiguos
+        tree_fold = arrays['tree_fold']
+        self._fold_starts = np.searchsorted(tree_fold, np.arange(self.n_folds))
+
+        offsets = arrays['calib_offsets']
+        self._calibrators = [
+            (arrays['calib_x'][offsets[f]:offsets[f + 1]], arrays['calib_y'][offsets[f]:offsets[f + 1]])
+            for f in range(self.n_folds)
+        ]
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(export_calibrated_ensemble(model))
+
+    def _leaf_values(self, X):
+        """Valor de hoja de cada árbol para cada fila: (N, n_trees) float32"""
+        n_rows, n_trees = len(X), len(self.tree_root)
+        n_cols = X.shape[1]
+        out = np.empty((n_rows, n_trees), dtype=np.float32)
+        block = max(1, _TRAVERSAL_BLOCK // n_trees)
+        has_nan = np.isnan(X).any()
+
+        for start in range(0, n_rows, block):
+            Xb = X[start:start + block].ravel()
+            row_offset = (np.arange(len(Xb) // n_cols, dtype=np.intp) * n_cols)[:, None]
+            nodes = np.broadcast_to(self.tree_root.astype(np.intp), (len(row_offset), n_trees)).copy()
+
+            for _ in range(self.max_depth):
+                values = Xb.take(row_offset + self.node_feature.take(nodes))
+                go_right = ~(values < self.node_threshold.take(nodes))
+                if has_nan:
+                    missing = np.isnan(values)
+                    go_right[missing] = ~self.node_default_left.take(nodes[missing])
+                # Hijos intercalados: un solo gather por nivel
+                nodes = self.node_children.reshape(-1).take(2 * nodes + go_right)
+
+            out[start:start + block] = self.node_value.take(nodes)
+        return out
+
+    def predict_proba(self, X):
+        """Probabilidades calibradas (N, 2), equivalente a CalibratedClassifierCV.predict_proba"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        leaves = self._leaf_values(X)
+        fold_ends = list(self._fold_starts[1:]) + [leaves.shape[1]]
+
+        positive = np.zeros(len(X))
+        for fold, (calib_x, calib_y) in enumerate(self._calibrators):
+            # XGBoost acumula las hojas árbol por árbol en float32, partiendo
+            # del margen base; cumsum reproduce ese orden de suma
+            terms = np.empty((len(X), fold_ends[fold] - self._fold_starts[fold] + 1), dtype=np.float32)
+            terms[:, 0] = self.base_margin[fold]
+            terms[:, 1:] = leaves[:, self._fold_starts[fold]:fold_ends[fold]]
+            margin = np.cumsum(terms, axis=1, dtype=np.float32)[:, -1]
+            # Sigmoide de XGBoost: expf (redondeo correcto) y división en float32
+            exp = np.exp(-margin.astype(np.float64)).astype(np.float32)
+            raw = np.float32(1.0) / (np.float32(1.0) + exp)
+            # IsotonicRegression(out_of_bounds='clip'): interpolación lineal con recorte
+            calibrated = np.interp(raw.astype(calib_x.dtype), calib_x, calib_y).astype(calib_x.dtype)
+            positive += calibrated
+        positive /= self.n_folds
+
+        proba = np.empty((len(X), 2))
+        proba[:, 1] = positive
+        proba[:, 0] = 1.0 - positive
+        proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
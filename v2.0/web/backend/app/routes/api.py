@@ -1,12 +1,95 @@
-from flask import Blueprint, request
+import atexit
+import hmac
+import time
+from datetime import datetime
+from flask import Blueprint, request, stream_with_context
+from flask import Response as FlaskResponse
+from app.config import Config
+from app.models.database import db
+from app.models.pool import pool_stats
 from app.services.prediction_service import PredictionService
 from app.services.database_service import DatabaseService
+from app.services.write_behind import WriteBehindQueue
 from app.utils.helpers import Response, Validator
+from app.utils import wire_format
+from app.utils.log import get_logger, logging_stats
+from app.utils.metrics import METRICS, latency_summary, stage
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
+log = get_logger(__name__)
 prediction_service = PredictionService()
 db_service = DatabaseService()
 
+# Resultados de evaluación: escritura diferida en lotes (None = escritura síncrona)
+result_writer = None
+if Config.WRITE_BEHIND_ENABLED:
+    result_writer = WriteBehindQueue(
+        db_service.create_test_results,
+        capacity=Config.WRITE_BEHIND_CAPACITY,
+        batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval=Config.WRITE_BEHIND_FLUSH_INTERVAL,
+        max_retries=Config.WRITE_BEHIND_MAX_RETRIES,
+        retry_backoff=Config.WRITE_BEHIND_RETRY_BACKOFF,
+        put_timeout=Config.WRITE_BEHIND_PUT_TIMEOUT,
+        spill_path=Config.WRITE_BEHIND_SPILL_PATH,
+        replay_interval=Config.WRITE_BEHIND_REPLAY_INTERVAL
+    )
+    # Vaciar la cola al salir (gunicorn lo hace también en worker_exit)
+    atexit.register(result_writer.close, Config.WRITE_BEHIND_DRAIN_TIMEOUT)
+
+
+def _runtime_metrics():
+    """Estado del modelo, cache, escritura diferida, pool y logging para Prometheus"""
+    registry = prediction_service.model_manager.registry
+    families = []
+    if registry.is_loaded():
+        artifacts = registry.current()
+        families.append(('dyslexia_model_info', 'gauge', 'Modelo cargado en este proceso',
+                         [({'version': artifacts.version, 'generation': artifacts.generation,
+                            'source': artifacts.source}, 1)]))
+    if prediction_service.cache is not None:
+        cache = prediction_service.cache.stats()
+        families += [
+            ('dyslexia_prediction_cache_hits_total', 'counter', 'Aciertos del cache de predicciones',
+             [({}, cache['hits'])]),
+            ('dyslexia_prediction_cache_misses_total', 'counter', 'Fallos del cache de predicciones',
+             [({}, cache['misses'])]),
+            ('dyslexia_prediction_cache_evictions_total', 'counter', 'Entradas desalojadas del cache',
+             [({}, cache['evictions'])]),
+            ('dyslexia_prediction_cache_entries', 'gauge', 'Entradas en el cache de predicciones',
+             [({}, cache['entries'])]),
+        ]
+    if result_writer is not None:
+        writer = result_writer.stats()
+        families += [
+            ('dyslexia_write_behind_queued', 'gauge', 'Resultados esperando ser escritos',
+             [({}, writer['queued'])]),
+            ('dyslexia_write_behind_written_total', 'counter', 'Resultados escritos en la BD',
+             [({}, writer['written'])]),
+            ('dyslexia_write_behind_spilled_total', 'counter', 'Resultados guardados en el archivo de derrame',
+             [({}, writer['spilled'])]),
+            ('dyslexia_write_behind_rejected_total', 'counter', 'Resultados rechazados por la BD',
+             [({}, writer['rejected'])]),
+        ]
+    pool = pool_stats(db.engine)
+    if 'in_use' in pool:
+        families += [
+            ('dyslexia_db_pool_in_use', 'gauge', 'Conexiones a la BD en uso', [({}, pool['in_use'])]),
+            ('dyslexia_db_pool_size', 'gauge', 'Tamaño del pool de conexiones', [({}, pool['pool_size'])]),
+            ('dyslexia_db_pool_overflow_events_total', 'counter', 'Conexiones abiertas por encima de pool_size',
+             [({}, pool['overflow_events'])]),
+            ('dyslexia_db_pool_timeouts_total', 'counter', 'Checkouts que agotaron DB_POOL_TIMEOUT',
+             [({}, pool['timeouts'])]),
+        ]
+    logging_info = logging_stats()
+    if 'dropped' in logging_info:
+        families.append(('dyslexia_log_dropped_total', 'counter', 'Registros de log descartados (cola llena)',
+                         [({}, logging_info['dropped'])]))
+    return families
+
+
+METRICS.register_collector(_runtime_metrics)
+
 # ==== HEALTH CHECK ====
 @api_bp.route('/health', methods=['GET'])
 def health():
@@ -32,6 +115,75 @@ def model_info():
     except Exception as e:
         return Response.error(str(e), 500)
 
+@api_bp.route('/model/registry', methods=['GET'])
+def model_registry():
+    """Artefactos cargados en este proceso (origen, tiempo de carga, memoria)"""
+    try:
+        return Response.success(
+            data=prediction_service.get_registry_stats(),
+            message="Registro de modelos obtenido"
+        )
+    except Exception as e:
+        return Response.error(str(e), 500)
+
+@api_bp.route('/model/reload', methods=['POST'])
+def model_reload():
+    """
+    Recargar el modelo desde disco sin reiniciar (admin).
+    
+    Header: X-Admin-Token o Authorization: Bearer <MODEL_ADMIN_TOKEN>
+    Body opcional: {"wait": true} - false para recargar en segundo plano (202)
+    """
+    try:
+        if not Config.MODEL_ADMIN_TOKEN:
+            return Response.error("Recarga de modelo deshabilitada (MODEL_ADMIN_TOKEN)", 403)
+        
+        token = request.headers.get('X-Admin-Token', '')
+        auth = request.headers.get('Authorization', '')
+        if not token and auth.startswith('Bearer '):
+            token = auth[len('Bearer '):]
+        if not hmac.compare_digest(token.encode(), Config.MODEL_ADMIN_TOKEN.encode()):
+            return Response.error("Token de administración inválido", 401)
+        
+        data = request.get_json(silent=True) or {}
+        result = prediction_service.reload_model(wait=data.get('wait', True))
+        
+        status = result['status']
+        if status == 'failed':
+            return Response.error(f"Error recargando modelo: {result.get('error')}", 500)
+        if status == 'in_progress':
+            return Response.error("Ya hay una recarga en curso", 409)
+        return Response.success(
+            data=result,
+            message="Modelo recargado" if status == 'swapped' else "Recarga iniciada",
+            status_code=200 if status == 'swapped' else 202
+        )
+    except Exception as e:
+        return Response.error(str(e), 500)
+
+# ==== RUNTIME METRICS ====
+@api_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Métricas de ejecución en texto de Prometheus (latencias por endpoint y
+    etapa, requests, errores, cache, modelo...). Con ?format=json, el detalle
+    de cada componente y un resumen de latencias en JSON.
+    """
+    try:
+        if request.args.get('format') != 'json':
+            return FlaskResponse(METRICS.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+        data = prediction_service.get_runtime_stats()
+        data['write_behind'] = result_writer.stats() if result_writer else {"enabled": False}
+        data['database_pool'] = pool_stats(db.engine)
+        data['logging'] = logging_stats()
+        data['latency'] = latency_summary()
+        return Response.success(
+            data=data,
+            message="Métricas obtenidas"
+        )
+    except Exception as e:
+        return Response.error(str(e), 500)
+
 # ==== PROCESAMIENTO DE ACTIVIDADES ====
 @api_bp.route('/activities/process', methods=['POST'])
 def process_activities():
@@ -110,7 +262,8 @@ def evaluate_sequence():
                 'result': 'SÍ' if result['has_dyslexia_indicators'] else 'NO',
                 'probability': result['probability'],
                 'confidence': result['confidence'],
-                'details': result
+                'details': result,
+                'model_version': result.get('model_version')
             },
             message="Evaluación de secuencia completada"
         )
@@ -146,7 +299,8 @@ def evaluate_mirror():
                 'result': 'SÍ' if result['has_dyslexia_indicators'] else 'NO',
                 'probability': result['probability'],
                 'confidence': result['confidence'],
-                'details': result
+                'details': result,
+                'model_version': result.get('model_version')
             },
             message="Evaluación de simetría completada"
         )
@@ -182,7 +336,8 @@ def evaluate_rhythm():
                 'result': 'SÍ' if result['has_dyslexia_indicators'] else 'NO',
                 'probability': result['probability'],
                 'confidence': result['confidence'],
-                'details': result
+                'details': result,
+                'model_version': result.get('model_version')
             },
             message="Evaluación de ritmo completada"
         )
@@ -218,7 +373,8 @@ def evaluate_speed():
                 'result': 'SÍ' if result['has_dyslexia_indicators'] else 'NO',
                 'probability': result['probability'],
                 'confidence': result['confidence'],
-                'details': result
+                'details': result,
+                'model_version': result.get('model_version')
             },
             message="Evaluación de velocidad completada"
         )
@@ -254,7 +410,8 @@ def evaluate_memory():
                 'result': 'SÍ' if result['has_dyslexia_indicators'] else 'NO',
                 'probability': result['probability'],
                 'confidence': result['confidence'],
-                'details': result
+                'details': result,
+                'model_version': result.get('model_version')
             },
             message="Evaluación de memoria completada"
         )
@@ -288,7 +445,8 @@ def evaluate_text():
                 'result': 'SÍ' if result['has_dyslexia_indicators'] else 'NO',
                 'probability': result['probability'],
                 'confidence': result['confidence'],
-                'details': result
+                'details': result,
+                'model_version': result.get('model_version')
             },
             message="Evaluación de PLN completada"
         )
@@ -301,15 +459,16 @@ def evaluate_text():
 def predict():
     """Realizar una predicción individual"""
     try:
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         
         if not data or 'features' not in data:
             return Response.error("Campo 'features' requerido", 400)
         
-        features = data['features']
-        
-        # Validar características
-        validation_errors = Validator.validate_features(features)
+        # Validar y convertir características (longitud según el esquema del modelo)
+        features, validation_errors = Validator.feature_vector(
+            data['features'], prediction_service.model_manager.schema.n_features
+        )
         if validation_errors:
             return Response.validation_error(validation_errors)
         
@@ -331,7 +490,8 @@ def predict():
 def predict_batch():
     """Realizar predicciones en lote"""
     try:
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         
         if not data or 'data' not in data:
             return Response.error("Campo 'data' requerido", 400)
@@ -341,15 +501,25 @@ def predict_batch():
         if not isinstance(data_list, list) or len(data_list) == 0:
             return Response.error("'data' debe ser una lista no vacía", 400)
         
-        # Predicciones
-        results = prediction_service.predict_batch(data_list)
+        # Validar el lote como una sola matriz (errores por fila)
+        X, validation_errors = Validator.feature_matrix(
+            data_list, prediction_service.model_manager.schema.n_features
+        )
+        if validation_errors:
+            return Response.validation_error(validation_errors)
+        
+        # Predicciones (resultado columnar: una lista por campo)
+        results = prediction_service.predict_batch(X)
+        model_version = results.pop("model_version")
+        total = len(results["prediction"])
         
         return Response.success(
             data={
                 "predictions": results,
-                "total": len(results)
+                "total": total,
+                "model_version": model_version
             },
-            message=f"Predicciones completadas para {len(results)} muestras"
+            message=f"Predicciones completadas para {total} muestras"
         )
     
     except ValueError as e:
@@ -357,6 +527,29 @@ def predict_batch():
     except Exception as e:
         return Response.error(f"Error en predicciones: {str(e)}", 500)
 
+# ==== STREAMING PREDICTION ====
+@api_bp.route('/predict/stream', methods=['POST'])
+def predict_stream():
+    """
+    Predicciones en streaming (NDJSON).
+    
+    Cuerpo: una fila por línea, lista de features o {"id": ..., "features": [...]}.
+    Respuesta: application/x-ndjson con un resultado por fila (en bloques de
+    STREAM_CHUNK_SIZE), errores por línea y un resumen final.
+    """
+    try:
+        chunk_size = request.args.get('chunk_size', Config.STREAM_CHUNK_SIZE, type=int)
+        if chunk_size < 1 or chunk_size > Config.STREAM_MAX_CHUNK_SIZE:
+            return Response.error(
+                f"chunk_size debe estar entre 1 y {Config.STREAM_MAX_CHUNK_SIZE}", 400
+            )
+        
+        results = prediction_service.predict_stream(request.stream, chunk_size=chunk_size)
+        return FlaskResponse(stream_with_context(results), mimetype='application/x-ndjson')
+    
+    except Exception as e:
+        return Response.error(f"Error en predicciones: {str(e)}", 500)
+
 # ==== ROUNDS EVALUATION (FORMATO CORRECTO DATASET DYT-DESKTOP.CSV) ====
 @api_bp.route('/activities/rounds/evaluate', methods=['POST'])
 def evaluate_rounds():
@@ -382,39 +575,55 @@ def evaluate_rounds():
             ...
         ]
     }
+    
+    También acepta el formato binario compacto de app/utils/wire_format.py
+    con Content-Type: application/vnd.dyslexia.rounds (misma respuesta).
     """
     try:
-        data = request.get_json()
-        
-        print("[RECV] Datos recibidos en /activities/rounds/evaluate")
-        print(f"   Data es None: {data is None}")
+        start = time.perf_counter()
+        # Formato binario: rondas decodificadas directamente a un array
+        rounds = None
+        with stage('parse'):
+            if request.mimetype == wire_format.CONTENT_TYPE:
+                data, rounds = wire_format.decode_rounds(request.get_data())
+            else:
+                data = request.get_json()
         
         if not data:
-            print("[ERROR] No se recibieron datos")
+            log.warning("Evaluación sin datos", endpoint='rounds/evaluate')
             return Response.error("No se recibieron datos", 400)
         
-        print(f"   Keys en data: {list(data.keys())}")
-        
         # Validar formato
         if 'user' not in data:
-            print("❌ ERROR: Falta campo 'user'")
+            log.warning("Evaluación sin campo 'user'", endpoint='rounds/evaluate', keys=list(data.keys()))
             return Response.error("Campo 'user' requerido con gender, age, native_lang, other_lang", 400)
         
         if 'activities' not in data:
-            print("❌ ERROR: Falta campo 'activities'")
+            log.warning("Evaluación sin campo 'activities'", endpoint='rounds/evaluate', keys=list(data.keys()))
             return Response.error("Campo 'activities' requerido con lista de actividades completadas", 400)
         
-        print(f"   User: {data['user']}")
-        print(f"   Activities: {len(data['activities'])} actividades")
-        for i, act in enumerate(data['activities']):
-            print(f"     [{i}] {act.get('name', 'SIN_NOMBRE')}: {len(act.get('rounds', []))} rondas")
+        # Rondas por actividad (el formato binario trae solo el conteo)
+        round_counts = [act['round_count'] if 'round_count' in act else len(act.get('rounds', []))
+                        for act in data['activities']]
         
-        # Extraer características usando el FeatureExtractor correcto
-        features = prediction_service.feature_extractor.combine_all_features(data)
+        # Volcado del payload solo con LOG_LEVEL=DEBUG y LOG_DEBUG_PAYLOADS=true
+        if log.payloads_enabled:
+            log.debug("Evaluación recibida", endpoint='rounds/evaluate', user=data['user'],
+                      activities={act.get('name', 'SIN_NOMBRE'): count
+                                  for act, count in zip(data['activities'], round_counts)})
         
-        # Verificar que tenemos 205 features
-        if len(features) != 205:
-            return Response.error(f"Se esperaban 205 características, se recibieron {len(features)}", 400)
+        # Extraer características usando el FeatureExtractor correcto
+        if rounds is not None:
+            features = prediction_service.feature_extractor.combine_rounds(data['user'], rounds)
+        else:
+            features = prediction_service.feature_extractor.combine_all_features(data)
+        
+        # Verificar el largo contra el esquema del modelo cargado
+        n_features = prediction_service.model_manager.schema.n_features
+        if len(features) != n_features:
+            return Response.error(
+                f"Se esperaban {n_features} características, se recibieron {len(features)}", 400
+            )
         
         # Realizar predicción
         result = prediction_service.predict(features)
@@ -433,9 +642,10 @@ def evaluate_rounds():
             'confidence': round(result['confidence'] * 100, 2),
             'risk_level': result['risk_level'],
             'duration_seconds': data.get('durationSeconds'),
+            'timestamp': datetime.utcnow().isoformat(),
             'details': {
                 "activities_processed": len(data['activities']),
-                "total_rounds": sum(len(act.get('rounds', [])) for act in data['activities']),
+                "total_rounds": sum(round_counts),
                 "features_extracted": len(features),
                 "user_age": data['user'].get('age'),
                 "user_gender": data['user'].get('gender')
@@ -457,6 +667,10 @@ def evaluate_rounds():
             } if data.get('childId') else None
         }
         
+        # Rondas de la primera actividad como dicts (también en formato binario)
+        if rounds is not None and data['activities']:
+            data['activities'][0]['rounds'] = wire_format.rounds_to_records(rounds[:round_counts[0]])
+        
         # Agregar rondas si existen
         if data['activities'] and 'rounds' in data['activities'][0]:
             rounds_data = []
@@ -488,14 +702,25 @@ def evaluate_rounds():
             test_result_data['total_hits'] = total_hits
             test_result_data['total_misses'] = total_misses
         
-        # Guardar en base de datos
+        # Guardar en base de datos (en segundo plano si la escritura diferida está activa)
         try:
-            saved_result = db_service.create_test_result(test_result_data)
-            print(f"✅ Resultado guardado en BD con ID: {saved_result.id}")
+            if result_writer is not None:
+                if result_writer.submit(test_result_data) == 'spilled':
+                    log.warning("Cola de escritura llena; resultado guardado en disco",
+                                spill_path=result_writer.spill_path)
+            else:
+                saved_result = db_service.create_test_result(test_result_data)
+                log.debug("Resultado guardado en BD", result_id=saved_result.id)
         except Exception as e:
-            print(f"[WARN] Error guardando en BD: {str(e)}")
+            log.warning("Error guardando en BD", error=str(e))
             # No fallar la request si falla el guardado
         
+        # Resumen por request: DEBUG (y muestreado) para que INFO no cueste nada por request
+        log.debug("Evaluación completada", sampled=True, endpoint='rounds/evaluate',
+                  risk_level=test_result_data['risk_level'], rounds=sum(round_counts),
+                  binary=rounds is not None, model_version=result['model_version'],
+                  duration_ms=round((time.perf_counter() - start) * 1000.0, 3))
+        
         # Resultado basado en si hay indicadores de dislexia (riesgo medio o alto)
         has_indicators = test_result_data['risk_level'] in ['Medio', 'Alto']
         return Response.success(
@@ -504,7 +729,8 @@ def evaluate_rounds():
                 "probability": test_result_data['probability'],
                 "confidence": test_result_data['confidence'],
                 "risk_level": test_result_data['risk_level'],
-                "details": test_result_data['details']
+                "details": test_result_data['details'],
+                "model_version": result['model_version']
             },
             message="Evaluación completada usando modelo entrenado (89.48% accuracy)"
         )
@@ -587,7 +813,8 @@ def children():
     elif request.method == 'POST':
         try:
             data = request.get_json()
-            print(f"\n📝 Datos recibidos para crear niño: {data}\n")
+            if log.payloads_enabled:
+                log.debug("Datos recibidos para crear niño", payload=data)
             
             # Validar que el usuario (tutor) existe
             user_id = data.get('user_id')
@@ -596,7 +823,7 @@ def children():
             
             user = db_service.get_user(user_id)
             if not user:
-                print(f"[WARN] Usuario {user_id} no existe, creando automáticamente...")
+                log.warning("Tutor no encontrado al crear niño", user_id=user_id)
                 return Response.error(f"Usuario (tutor) con ID '{user_id}' no encontrado. Registra primero al tutor.", 404)
             
             # Crear el niño
@@ -604,7 +831,7 @@ def children():
             
             # Convertir a dict y retornar
             child_dict = child.to_dict()
-            print(f"[OK] Retornando child_dict: {child_dict}")
+            log.info("Niño creado", child_id=child_dict['id'], user_id=user_id)
             
             return Response.success(
                 data=child_dict,
@@ -612,9 +839,7 @@ def children():
                 status_code=201
             )
         except Exception as e:
-            import traceback
-            error_msg = traceback.format_exc()
-            print(f"[ERROR] Error creando niño:\n{error_msg}")
+            log.exception("Error creando niño")
             return Response.error(f"Error creando niño: {str(e)}", 500)
 
 @api_bp.route('/children/<child_id>', methods=['GET', 'PUT', 'DELETE'])
@@ -4,6 +4,10 @@ Servicio de base de datos para operaciones CRUD
 from datetime import datetime
 from app.models.database import db, User, Child, TestResult, ActivityRound
 from sqlalchemy.exc import SQLAlchemyError
+from app.utils.log import get_logger
+from app.utils.metrics import stage
+
+log = get_logger(__name__)
 
 
 class DatabaseService:
@@ -85,7 +89,7 @@ class DatabaseService:
             # Asegurar que el usuario (tutor) existe
             user = User.query.get(user_id)
             if not user:
-                print(f"[WARN] Usuario {user_id} no existe, creando automáticamente...")
+                log.warning("Tutor no existe, creando automáticamente", user_id=user_id)
                 user = User(
                     id=user_id,
                     name=child_data.get('tutor_name', f'Tutor {user_id}'),
@@ -107,8 +111,6 @@ class DatabaseService:
                 birth_date=child_data.get('birth_date')
             )
             
-            print(f"📝 Creando Child: id={child.id}, name={child.name}, age={child.age}, gender={child.gender}, user_id={child.user_id}")
-            
             db.session.add(child)
             db.session.commit()
             
@@ -119,16 +121,16 @@ class DatabaseService:
             # Desatachar el objeto para evitar problemas con transacciones
             db.session.expunge(child)
             
-            print(f"✅ Niño guardado exitosamente en BD: {child_name} (ID: {child_id})")
+            log.info("Niño guardado en BD", child_id=child_id, child_name=child_name)
             return child
             
         except SQLAlchemyError as e:
             db.session.rollback()
-            print(f"❌ Error SQLAlchemy creando niño: {str(e)}")
+            log.error("Error SQLAlchemy creando niño", error=str(e))
             raise e
         except Exception as e:
             db.session.rollback()
-            print(f"❌ Error general creando niño: {str(e)}")
+            log.error("Error general creando niño", error=str(e))
             raise e
     
     @staticmethod
@@ -197,7 +199,7 @@ class DatabaseService:
             )
             db.session.add(user)
             db.session.flush()
-            print(f"✅ Usuario creado automáticamente: {user_id}")
+            log.info("Usuario creado automáticamente", user_id=user_id)
         return user
     
     @staticmethod
@@ -215,66 +217,111 @@ class DatabaseService:
             )
             db.session.add(child)
             db.session.flush()
-            print(f"✅ Niño creado automáticamente: {child_id}")
+            log.info("Niño creado automáticamente", child_id=child_id)
         return child
     
     # ============ TEST RESULTS ============
     
+    @staticmethod
+    def _add_test_result(result_data, round_rows):
+        """
+        Agregar un resultado (con usuario y niño) a la sesión, sin commit
+        
+        Las rondas no se agregan como objetos: sus filas se acumulan en
+        round_rows para insertarlas todas juntas con _insert_rounds
+        """
+        # Asegurar que el usuario existe
+        user_id = result_data['user_id']
+        user_info = result_data.get('user_info', {})
+        DatabaseService.get_or_create_user(user_id, user_info)
+        
+        # Asegurar que el niño existe (si se proporciona)
+        child_id = result_data.get('child_id')
+        if child_id:
+            child_info = result_data.get('child_info') or {}
+            child_info['user_id'] = user_id  # Vincular al padre
+            DatabaseService.get_or_create_child(child_id, child_info)
+        
+        test_result = TestResult(
+            user_id=user_id,
+            child_id=child_id,
+            activity_id=result_data['activity_id'],
+            activity_name=result_data['activity_name'],
+            result=result_data['result'],
+            probability=result_data['probability'],
+            confidence=result_data['confidence'],
+            risk_level=result_data['risk_level'],
+            duration_seconds=result_data.get('duration_seconds'),
+            total_clicks=result_data.get('total_clicks'),
+            total_hits=result_data.get('total_hits'),
+            total_misses=result_data.get('total_misses'),
+            details=result_data.get('details')
+        )
+        # Momento de la evaluación (con escritura diferida, anterior al INSERT)
+        if result_data.get('timestamp'):
+            test_result.timestamp = datetime.fromisoformat(result_data['timestamp'])
+        db.session.add(test_result)
+        db.session.flush()  # Para obtener el ID
+        
+        # Filas de las rondas, si existen
+        for round_data in result_data.get('rounds') or ():
+            round_rows.append({
+                'test_result_id': test_result.id,
+                'round_number': round_data['round_number'],
+                'clicks': round_data.get('clicks', 0),
+                'hits': round_data.get('hits', 0),
+                'misses': round_data.get('misses', 0),
+                'score': round_data.get('score', 0.0),
+                'attempts': round_data.get('attempts', 0),
+                'time_seconds': round_data.get('time_seconds', 0.0)
+            })
+        
+        return test_result
+    
+    @staticmethod
+    def _insert_rounds(round_rows):
+        """
+        Insertar filas de activity_rounds con un solo INSERT (executemany)
+        
+        Usa la tabla de Core en vez de objetos ActivityRound: no pasa por la
+        unidad de trabajo del ORM y el driver (pymysql) envía un INSERT de
+        varias filas en lugar de uno por ronda.
+        """
+        if not round_rows:
+            return
+        created_at = datetime.utcnow()
+        for row in round_rows:
+            row['created_at'] = created_at
+        db.session.execute(ActivityRound.__table__.insert(), round_rows)
+    
     @staticmethod
     def create_test_result(result_data):
         """Crear un nuevo resultado de prueba"""
         try:
-            # Asegurar que el usuario existe
-            user_id = result_data['user_id']
-            user_info = result_data.get('user_info', {})
-            DatabaseService.get_or_create_user(user_id, user_info)
-            
-            # Asegurar que el niño existe (si se proporciona)
-            child_id = result_data.get('child_id')
-            if child_id:
-                child_info = result_data.get('child_info', {})
-                child_info['user_id'] = user_id  # Vincular al padre
-                DatabaseService.get_or_create_child(child_id, child_info)
-            
-            test_result = TestResult(
-                user_id=user_id,
-                child_id=child_id,
-                activity_id=result_data['activity_id'],
-                activity_name=result_data['activity_name'],
-                result=result_data['result'],
-                probability=result_data['probability'],
-                confidence=result_data['confidence'],
-                risk_level=result_data['risk_level'],
-                duration_seconds=result_data.get('duration_seconds'),
-                total_clicks=result_data.get('total_clicks'),
-                total_hits=result_data.get('total_hits'),
-                total_misses=result_data.get('total_misses'),
-                details=result_data.get('details')
-            )
-            db.session.add(test_result)
-            db.session.flush()  # Para obtener el ID
-            
-            # Crear rondas si existen
-            if 'rounds' in result_data and result_data['rounds']:
-                for round_data in result_data['rounds']:
-                    activity_round = ActivityRound(
-                        test_result_id=test_result.id,
-                        round_number=round_data['round_number'],
-                        clicks=round_data.get('clicks', 0),
-                        hits=round_data.get('hits', 0),
-                        misses=round_data.get('misses', 0),
-                        score=round_data.get('score', 0.0),
-                        attempts=round_data.get('attempts', 0),
-                        time_seconds=round_data.get('time_seconds', 0.0)
-                    )
-                    db.session.add(activity_round)
-            
-            db.session.commit()
+            with stage('db_write'):
+                round_rows = []
+                test_result = DatabaseService._add_test_result(result_data, round_rows)
+                DatabaseService._insert_rounds(round_rows)
+                db.session.commit()
             return test_result
         except SQLAlchemyError as e:
             db.session.rollback()
             raise e
     
+    @staticmethod
+    def create_test_results(results_data):
+        """Crear varios resultados de prueba (y todas sus rondas) en una sola transacción"""
+        try:
+            with stage('db_write'):
+                round_rows = []
+                test_results = [DatabaseService._add_test_result(data, round_rows) for data in results_data]
+                DatabaseService._insert_rounds(round_rows)
+                db.session.commit()
+            return test_results
+        except Exception:
+            db.session.rollback()
+            raise
+    
     @staticmethod
     def get_test_result(result_id):
         """Obtener resultado por ID"""
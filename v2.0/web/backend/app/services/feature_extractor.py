@@ -8,6 +8,15 @@ import numpy as np
 from typing import Dict, List, Tuple
 import json
 from datetime import datetime
+from app.models.feature_schema import get_feature_schema, FeatureSchema
+from app.models.temporal_features import TEMPORAL_FEATURES
+from app.utils.metrics import timed
+
+# Rondas equivalentes que espera el modelo
+TARGET_ROUNDS = 32
+
+# Columnas de la matriz de rondas (orden de FeatureExtractor.ROUND_METRICS)
+_CLICKS, _HITS, _MISSES, _SCORE, _ACCURACY, _MISSRATE = range(6)
 
 
 class FeatureExtractor:
@@ -22,171 +31,197 @@ class FeatureExtractor:
     Total: 4 + 192 + 9 = 205 features
     """
     
-    def __init__(self):
-        self.feature_names = self._initialize_feature_names()
+    # Métricas de ronda en el orden del esquema y su clave en los payloads
+    ROUND_METRICS = (
+        ('Clicks', 'clicks'),
+        ('Hits', 'hits'),
+        ('Misses', 'misses'),
+        ('Score', 'score'),
+        ('Accuracy', 'accuracy'),
+        ('Missrate', 'missrate')
+    )
     
-    def _initialize_feature_names(self) -> List[str]:
+    def __init__(self, schema: FeatureSchema = None):
+        self.schema = schema or get_feature_schema()
+        self.feature_names = list(self.schema.features)
+        
+        # Posiciones en el vector de salida: demográficas, (32, 6) para las
+        # rondas y 9 derivadas
+        self._demographic_positions = np.array(
+            [self.schema.demographic_index[name] for name in ('Gender', 'Nativelang', 'Otherlang', 'Age')]
+        )
+        self._round_positions = np.stack(
+            [self.schema.metric_index[metric] for metric, _ in self.ROUND_METRICS], axis=1
+        )
+        self._derived_positions = np.array([self.schema.index[name] for name in TEMPORAL_FEATURES])
+    
+    @staticmethod
+    def _demographic_values(user_data: Dict) -> Tuple[float, float, float, float]:
+        """Gender, Nativelang, Otherlang y Age codificados como en el dataset"""
+        # Gender: Male=1, Female=0
+        gender = user_data.get('gender', 'Male')
+        # Nativelang / Otherlang: Yes=1, No=0
+        native_lang = user_data.get('native_lang', True)
+        other_lang = user_data.get('other_lang', False)
+        # Age: número entero
+        return (
+            1 if gender.lower() == 'male' else 0,
+            1 if native_lang else 0,
+            1 if other_lang else 0,
+            user_data.get('age', 8)
+        )
+    
+    def _pack_rounds(self, activities: List[Dict]) -> np.ndarray:
         """
-        Inicializar las 206 características exactas del modelo:
-        - 4 demográficas: Gender, Nativelang, Otherlang, Age
-        - 192 métricas de 32 rondas: Clicks, Hits, Misses, Score, Accuracy, Missrate × 32
-        - 10 features derivadas: accuracy_trend, accuracy_mean_first_half, etc.
+        Empaqueta las rondas de todas las actividades, en orden, en una matriz
+        (n_rondas, 6) float64 con las columnas de ROUND_METRICS.
+        Los campos ausentes valen 0.
         """
-        features = []
-        
-        # 1. Características demográficas (4 features)
-        features.extend(['Gender', 'Nativelang', 'Otherlang', 'Age'])
-        
-        # 2. Métricas de 32 rondas (192 features = 32 rondas × 6 métricas)
-        for i in range(1, 33):  # Rondas 1-32
-            features.extend([
-                f'Clicks{i}',
-                f'Hits{i}',
-                f'Misses{i}',
-                f'Score{i}',
-                f'Accuracy{i}',
-                f'Missrate{i}'
-            ])
+        keys = [key for _, key in self.ROUND_METRICS]
+        values = np.fromiter(
+            (round_data.get(key, 0)
+             for activity in activities
+             for round_data in activity.get('rounds', [])
+             for key in keys),
+            dtype=np.float64
+        )
+        return self._normalize_rounds(values.reshape(-1, len(keys)))
+    
+    @staticmethod
+    def _normalize_rounds(rounds: np.ndarray) -> np.ndarray:
+        """
+        Normaliza en el lugar Accuracy y Missrate de una matriz (..., 6) de rondas
         
-        # 3. Features derivadas (9 features)
-        features.extend([
-            'accuracy_trend',           # Tendencia de accuracy a lo largo de las rondas
-            'accuracy_mean_first_half', # Promedio de accuracy en primeras 16 rondas
-            'accuracy_mean_second_half',# Promedio de accuracy en últimas 16 rondas
-            'accuracy_improvement',     # Mejora entre primera y segunda mitad
-            'clicks_variability',       # Variabilidad en número de clicks
-            'clicks_total',            # Total de clicks en todas las rondas
-            'global_accuracy',         # Accuracy global de todas las rondas
-            'error_concentration',     # Concentración de errores en ciertas rondas
-            'consistency_score'        # Consistencia en el desempeño
-        ])
+        NORMALIZACIÓN CRÍTICA: Accuracy y Missrate deben estar en [0, 1].
+        Un valor > 1 con clicks > 0 se asume Score y se recalcula como
+        hits/clicks (o misses/clicks); si no, se recorta a [0, 1].
+        """
+        clicks = rounds[..., _CLICKS]
+        for column, numerator in ((_ACCURACY, _HITS), (_MISSRATE, _MISSES)):
+            values = rounds[..., column]
+            recompute = (values > 1) & (clicks > 0)
+            ratio = np.divide(rounds[..., numerator], clicks,
+                              out=np.zeros_like(values), where=recompute)
+            rounds[..., column] = np.where(recompute, ratio, np.clip(values, 0.0, 1.0))
+        return rounds
+    
+    @staticmethod
+    def _resample_rounds(rounds: np.ndarray) -> np.ndarray:
+        """
+        Ajusta una matriz (n_rondas, 6) a exactamente 32 rondas
         
-        return features
+        - Más de 32: promedia grupos de n // 16 rondas (48 → 16 grupos de 3)
+          y duplica cada grupo (16 → 32)
+        - Menos de 32: rellena con el promedio de las rondas existentes
+        """
+        n_rounds = len(rounds)
+        if n_rounds > TARGET_ROUNDS:
+            # Siempre hay al menos 16 grupos completos; solo los 16 primeros
+            # caben en las 32 rondas tras duplicar
+            group_size = n_rounds // 16
+            grouped = rounds[:16 * group_size].reshape(16, group_size, -1).mean(axis=1)
+            return np.repeat(grouped, 2, axis=0)
+        if n_rounds < TARGET_ROUNDS:
+            fill = rounds.mean(axis=0) if n_rounds else np.zeros(rounds.shape[1])
+            return np.vstack([rounds, np.broadcast_to(fill, (TARGET_ROUNDS - n_rounds, rounds.shape[1]))])
+        return rounds
     
-    def _extract_rounds_from_activity(self, rounds: List[Dict]) -> Dict[str, List]:
+    @staticmethod
+    def _resample_rounds_batch(padded: np.ndarray, lengths: np.ndarray) -> np.ndarray:
         """
-        Extrae métricas de rondas de una actividad.
-        Cada ronda debe tener: clicks, hits, misses, score, accuracy, missrate
+        Versión por lotes de _resample_rounds
         
         Args:
-            rounds: Lista de diccionarios con datos de cada ronda
+            padded: Array (N, L, 6) con las rondas de cada sesión al inicio y
+                    ceros de relleno
+            lengths: Array (N,) con el número real de rondas de cada sesión
             
         Returns:
-            Dict con listas de clicks, hits, misses, score, accuracy, missrate
+            Array (N, 32, 6)
         """
-        metrics = {
-            'clicks': [],
-            'hits': [],
-            'misses': [],
-            'score': [],
-            'accuracy': [],
-            'missrate': []
-        }
-        
-        for round_data in rounds:
-            clicks = round_data.get('clicks', 0)
-            hits = round_data.get('hits', 0)
-            misses = round_data.get('misses', 0)
-            score = round_data.get('score', 0)
-            accuracy = round_data.get('accuracy', 0.0)
-            missrate = round_data.get('missrate', 0.0)
-            
-            # NORMALIZACIÓN CRÍTICA: Asegurar que Accuracy está en [0, 1]
-            # Si accuracy > 1, asumir que es un Score y convertir a proporción
-            if accuracy > 1 and clicks > 0:
-                accuracy = hits / clicks
-            elif accuracy < 0:
-                accuracy = 0.0
-            elif accuracy > 1:
-                accuracy = 1.0  # Clamp a 1.0 si no se puede calcular
-            
-            # NORMALIZACIÓN: Asegurar que Missrate está en [0, 1]
-            if missrate > 1 and clicks > 0:
-                missrate = misses / clicks
-            elif missrate < 0:
-                missrate = 0.0
-            elif missrate > 1:
-                missrate = 1.0
-            
-            metrics['clicks'].append(clicks)
-            metrics['hits'].append(hits)
-            metrics['misses'].append(misses)
-            metrics['score'].append(score)
-            metrics['accuracy'].append(accuracy)
-            metrics['missrate'].append(missrate)
-        
-        return metrics
+        n_sessions, max_rounds, n_metrics = padded.shape
+        resampled = np.zeros((n_sessions, TARGET_ROUNDS, n_metrics))
+        width = min(max_rounds, TARGET_ROUNDS)
+        resampled[:, :width] = padded[:, :width]
+        
+        # Menos de 32 rondas: completar con el promedio de las existentes
+        short = np.flatnonzero(lengths < TARGET_ROUNDS)
+        if len(short):
+            counts = lengths[short]
+            fill = padded[short].sum(axis=1) / np.maximum(counts, 1)[:, None]
+            present = np.arange(TARGET_ROUNDS) < counts[:, None]
+            resampled[short] = np.where(present[:, :, None], resampled[short], fill[:, None, :])
+        
+        # Más de 32 rondas: promedio de los 16 primeros grupos de n // 16 rondas,
+        # sumando una posición del grupo a la vez
+        long = np.flatnonzero(lengths > TARGET_ROUNDS)
+        if len(long):
+            block = padded[long]
+            group_size = lengths[long] // 16
+            starts = np.arange(16) * group_size[:, None]
+            rows = np.arange(len(long))[:, None]
+            sums = np.zeros((len(long), 16, n_metrics))
+            for offset in range(group_size.max()):
+                values = block[rows, np.minimum(starts + offset, max_rounds - 1)]
+                sums += np.where((offset < group_size)[:, None, None], values, 0.0)
+            resampled[long] = np.repeat(sums / group_size[:, None, None], 2, axis=1)
+        
+        return resampled
     
-    def _calculate_derived_features(self, all_metrics: Dict[str, List]) -> Dict:
+    @staticmethod
+    def _calculate_derived_features(rounds: np.ndarray) -> np.ndarray:
         """
-        Calcula las 10 features derivadas a partir de las métricas de las 32 rondas
+        Calcula las 9 features derivadas a partir de las 32 rondas equivalentes
         
         Args:
-            all_metrics: Dict con listas de clicks, hits, misses, score, accuracy, missrate
+            rounds: Array (N, 32, 6) con las columnas de ROUND_METRICS
             
         Returns:
-            Dict con las 10 features derivadas
+            Array (N, 9) en el orden de TEMPORAL_FEATURES
         """
-        accuracies = all_metrics['accuracy']
-        clicks = all_metrics['clicks']
-        
-        # 1. Tendencia de accuracy (regresión lineal simple)
-        if len(accuracies) > 1:
-            x = np.arange(len(accuracies))
-            z = np.polyfit(x, accuracies, 1)
-            accuracy_trend = z[0]  # Pendiente
-        else:
-            accuracy_trend = 0.0
-        
-        # 2. Promedio de accuracy en primera mitad (rondas 1-16)
-        first_half = accuracies[:16] if len(accuracies) >= 16 else accuracies[:len(accuracies)//2]
-        accuracy_mean_first_half = np.mean(first_half) if first_half else 0.0
-        
-        # 3. Promedio de accuracy en segunda mitad (rondas 17-32)
-        second_half = accuracies[16:] if len(accuracies) > 16 else accuracies[len(accuracies)//2:]
-        accuracy_mean_second_half = np.mean(second_half) if second_half else 0.0
-        
-        # 4. Mejora entre mitades
-        accuracy_improvement = accuracy_mean_second_half - accuracy_mean_first_half
-        
-        # 5. Variabilidad en clicks (desviación estándar normalizada)
-        clicks_variability = np.std(clicks) / (np.mean(clicks) + 1e-6) if clicks else 0.0
-        
-        # 6. Total de clicks
-        clicks_total = sum(clicks)
+        accuracy = rounds[:, :, _ACCURACY]
+        clicks = rounds[:, :, _CLICKS]
+        hits = rounds[:, :, _HITS]
+        misses = rounds[:, :, _MISSES]
+        derived = np.empty((len(rounds), len(TEMPORAL_FEATURES)))
+        
+        # 1. Tendencia de accuracy (pendiente de mínimos cuadrados)
+        x = np.arange(TARGET_ROUNDS, dtype=np.float64)
+        x -= x.mean()
+        accuracy_mean = accuracy.mean(axis=1)
+        derived[:, 0] = ((accuracy - accuracy_mean[:, None]) @ x) / (x @ x)
+        
+        # 2-4. Promedio de accuracy en cada mitad (rondas 1-16 y 17-32) y mejora
+        derived[:, 1] = accuracy[:, :16].mean(axis=1)
+        derived[:, 2] = accuracy[:, 16:].mean(axis=1)
+        derived[:, 3] = derived[:, 2] - derived[:, 1]
+        
+        # 5-6. Variabilidad en clicks (desviación estándar normalizada) y total
+        derived[:, 4] = clicks.std(axis=1) / (clicks.mean(axis=1) + 1e-6)
+        clicks_total = clicks.sum(axis=1)
+        derived[:, 5] = clicks_total
         
         # 7. Accuracy global
-        total_hits = sum(all_metrics['hits'])
-        global_accuracy = total_hits / clicks_total if clicks_total > 0 else 0.0
+        derived[:, 6] = np.divide(hits.sum(axis=1), clicks_total,
+                                  out=np.zeros(len(rounds)), where=clicks_total > 0)
         
-        # 8. Concentración de errores (entropía de distribución de errores)
-        misses = all_metrics['misses']
-        total_misses = sum(misses)
-        if total_misses > 0:
-            miss_probs = [m / total_misses for m in misses if m > 0]
-            error_concentration = -sum(p * np.log(p + 1e-10) for p in miss_probs)
-        else:
-            error_concentration = 0.0
+        # 8. Concentración de errores (entropía de la distribución de errores)
+        total_misses = misses.sum(axis=1)
+        has_misses = total_misses > 0
+        probs = np.divide(misses, total_misses[:, None], out=np.zeros_like(misses),
+                          where=(misses > 0) & has_misses[:, None])
+        entropy = (probs * np.log(probs + 1e-10)).sum(axis=1)
+        derived[:, 7] = np.where(has_misses, -entropy, 0.0)
         
         # 9. Score de consistencia (inverso del coeficiente de variación)
-        if len(accuracies) > 1 and np.mean(accuracies) > 0:
-            cv = np.std(accuracies) / np.mean(accuracies)
-            consistency_score = 1.0 / (1.0 + cv)  # Entre 0 y 1
-        else:
-            consistency_score = 0.5
+        defined = accuracy_mean > 0
+        cv = np.divide(accuracy.std(axis=1), accuracy_mean,
+                       out=np.zeros(len(rounds)), where=defined)
+        derived[:, 8] = np.where(defined, 1.0 / (1.0 + cv), 0.5)
         
-        return {
-            'accuracy_trend': accuracy_trend,
-            'accuracy_mean_first_half': accuracy_mean_first_half,
-            'accuracy_mean_second_half': accuracy_mean_second_half,
-            'accuracy_improvement': accuracy_improvement,
-            'clicks_variability': clicks_variability,
-            'clicks_total': clicks_total,
-            'global_accuracy': global_accuracy,
-            'error_concentration': error_concentration,
-            'consistency_score': consistency_score
-        }
+        return derived
     
+    @timed('features')
     def combine_all_features(self, activities_data: Dict) -> List[float]:
         """
         Combina características de todas las actividades en el formato del modelo (205 features).
@@ -211,118 +246,101 @@ class FeatureExtractor:
             }
             
         Returns:
-            Lista de 206 floats en el orden exacto que el modelo espera
+            Lista de 205 floats en el orden exacto que el modelo espera
         """
-        features_dict = {}
-        
-        # 1. DATOS DEMOGRÁFICOS (4 features)
-        user_data = activities_data.get('user', {})
-        
-        # Gender: Male=1, Female=0
-        gender = user_data.get('gender', 'Male')
-        features_dict['Gender'] = 1 if gender.lower() == 'male' else 0
+        rounds = self._pack_rounds(activities_data.get('activities', []))
+        return self._combine_packed(activities_data.get('user', {}), rounds)
+    
+    @timed('features')
+    def combine_rounds(self, user_data: Dict, rounds: np.ndarray) -> List[float]:
+        """
+        combine_all_features para rondas ya empaquetadas (p. ej. decodificadas
+        del formato binario de app/utils/wire_format.py)
         
-        # Nativelang: Yes=1, No=0
-        native_lang = user_data.get('native_lang', True)
-        features_dict['Nativelang'] = 1 if native_lang else 0
+        Args:
+            user_data: Dict con gender, age, native_lang, other_lang
+            rounds: Array (n_rondas, >= 6) cuyas 6 primeras columnas siguen ROUND_METRICS
+        """
+        rounds = np.array(rounds[:, :len(self.ROUND_METRICS)], dtype=np.float64)
+        return self._combine_packed(user_data, self._normalize_rounds(rounds))
+    
+    def _combine_packed(self, user_data: Dict, rounds: np.ndarray) -> List[float]:
+        """Vector de 205 features a partir de la matriz (n_rondas, 6) normalizada"""
+        vector = np.zeros(self.schema.n_features)
         
-        # Otherlang: Yes=1, No=0
-        other_lang = user_data.get('other_lang', False)
-        features_dict['Otherlang'] = 1 if other_lang else 0
+        # 1. DATOS DEMOGRÁFICOS (4 features)
+        vector[self._demographic_positions] = self._demographic_values(user_data)
         
-        # Age: número entero
-        features_dict['Age'] = user_data.get('age', 8)
+        # 2. AJUSTAR A 32 RONDAS
+        # El modelo espera exactamente 32 rondas (32 × 6 métricas = 192 features).
+        # Con 48 rondas (screening test) se promedian grupos de 3 (48 → 16) y
+        # se duplica cada grupo (16 → 32); con menos de 32 se rellena con el promedio
+        rounds = self._resample_rounds(rounds)
         
-        # 2. RECOLECTAR TODAS LAS RONDAS DE ACTIVIDADES
-        all_rounds_metrics = {
-            'clicks': [],
-            'hits': [],
-            'misses': [],
-            'score': [],
-            'accuracy': [],
-            'missrate': []
-        }
+        # 3. ASIGNAR MÉTRICAS DE LAS 32 RONDAS EQUIVALENTES (192 features)
+        vector[self._round_positions] = rounds
         
-        activities = activities_data.get('activities', [])
+        # 4. CALCULAR FEATURES DERIVADAS (9 features) sobre las 32 rondas equivalentes
+        vector[self._derived_positions] = self._calculate_derived_features(rounds[None])[0]
         
-        # Procesar cada actividad en orden
-        for activity in activities:
-            rounds = activity.get('rounds', [])
-            metrics = self._extract_rounds_from_activity(rounds)
-            
-            # Agregar métricas de esta actividad
-            for key in all_rounds_metrics.keys():
-                all_rounds_metrics[key].extend(metrics[key])
+        # 5. RETORNAR EN ORDEN EXACTO (205 features)
+        # 4 demográficas + 192 de rondas (32×6) + 9 derivadas = 205 total
+        return vector.tolist()
+    
+    def combine_many(self, payloads: List[Dict], chunk_size: int = 4096) -> np.ndarray:
+        """
+        Versión por lotes de combine_all_features para jobs de backfill y analítica
         
-        # 3. PROMEDIAR RONDAS PARA AJUSTAR A 32 (si hay más de 32)
-        # El modelo espera exactamente 32 features de rondas (32 rondas × 6 métricas = 192 features)
-        # Si hay 48 rondas (screening test), promediamos en grupos:
-        # - Rondas 1-3 → Ronda 1 promediada
-        # - Rondas 4-6 → Ronda 2 promediada
-        # - ... hasta Rondas 46-48 → Ronda 16 promediada
-        # Luego duplicamos para obtener 32 rondas equivalentes
-        target_rounds = 32
-        current_rounds = len(all_rounds_metrics['clicks'])
+        Las rondas de cada bloque de sesiones se empaquetan en un array
+        (N, max_rondas, 6) con ceros de relleno y la longitud de cada sesión;
+        la normalización, el ajuste a 32 rondas y las features derivadas se
+        calculan para todo el bloque a la vez.
         
-        if current_rounds > target_rounds:
-            # Promediar rondas: agrupar cada 3 rondas (48 → 16) y duplicar (16 → 32)
-            group_size = max(1, current_rounds // 16)  # Tamaño de grupo para obtener ~16 grupos
-            
-            # Agrupar y promediar
-            grouped_metrics = {key: [] for key in all_rounds_metrics.keys()}
-            
-            for group_idx in range(0, current_rounds, group_size):
-                group_end = min(group_idx + group_size, current_rounds)
-                
-                for key in all_rounds_metrics.keys():
-                    group_values = all_rounds_metrics[key][group_idx:group_end]
-                    grouped_metrics[key].append(np.mean(group_values) if group_values else 0.0)
-            
-            # Duplicar para obtener 32 rondas (16 grupos × 2)
-            expanded_metrics = {key: [] for key in all_rounds_metrics.keys()}
-            for key in all_rounds_metrics.keys():
-                for value in grouped_metrics[key]:
-                    expanded_metrics[key].extend([value, value])
-            
-            # Ajustar exactamente a 32 rondas si es necesario
-            for key in all_rounds_metrics.keys():
-                expanded_metrics[key] = expanded_metrics[key][:32]
-                
-                # Si hay menos de 32, rellenar con el último valor
-                if len(expanded_metrics[key]) < 32:
-                    last_value = expanded_metrics[key][-1] if expanded_metrics[key] else 0.0
-                    expanded_metrics[key].extend([last_value] * (32 - len(expanded_metrics[key])))
+        Args:
+            payloads: Secuencia de dicts con el formato de combine_all_features
+            chunk_size: Sesiones por bloque (acota la memoria del array con relleno)
             
-            all_rounds_metrics = expanded_metrics
-        
-        elif current_rounds < target_rounds:
-            # Rellenar con valores promedio de las rondas existentes
-            for key in all_rounds_metrics.keys():
-                if all_rounds_metrics[key]:
-                    avg_value = np.mean(all_rounds_metrics[key])
-                else:
-                    avg_value = 0.0
-                
-                missing_count = target_rounds - current_rounds
-                all_rounds_metrics[key].extend([avg_value] * missing_count)
-        
-        # 4. ASIGNAR MÉTRICAS DE LAS 32 RONDAS EQUIVALENTES (192 features)
-        # Nota: Si el screening tiene 48 rondas, estas son 32 rondas promediadas
-        # que representan toda la información disponible
-        for i in range(1, 33):
-            idx = i - 1
-            features_dict[f'Clicks{i}'] = all_rounds_metrics['clicks'][idx]
-            features_dict[f'Hits{i}'] = all_rounds_metrics['hits'][idx]
-            features_dict[f'Misses{i}'] = all_rounds_metrics['misses'][idx]
-            features_dict[f'Score{i}'] = all_rounds_metrics['score'][idx]
-            features_dict[f'Accuracy{i}'] = all_rounds_metrics['accuracy'][idx]
-            features_dict[f'Missrate{i}'] = all_rounds_metrics['missrate'][idx]
-        
-        # 5. CALCULAR FEATURES DERIVADAS (9 features)
-        # Estos se calculan usando todas las rondas disponibles
-        derived = self._calculate_derived_features(all_rounds_metrics)
-        features_dict.update(derived)
-        
-        # 6. RETORNAR EN ORDEN EXACTO (205 features)
-        # 4 demográficas + 192 de rondas (32×6) + 9 derivadas = 205 total
-        return [features_dict[name] for name in self.feature_names]
+        Returns:
+            Array (N, 205) float64; la fila i es combine_all_features(payloads[i])
+        """
+        payloads = list(payloads)
+        matrix = np.zeros((len(payloads), self.schema.n_features))
+        for start in range(0, len(payloads), chunk_size):
+            chunk = payloads[start:start + chunk_size]
+            self._combine_chunk(chunk, matrix[start:start + len(chunk)])
+        return matrix
+    
+    def _combine_chunk(self, payloads: List[Dict], out: np.ndarray):
+        """Escribe en out (N, 205) las features de un bloque de sesiones"""
+        keys = [key for _, key in self.ROUND_METRICS]
+        activities = [payload.get('activities', []) for payload in payloads]
+        
+        # 1. Demográficas
+        out[:, self._demographic_positions] = np.array(
+            [self._demographic_values(payload.get('user', {})) for payload in payloads],
+            dtype=np.float64
+        ).reshape(len(payloads), -1)
+        
+        # 2. Rondas de todas las sesiones en una sola pasada, luego con relleno
+        lengths = np.fromiter(
+            (sum(len(activity.get('rounds', [])) for activity in session) for session in activities),
+            dtype=np.int64, count=len(payloads)
+        )
+        flat = np.fromiter(
+            (round_data.get(key, 0)
+             for session in activities
+             for activity in session
+             for round_data in activity.get('rounds', [])
+             for key in keys),
+            dtype=np.float64
+        ).reshape(-1, len(keys))
+        self._normalize_rounds(flat)
+        
+        max_rounds = int(lengths.max()) if len(lengths) else 0
+        padded = np.zeros((len(payloads), max_rounds, len(keys)))
+        padded[np.arange(max_rounds) < lengths[:, None]] = flat
+        
+        # 3-5. Ajuste a 32 rondas, métricas por ronda y features derivadas
+        rounds = self._resample_rounds_batch(padded, lengths)
+        out[:, self._round_positions] = rounds
+        out[:, self._derived_positions] = self._calculate_derived_features(rounds)
@@ -0,0 +1,202 @@
+"""
+Micro-batching de inferencias concurrentes
+Agrupa los vectores de features que llegan casi al mismo tiempo y los evalúa
+con una sola llamada vectorizada a ModelManager.predict_batch.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+# Límites superiores de los buckets del histograma de tamaños de lote
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class MicroBatcher:
+    """
+    Coalescedor de requests en proceso.
+
+    Un hilo de fondo toma el primer vector de la cola y junta los que lleguen
+    dentro de la ventana (window_ms) o hasta max_batch_size. La ventana es
+    adaptativa: solo se espera cuando el tamaño medio reciente de los lotes
+    indica concurrencia; con un único cliente el vector se evalúa de inmediato
+    y no se agrega latencia.
+    """
+
+    def __init__(self, batch_fn, n_features, window_ms=3.0, max_batch_size=32):
+        """
+        Args:
+            batch_fn: Función (N, n_features) → dict columnar con prediction,
+                      probability, confidence y model_version
+                      (ModelManager.predict_batch)
+            n_features: Ancho esperado de cada vector
+            window_ms: Tiempo máximo de espera para completar un lote
+            max_batch_size: Tamaño máximo de lote
+        """
+        self.batch_fn = batch_fn
+        self.n_features = n_features
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._avg_batch_size = 1.0
+
+        # Métricas
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._timeouts = 0
+        self._size_histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._inference_total = 0.0
+
+    def _ensure_worker(self):
+        """Iniciar el hilo de fondo (también después de un fork)"""
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != pid or not self._worker.is_alive():
+                if self._worker_pid != pid:
+                    self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker_pid = pid
+                self._worker.start()
+
+    def submit(self, features) -> Future:
+        """Encolar un vector de features; retorna un Future con el resultado"""
+        row = np.asarray(features, dtype=np.float64)
+        if row.shape != (self.n_features,):
+            raise ValueError(
+                f"Se esperaban {self.n_features} características, "
+                f"se recibieron {row.size}"
+            )
+
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def predict(self, features, timeout=None) -> dict:
+        """
+        Predicción individual a través del lote (mismo formato que ModelManager.predict)
+
+        Raises:
+            concurrent.futures.TimeoutError: Si no hubo resultado en timeout
+                segundos (el vector se descarta si aún no entró en un lote)
+        """
+        future = self.submit(features)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise
+
+    def _collect(self):
+        """Esperar el primer vector y completar el lote según la ventana"""
+        batch = [self._queue.get()]
+
+        # Tomar lo que ya está en cola sin esperar
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # Esperar la ventana solo si hay concurrencia reciente
+        if len(batch) < self.max_batch_size and self._avg_batch_size >= 1.5:
+            deadline = batch[0][2] + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            error = None
+            try:
+                self._process(batch)
+            except Exception as e:
+                error = e
+                with self._lock:
+                    self._errors += 1
+            finally:
+                # Ningún Future del lote queda sin resolver, falle lo que falle
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error or RuntimeError("Lote terminado sin resultado"))
+
+    def _process(self, batch):
+        # Descartar los vectores cuyo request ya abandonó la espera
+        batch[:] = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        dispatched = time.perf_counter()
+        X = np.stack([row for row, _, _ in batch])
+        results = self.batch_fn(X)
+        inference = time.perf_counter() - dispatched
+
+        outputs = [{
+            "prediction": int(results["prediction"][i]),
+            "probability": float(results["probability"][i]),
+            "confidence": float(results["confidence"][i]),
+            "model_version": results.get("model_version")
+        } for i in range(len(batch))]
+        for (_, future, _), output in zip(batch, outputs):
+            future.set_result(output)
+
+        self._record(batch, dispatched, inference)
+
+    def _record(self, batch, dispatched, inference):
+        size = len(batch)
+        waits = [dispatched - enqueued for _, _, enqueued in batch]
+        bucket = next((i for i, limit in enumerate(BATCH_SIZE_BUCKETS) if size <= limit),
+                      len(BATCH_SIZE_BUCKETS))
+
+        with self._lock:
+            self._avg_batch_size = 0.8 * self._avg_batch_size + 0.2 * size
+            self._batches += 1
+            self._items += size
+            self._size_histogram[bucket] += 1
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+            self._inference_total += inference
+
+    def stats(self) -> dict:
+        """Métricas de tamaño de lote y espera en cola"""
+        with self._lock:
+            batches = self._batches
+            items = self._items
+            labels = [f"<={limit}" for limit in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+            return {
+                "enabled": True,
+                "window_ms": self.window * 1000.0,
+                "max_batch_size": self.max_batch_size,
+                "batches": batches,
+                "requests": items,
+                "errors": self._errors,
+                "timeouts": self._timeouts,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": items / batches if batches else 0.0,
+                "batch_size_histogram": dict(zip(labels, self._size_histogram)),
+                "avg_queue_wait_ms": self._wait_total / items * 1000.0 if items else 0.0,
+                "max_queue_wait_ms": self._wait_max * 1000.0,
+                "avg_inference_ms": self._inference_total / batches * 1000.0 if batches else 0.0
+            }
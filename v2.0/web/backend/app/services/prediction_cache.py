@@ -0,0 +1,128 @@
+"""
+Cache de predicciones direccionado por contenido
+Los reintentos del cliente y los dashboards vuelven a pedir predicciones para
+las mismas sesiones; la clave es un hash del vector de features canónico más
+la versión del modelo, así que un resultado nunca se sirve con otro modelo.
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Costo fijo aproximado por entrada (OrderedDict, tupla, timestamps)
+_ENTRY_OVERHEAD = 200
+
+
+def make_cache_key(namespace, features, model_version, generation=None) -> str:
+    """
+    Clave estable para un vector de features
+
+    El vector se normaliza a float64 little-endian; -0.0 se unifica con 0.0
+    y todos los NaN con un único patrón de bits.
+    """
+    vector = np.asarray(features, dtype=np.float64).ravel() + 0.0
+    vector = np.where(np.isnan(vector), np.nan, vector).astype('<f8', copy=False)
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{namespace}|{model_version}|{generation}|{vector.size}|".encode('utf-8'))
+    digest.update(vector.tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """LRU con TTL acotado por número de entradas y por bytes (estimados)"""
+
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024, ttl_seconds=600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+
+        self._entries = OrderedDict()  # clave → (valor, bytes, expira)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Métricas
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def _size_of(key, value):
+        return len(key) + len(json.dumps(value, default=str)) + _ENTRY_OVERHEAD
+
+    def get(self, key):
+        """Copia del valor cacheado, o None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            value, size, expires = entry
+            if expires <= now:
+                del self._entries[key]
+                self._bytes -= size
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key, value):
+        size = self._size_of(key, value)
+        if size > self.max_bytes:
+            return
+        value = copy.deepcopy(value)
+        expires = time.monotonic() + self.ttl
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Valor cacheado o calculado con compute() (y guardado)"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Invalidar todo el contenido (p. ej. al cambiar de modelo)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": True,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations
+            }
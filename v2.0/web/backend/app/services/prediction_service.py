@@ -1,8 +1,18 @@
+from app.config import Config
 from app.models.model_manager import ModelManager
 from app.services.feature_extractor import FeatureExtractor
+from app.services.micro_batcher import MicroBatcher
+from app.services.prediction_cache import PredictionCache, make_cache_key
 from app.services.predictor import DislexiaPredictor
-from typing import Dict, List
-import os
+from app.utils.helpers import Validator
+from app.utils.log import get_logger
+from app.utils.metrics import stage
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Iterable, Iterator, List
+import json
+import numpy as np
+
+log = get_logger(__name__)
 
 
 class PredictionService:
@@ -12,29 +22,38 @@ class PredictionService:
         self.model_manager = ModelManager()
         self.feature_extractor = FeatureExtractor()
         
-        # Inicializar el predictor calibrado
-        try:
-            # Obtener ruta del modelo desde la carpeta ../pkl/ relativa al backend
-            backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            pkl_dir = os.path.join(os.path.dirname(backend_dir), 'pkl')
-            
-            model_path = os.path.join(pkl_dir, 'modelo_dislexia.pkl')
-            imputer_path = os.path.join(pkl_dir, 'imputer.pkl')
-            info_path = os.path.join(pkl_dir, 'modelo_info.json')
-            
-            print(f"[DEBUG] Backend dir: {backend_dir}")
-            print(f"[DEBUG] PKL dir: {pkl_dir}")
-            print(f"[DEBUG] Model path: {model_path}")
-            
-            self.predictor = DislexiaPredictor(
-                model_path=model_path,
-                imputer_path=imputer_path,
-                info_path=info_path
+        # Cache de predicciones; se vacía cuando el registro cambia de modelo
+        self.cache = None
+        if Config.PREDICTION_CACHE_ENABLED:
+            self.cache = PredictionCache(
+                max_entries=Config.PREDICTION_CACHE_MAX_ENTRIES,
+                max_bytes=Config.PREDICTION_CACHE_MAX_BYTES,
+                ttl_seconds=Config.PREDICTION_CACHE_TTL
+            )
+            self.model_manager.registry.add_swap_listener(lambda previous, current: self.cache.clear())
+        
+        # Agrupar inferencias concurrentes en un solo lote (opcional)
+        self.batcher = None
+        if Config.MICROBATCH_ENABLED:
+            self.batcher = MicroBatcher(
+                self.model_manager.predict_batch,
+                n_features=self.model_manager.schema.n_features,
+                window_ms=Config.MICROBATCH_WINDOW_MS,
+                max_batch_size=Config.MICROBATCH_MAX_SIZE
             )
-            print("[OK] Predictor calibrado cargado")
+        
+        # Inicializar el predictor calibrado sobre los mismos artefactos
+        # que ModelManager (registro compartido del proceso)
+        try:
+            self.predictor = DislexiaPredictor(registry=self.model_manager.registry)
+            log.info("Predictor calibrado cargado")
         except Exception as e:
-            print(f"[WARN] Error cargando predictor calibrado: {e}")
+            log.warning("Error cargando predictor calibrado", error=str(e))
             self.predictor = None
+        
+        # Recargar el modelo cuando cambien los archivos (en cada worker)
+        if Config.MODEL_WATCH_ENABLED:
+            self.model_manager.registry.start_watcher(Config.MODEL_WATCH_INTERVAL)
     
     def process_activities(self, activities_data: Dict) -> Dict:
         """
@@ -53,7 +72,7 @@ class PredictionService:
                 features_dict = self._convert_activities_to_features(activities_data)
                 
                 # Usar el predictor calibrado
-                result = self.predictor.predict(features_dict)
+                result = self._predict_calibrated(features_dict)
                 
                 return {
                     'success': True,
@@ -63,12 +82,13 @@ class PredictionService:
                     'risk_level': result['nivel_riesgo'],
                     'global_accuracy': result.get('global_accuracy', 0),
                     'activities_processed': list(activities_data.keys()),
-                    'recommendation': result['recomendacion']
+                    'recommendation': result['recomendacion'],
+                    'model_version': result['modelo_info']['version']
                 }
             else:
                 # Fallback al método anterior si predictor no está disponible
                 features = self.feature_extractor.combine_all_features(activities_data)
-                prediction_result = self.model_manager.predict(features)
+                prediction_result = self._predict_ml(features)
                 dyslexia_probability = 1.0 - prediction_result['probability']
                 risk_level = self.classify_risk(dyslexia_probability)
                 
@@ -79,7 +99,8 @@ class PredictionService:
                     'confidence': prediction_result['confidence'],
                     'risk_level': risk_level,
                     'activities_processed': list(activities_data.keys()),
-                    'recommendation': self._get_recommendation(risk_level)
+                    'recommendation': self._get_recommendation(risk_level),
+                    'model_version': prediction_result['model_version']
                 }
         except Exception as e:
             return {
@@ -106,7 +127,7 @@ class PredictionService:
             features = self.feature_extractor.combine_all_features(data)
             
             # Realizar predicción
-            prediction_result = self.model_manager.predict(features)
+            prediction_result = self._predict_ml(features)
             
             # Invertir: probability es P(NO dislexia), necesitamos P(dislexia)
             dyslexia_probability = 1.0 - prediction_result['probability']
@@ -121,7 +142,8 @@ class PredictionService:
                 'probability': dyslexia_probability,
                 'confidence': prediction_result['confidence'],
                 'risk_level': risk_level,
-                'has_dyslexia_indicators': risk_level in ['Medio', 'Alto']
+                'has_dyslexia_indicators': risk_level in ['Medio', 'Alto'],
+                'model_version': prediction_result['model_version']
             }
         except Exception as e:
             return {
@@ -129,6 +151,33 @@ class PredictionService:
                 'error': str(e)
             }
     
+    def _cached(self, namespace, vector, compute):
+        """Resultado de compute() cacheado por vector de features y versión del modelo"""
+        if self.cache is None:
+            return compute()
+        artifacts = self.model_manager.artifacts
+        key = make_cache_key(namespace, vector, artifacts.version, artifacts.generation)
+        return self.cache.get_or_compute(key, compute)
+    
+    def _predict_ml(self, features):
+        """Predicción del modelo ML (cacheada), a través del micro-batcher si está activo"""
+        def compute():
+            if self.batcher is not None:
+                try:
+                    return self.batcher.predict(features, timeout=Config.MICROBATCH_TIMEOUT)
+                except FutureTimeoutError:
+                    log.warning("Micro-batcher sin respuesta; predicción directa",
+                                timeout_s=Config.MICROBATCH_TIMEOUT)
+            return self.model_manager.predict(features)
+        
+        return self._cached('ml', features, compute)
+    
+    def _predict_calibrated(self, features_dict):
+        """Predicción del predictor calibrado (cacheada por su vector de features base)"""
+        schema = self.predictor.schema
+        vector = [features_dict.get(name, float('nan')) for name in schema.base_names]
+        return self._cached('calibrated', vector, lambda: self.predictor.predict(features_dict))
+    
     def _convert_activities_to_features(self, activities_data: Dict) -> Dict:
         """
         Convierte datos de actividades al formato esperado por el predictor
@@ -189,6 +238,15 @@ class PredictionService:
         else:
             return "Alto"
     
+    def classify_risk_batch(self, dyslexia_probabilities):
+        """Versión vectorizada de classify_risk para un array de probabilidades"""
+        probs = np.asarray(dyslexia_probabilities, dtype=np.float64)
+        return np.select(
+            [probs < 0.25, probs < 0.60],
+            ["Bajo", "Medio"],
+            default="Alto"
+        )
+    
     def predict(self, features):
         """Realizar predicción con análisis de riesgo basado en scoring de rendimiento"""
         # En lugar de confiar 100% en el modelo ML entrenado,
@@ -198,48 +256,49 @@ class PredictionService:
         # features[0-3]: Demográficas (Gender, Nativelang, Otherlang, Age)
         # features[4-35]: Accuracy de rondas 1-32 (en posiciones específicas)
         
-        # Calcular accuracy global desde las características
-        accuracy_indices = list(range(8, 192, 6))  # Accuracy1-32 están cada 6 posiciones
-        accuracies = [features[idx] if idx < len(features) else 0.0 for idx in accuracy_indices]
-        global_accuracy = sum(accuracies) / len(accuracies) if accuracies else 0.0
-        
-        # Calcular desviación estándar de accuracy (consistencia)
-        import numpy as np
-        if len(accuracies) > 1:
-            accuracy_std = np.std(accuracies)
-            accuracy_consistency = 1.0 - min(accuracy_std, 1.0)
-        else:
-            accuracy_consistency = 0.5
-        
-        # SCORING DE RIESGO DIRECTO (más lógico que el modelo)
-        # Basado en: accuracy global + consistencia + patrones de error
-        
-        # 1. Si accuracy global > 90%, riesgo muy bajo (< 10%)
-        if global_accuracy > 0.90:
-            dyslexia_prob = max(0.01, 0.10 * (1.0 - global_accuracy))
-        # 2. Si accuracy 80-90%, riesgo bajo (10-25%)
-        elif global_accuracy > 0.80:
-            dyslexia_prob = 0.10 + (0.15 * (0.90 - global_accuracy))
-        # 3. Si accuracy 70-80%, riesgo medio (25-45%)
-        elif global_accuracy > 0.70:
-            dyslexia_prob = 0.25 + (0.20 * (0.80 - global_accuracy))
-        # 4. Si accuracy 60-70%, riesgo alto (45-65%)
-        elif global_accuracy > 0.60:
-            dyslexia_prob = 0.45 + (0.20 * (0.70 - global_accuracy))
-        # 5. Si accuracy < 60%, riesgo muy alto (65-95%)
-        else:
-            dyslexia_prob = min(0.95, 0.65 + (0.30 * (0.60 - global_accuracy)))
-        
-        # Ajustar por consistencia (si hay mucha variabilidad, aumentar riesgo)
-        consistency_penalty = (1.0 - accuracy_consistency) * 0.15
-        dyslexia_prob = min(0.99, dyslexia_prob + consistency_penalty)
-        
-        # Calcular confianza (qué tan seguro estamos de la predicción)
-        # Mayor accuracy → mayor confianza
-        confidence = 0.5 + (global_accuracy * 0.5)  # Rango 0.5-1.0
+        # Scoring híbrido (sin la inferencia del modelo, que se mide aparte)
+        with stage('hybrid_scoring'):
+            # Calcular accuracy global desde las características
+            accuracy_indices = list(range(8, 192, 6))  # Accuracy1-32 están cada 6 posiciones
+            accuracies = [features[idx] if idx < len(features) else 0.0 for idx in accuracy_indices]
+            global_accuracy = sum(accuracies) / len(accuracies) if accuracies else 0.0
+            
+            # Calcular desviación estándar de accuracy (consistencia)
+            if len(accuracies) > 1:
+                accuracy_std = np.std(accuracies)
+                accuracy_consistency = 1.0 - min(accuracy_std, 1.0)
+            else:
+                accuracy_consistency = 0.5
+            
+            # SCORING DE RIESGO DIRECTO (más lógico que el modelo)
+            # Basado en: accuracy global + consistencia + patrones de error
+            
+            # 1. Si accuracy global > 90%, riesgo muy bajo (< 10%)
+            if global_accuracy > 0.90:
+                dyslexia_prob = max(0.01, 0.10 * (1.0 - global_accuracy))
+            # 2. Si accuracy 80-90%, riesgo bajo (10-25%)
+            elif global_accuracy > 0.80:
+                dyslexia_prob = 0.10 + (0.15 * (0.90 - global_accuracy))
+            # 3. Si accuracy 70-80%, riesgo medio (25-45%)
+            elif global_accuracy > 0.70:
+                dyslexia_prob = 0.25 + (0.20 * (0.80 - global_accuracy))
+            # 4. Si accuracy 60-70%, riesgo alto (45-65%)
+            elif global_accuracy > 0.60:
+                dyslexia_prob = 0.45 + (0.20 * (0.70 - global_accuracy))
+            # 5. Si accuracy < 60%, riesgo muy alto (65-95%)
+            else:
+                dyslexia_prob = min(0.95, 0.65 + (0.30 * (0.60 - global_accuracy)))
+            
+            # Ajustar por consistencia (si hay mucha variabilidad, aumentar riesgo)
+            consistency_penalty = (1.0 - accuracy_consistency) * 0.15
+            dyslexia_prob = min(0.99, dyslexia_prob + consistency_penalty)
+            
+            # Calcular confianza (qué tan seguro estamos de la predicción)
+            # Mayor accuracy → mayor confianza
+            confidence = 0.5 + (global_accuracy * 0.5)  # Rango 0.5-1.0
         
         # Usar el modelo ML pero pesarlo menos si hay inconsistencia
-        ml_result = self.model_manager.predict(features)
+        ml_result = self._predict_ml(features)
         ml_probability = 1.0 - ml_result["probability"]
         
         # Promedio ponderado: 70% scoring directo, 30% modelo ML
@@ -250,6 +309,7 @@ class PredictionService:
             "probability": final_probability,
             "confidence": confidence,
             "risk_level": self.classify_risk(final_probability),
+            "model_version": ml_result["model_version"],
             "debug": {
                 "global_accuracy": global_accuracy,
                 "consistency": accuracy_consistency,
@@ -259,19 +319,149 @@ class PredictionService:
         }
     
     def predict_batch(self, data_list):
-        """Predicciones en lote con análisis de riesgo"""
+        """Predicciones en lote con análisis de riesgo
+        
+        Returns:
+            Dict columnar (listas de longitud N) con prediction, probability,
+            confidence y risk_level, más model_version
+        """
         results = self.model_manager.predict_batch(data_list)
-        for result in results:
-            # Invertir probability: P(dislexia) = 1 - P(NO dislexia)
-            dyslexia_prob = 1.0 - result["probability"]
-            result["probability"] = dyslexia_prob
-            result["risk_level"] = self.classify_risk(dyslexia_prob)
-        return results
+        
+        # Invertir probability: P(dislexia) = 1 - P(NO dislexia)
+        dyslexia_prob = 1.0 - results["probability"]
+        
+        return {
+            "prediction": results["prediction"].tolist(),
+            "probability": dyslexia_prob.tolist(),
+            "confidence": results["confidence"].tolist(),
+            "risk_level": self.classify_risk_batch(dyslexia_prob).tolist(),
+            "model_version": results["model_version"]
+        }
+    
+    def predict_stream(self, lines: Iterable, chunk_size: int = 256) -> Iterator[str]:
+        """Predicciones en streaming sobre filas NDJSON
+        
+        Las filas se evalúan en bloques de chunk_size con ModelManager y los
+        resultados se emiten apenas termina cada bloque; la memoria usada no
+        depende del tamaño de la entrada.
+        
+        Args:
+            lines: Iterable de líneas (bytes o str). Cada línea es una lista
+                   de features o {"id": ..., "features": [...]}
+            chunk_size: Filas por evaluación del modelo
+        
+        Yields:
+            Líneas NDJSON: un resultado por fila válida, una línea con los
+            errores de Validator (code, message, index) por fila inválida y un
+            resumen final
+        """
+        n_features = self.model_manager.schema.n_features
+        buffer = np.empty((chunk_size, n_features))
+        ids, line_numbers = [], []
+        scored = errors = 0
+        
+        for line_number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            
+            row_id = None
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row, validation_errors = None, [{"code": "json", "message": f"JSON inválido: {e}"}]
+            else:
+                if isinstance(row, dict):
+                    row_id = row.get('id')
+                    row = row.get('features')
+                values, validation_errors = Validator.feature_vector(row, n_features)
+            
+            if validation_errors:
+                errors += 1
+                record = {"line": line_number}
+                if row_id is not None:
+                    record["id"] = row_id
+                record["errors"] = validation_errors
+                yield json.dumps(record, default=str) + "\n"
+                continue
+            
+            buffer[len(ids)] = values
+            ids.append(row_id)
+            line_numbers.append(line_number)
+            
+            if len(ids) == chunk_size:
+                yield self._score_stream_chunk(buffer, ids, line_numbers)
+                scored += len(ids)
+                ids, line_numbers = [], []
+        
+        if ids:
+            yield self._score_stream_chunk(buffer[:len(ids)], ids, line_numbers)
+            scored += len(ids)
+        
+        yield json.dumps({"summary": {"scored": scored, "errors": errors}}) + "\n"
+    
+    def _score_stream_chunk(self, X, ids, line_numbers) -> str:
+        """Evaluar un bloque y serializarlo como líneas NDJSON"""
+        results = self.model_manager.predict_batch(X)
+        
+        # Invertir probability: P(dislexia) = 1 - P(NO dislexia)
+        dyslexia_prob = 1.0 - results["probability"]
+        risk_levels = self.classify_risk_batch(dyslexia_prob)
+        model_version = results["model_version"]
+        
+        out = []
+        for i, (row_id, line_number) in enumerate(zip(ids, line_numbers)):
+            record = {"line": line_number}
+            if row_id is not None:
+                record["id"] = row_id
+            record.update({
+                "prediction": int(results["prediction"][i]),
+                "probability": float(dyslexia_prob[i]),
+                "confidence": float(results["confidence"][i]),
+                "risk_level": str(risk_levels[i]),
+                "model_version": model_version
+            })
+            out.append(json.dumps(record))
+        return "\n".join(out) + "\n"
+    
+    def after_fork(self):
+        """
+        Preparar un worker recién creado por un servidor pre-fork (gunicorn
+        con preload_app): los hilos del master no sobreviven al fork.
+        
+        Recarga el modelo si los archivos cambiaron desde que el master lo
+        cargó, lo calienta en este proceso y reinicia el watcher (el
+        micro-batcher detecta el fork y arranca su hilo en el primer uso).
+        """
+        registry = self.model_manager.registry
+        if registry.reload_if_changed(reason='fork') is None:
+            registry.current().warm_up()
+        if Config.MODEL_WATCH_ENABLED:
+            registry.start_watcher(Config.MODEL_WATCH_INTERVAL)
     
     def get_model_info(self):
         """Información del modelo"""
         return self.model_manager.get_info()
     
+    def get_runtime_stats(self):
+        """Métricas de ejecución del servicio"""
+        return {
+            "microbatching": self.batcher.stats() if self.batcher else {"enabled": False},
+            "prediction_cache": self.cache.stats() if self.cache else {"enabled": False}
+        }
+    
+    def reload_model(self, wait=True):
+        """Recargar el modelo desde disco sin interrumpir los requests en curso"""
+        registry = self.model_manager.registry
+        if wait:
+            return registry.reload(reason='admin')
+        started = registry.reload_async(reason='admin')
+        return {"status": "started" if started else "in_progress", "reason": 'admin'}
+    
+    def get_registry_stats(self):
+        """Origen, tiempo de carga y memoria de los artefactos del modelo"""
+        return self.model_manager.registry.stats()
+    
     def is_healthy(self):
         """Verificar salud del servicio"""
         return self.model_manager.is_ready()
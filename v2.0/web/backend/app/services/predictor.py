@@ -2,66 +2,102 @@
 Predictor Optimizado de Dislexia para App Movil
 Sistema de Deteccion Temprana mediante Machine Learning
 """
-import joblib
-import pandas as pd
 import numpy as np
-import json
 import os
-from typing import Dict, List, Union
+from typing import Dict, List
+from app.models.model_registry import ModelRegistry, load_artifacts
+from app.models.temporal_features import nanmean_rows
+from app.utils.log import get_logger
+
+log = get_logger(__name__)
+
 
 class DislexiaPredictor:
     
     def __init__(self, model_path='modelo_dislexia.pkl', 
                  imputer_path='imputer.pkl', 
-                 info_path='modelo_info.json'):
+                 info_path='modelo_info.json',
+                 registry=None):
+        
+        """
+        Inicializar predictor con modelos entrenados
         
-        """Inicializar predictor con modelos entrenados"""
+        Con registry (ModelRegistry) se usan los artefactos compartidos del
+        proceso y las rutas se ignoran; sin él se cargan desde las rutas.
+        """
         try:
-            # Si las rutas son absolutas, usarlas directamente
-            if os.path.isabs(model_path) and os.path.isabs(imputer_path) and os.path.isabs(info_path):
-                # Las rutas ya son absolutas
-                pass
-            else:
-                # Usar rutas absolutas basadas en ubicación del script
-                script_dir = os.path.dirname(os.path.abspath(__file__))
-                
-                # Navegar hacia arriba hasta encontrar la carpeta pkl
-                # script_dir: .../app/services
-                # padre: .../app
-                # abuelo: .../backend
-                # pkl: .../backend/pkl
-                backend_dir = os.path.dirname(os.path.dirname(script_dir))
-                pkl_dir = os.path.join(backend_dir, 'pkl')
-                
-                # Resolver rutas
-                if not os.path.isabs(model_path):
-                    model_path = os.path.join(pkl_dir, model_path)
-                if not os.path.isabs(imputer_path):
-                    imputer_path = os.path.join(pkl_dir, imputer_path)
-                if not os.path.isabs(info_path):
-                    info_path = os.path.join(pkl_dir, info_path)
-            
-            self.model = joblib.load(model_path)
-            self.imputer = joblib.load(imputer_path)
+            if registry is None:
+                registry = ModelRegistry(loader=self._path_loader(model_path, imputer_path, info_path))
+            self.registry = registry
             
-            # Cargar scaler si existe
-            # Scaler debe estar en la misma carpeta que los otros archivos
-            scaler_dir = os.path.dirname(model_path)
-            scaler_path = os.path.join(scaler_dir, 'scaler.pkl')
-            if os.path.exists(scaler_path):
-                self.scaler = joblib.load(scaler_path)
-            else:
-                self.scaler = None
-            
-            with open(info_path, 'r') as f:
-                self.model_info = json.load(f)
-                
-            self.features = self.model_info['features']
-            print(f"Predictor loaded - Accuracy: {self.model_info['roc_auc']:.1%}")
+            model_info = self.artifacts.model_info
+            log.info("Predictor loaded", roc_auc=model_info['roc_auc'])
             
         except Exception as e:
             raise Exception(f"Error cargando modelo: {e}")
     
+    @staticmethod
+    def _path_loader(model_path, imputer_path, info_path):
+        """Loader de artefactos a partir de rutas (relativas a backend/pkl)"""
+        # Si las rutas son absolutas, usarlas directamente
+        if not (os.path.isabs(model_path) and os.path.isabs(imputer_path) and os.path.isabs(info_path)):
+            # Usar rutas absolutas basadas en ubicación del script
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            
+            # Navegar hacia arriba hasta encontrar la carpeta pkl
+            # script_dir: .../app/services
+            # padre: .../app
+            # abuelo: .../backend
+            # pkl: .../backend/pkl
+            backend_dir = os.path.dirname(os.path.dirname(script_dir))
+            pkl_dir = os.path.join(backend_dir, 'pkl')
+            
+            # Resolver rutas
+            if not os.path.isabs(model_path):
+                model_path = os.path.join(pkl_dir, model_path)
+            if not os.path.isabs(imputer_path):
+                imputer_path = os.path.join(pkl_dir, imputer_path)
+            if not os.path.isabs(info_path):
+                info_path = os.path.join(pkl_dir, info_path)
+        
+        # Scaler debe estar en la misma carpeta que los otros archivos (opcional)
+        scaler_path = os.path.join(os.path.dirname(model_path), 'scaler.pkl')
+        
+        return lambda: load_artifacts(model_path, imputer_path, scaler_path, info_path)
+    
+    # Vistas de solo lectura sobre los artefactos (compartidos si vienen del registro)
+    @property
+    def artifacts(self):
+        return self.registry.current()
+    
+    @property
+    def model(self):
+        return self.artifacts.model
+    
+    @property
+    def imputer(self):
+        return self.artifacts.imputer
+    
+    @property
+    def scaler(self):
+        return self.artifacts.scaler
+    
+    @property
+    def model_info(self):
+        return self.artifacts.model_info
+    
+    @property
+    def schema(self):
+        return self.artifacts.schema
+    
+    @property
+    def features(self):
+        return list(self.schema.features)
+    
+    @property
+    def base_features(self):
+        return list(self.schema.base_names)
+    
     def predict_from_games(self, juegos_data: List[Dict]) -> Dict:
         """
         Predecir dislexia desde datos de juegos tipo Dytective
@@ -121,42 +157,66 @@ class DislexiaPredictor:
             Dict con prediccion detallada
         """
         
-        # Crear DataFrame con todas las caracteristicas esperadas
-        df = pd.DataFrame([data_dict])
+        artifacts = self.artifacts
         
-        # Asegurar que tiene todas las caracteristicas del modelo original (sin engineered features)
-        base_features = [f for f in self.features if not any(x in f for x in 
-                        ['accuracy_trend', 'accuracy_mean', 'accuracy_improvement', 
-                         'clicks_variability', 'clicks_total', 'global_accuracy', 
-                         'error_concentration', 'consistency_score'])]
+        # Vector base: las características ausentes quedan como NaN
+        row = np.full((1, artifacts.schema.n_base), np.nan)
+        base_positions = artifacts.schema.base_positions
+        for name, value in data_dict.items():
+            pos = base_positions.get(name)
+            if pos is not None:
+                row[0, pos] = value
+        
+        result = self.predict_array(row, artifacts)
+        
+        return {
+            'prediccion': str(result['prediccion'][0]),
+            'probabilidad_dislexia': float(result['probabilidad_dislexia'][0]),
+            'probabilidad_normal': float(result['probabilidad_normal'][0]),
+            'nivel_riesgo': str(result['nivel_riesgo'][0]),
+            'confianza': float(result['confianza'][0]),
+            'recomendacion': str(result['recomendacion'][0]),
+            'global_accuracy': float(result['global_accuracy'][0]),
+            'modelo_info': {
+                'version': artifacts.model_info['version'],
+                'precision_modelo': f"{artifacts.model_info['roc_auc']:.1%}"
+            }
+        }
+    
+    def predict_array(self, X_base: np.ndarray, artifacts=None) -> Dict[str, np.ndarray]:
+        """
+        Prediccion vectorizada sin DataFrames
         
-        for feature in base_features:
-            if feature not in df.columns:
-                df[feature] = np.nan
+        Args:
+            X_base: Array (N, len(self.base_features)) con las caracteristicas
+                    base en el orden de self.base_features (NaN = faltante)
+            artifacts: Artefactos a usar (por defecto los actuales del registro)
         
-        # Reordenar solo las características base
-        df = df[base_features]
+        Returns:
+            Dict columnar con arrays de longitud N
+        """
+        artifacts = artifacts or self.artifacts
+        schema = artifacts.schema
         
-        # Aplicar preprocesamiento
-        df_processed = self._preprocess_features(df)
+        X_base = np.asarray(X_base, dtype=np.float64)
+        if X_base.ndim == 1:
+            X_base = X_base.reshape(1, -1)
+        if X_base.shape[1] != schema.n_base:
+            raise ValueError(
+                f"Se esperaban {schema.n_base} características base, "
+                f"se recibieron {X_base.shape[1]}"
+            )
         
-        # Aplicar scaling si existe
-        if self.scaler is not None:
-            df_processed_scaled = self.scaler.transform(df_processed)
-        else:
-            df_processed_scaled = df_processed.values
+        # Imputación, features temporales y scaling en una sola etapa
+        X_scaled = artifacts.preprocessor.transform_base(X_base)
         
         # Prediccion del modelo ML
-        pred_ml = self.model.predict(df_processed_scaled)[0]
-        prob_ml = self.model.predict_proba(df_processed_scaled)[0]
+        prob_ml = artifacts.predict_proba(X_scaled)
         
         # AJUSTE CRÍTICO: Usar accuracy global para calibrar la predicción
         # El modelo ML tiende a sobre-predecir dislexia, así que usamos accuracy como factor corrector
-        accuracy_cols = sorted([col for col in df.columns if 'Accuracy' in col])[:32]
-        if accuracy_cols:
-            global_accuracy = df[accuracy_cols].mean().mean()
-        else:
-            global_accuracy = 0.5
+        # (promedio de las rondas presentes en la entrada, antes de imputar)
+        global_accuracy = nanmean_rows(X_base[:, schema.base_temporal_index['Accuracy']])
         
         # CALIBRACIÓN MEJORADA: Basada directamente en accuracy global, no solo en prob_ml
         # Fórmula: (1 - accuracy)^2 * factor_ajuste da probabilidades más realistas
@@ -171,146 +231,53 @@ class DislexiaPredictor:
         base_prob = (1.0 - global_accuracy) ** 2
         
         # Factor de ajuste basado en qué tan alejado está del threshold de riesgo
-        if global_accuracy > 0.95:
-            # Muy alto accuracy = probabilidad muy baja
-            prob_dislexia = base_prob * 0.1
-        elif global_accuracy > 0.85:
-            # Alto accuracy = probabilidad baja
-            prob_dislexia = base_prob * 0.25
-        elif global_accuracy > 0.75:
-            # Accuracy normal-alto = probabilidad moderada-baja
-            prob_dislexia = base_prob * 0.5
-        elif global_accuracy > 0.60:
-            # Accuracy moderado = probabilidad moderada
-            prob_dislexia = base_prob * 0.8
-        else:
-            # Accuracy bajo = usar base_prob directamente o amplificado
-            prob_dislexia = base_prob * 1.2
+        factor = np.select(
+            [global_accuracy > 0.95,   # Muy alto accuracy = probabilidad muy baja
+             global_accuracy > 0.85,   # Alto accuracy = probabilidad baja
+             global_accuracy > 0.75,   # Accuracy normal-alto = probabilidad moderada-baja
+             global_accuracy > 0.60],  # Accuracy moderado = probabilidad moderada
+            [0.1, 0.25, 0.5, 0.8],
+            default=1.2                # Accuracy bajo = base_prob amplificado
+        )
         
         # Asegurar que está en rango [0, 1]
-        prob_dislexia = min(max(prob_dislexia, 0.0), 1.0)
+        prob_dislexia = np.clip(base_prob * factor, 0.0, 1.0)
         prob_normal = 1.0 - prob_dislexia
         
         # Predicción final
-        pred = 1 if prob_dislexia >= 0.40 else 0
+        pred = prob_dislexia >= 0.40
         
         # Interpretar resultado
-        risk_level = self._get_risk_level(prob_dislexia)
-        confidence = max(prob_dislexia, prob_normal) * 100
+        confidence = np.maximum(prob_dislexia, prob_normal) * 100
         
         return {
-            'prediccion': 'Posible Dislexia' if pred == 1 else 'Desarrollo Normal',
-            'probabilidad_dislexia': float(prob_dislexia),
-            'probabilidad_normal': float(prob_normal),
-            'nivel_riesgo': risk_level,
+            'prediccion': np.where(pred, 'Posible Dislexia', 'Desarrollo Normal'),
+            'probabilidad_dislexia': prob_dislexia,
+            'probabilidad_normal': prob_normal,
+            'nivel_riesgo': self._get_risk_levels(prob_dislexia),
             'confianza': confidence,
-            'recomendacion': self._get_recommendation(prob_dislexia, confidence),
-            'global_accuracy': float(global_accuracy),
-            'modelo_info': {
-                'version': self.model_info['version'],
-                'precision_modelo': f"{self.model_info['roc_auc']:.1%}"
-            }
+            'recomendacion': self._get_recommendations(prob_dislexia),
+            'global_accuracy': global_accuracy,
+            'probabilidad_modelo': prob_ml[:, 1]
         }
     
-    def _preprocess_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Aplicar mismo preprocesamiento que en entrenamiento"""
-        
-        # Imputar valores faltantes
-        df_imputed = pd.DataFrame(self.imputer.transform(df), columns=df.columns)
-        
-        # Aplicar feature engineering temporal (como en modelo optimizado)
-        df_processed = self._add_temporal_features(df_imputed)
-        
-        # Reordenar columnas según modelo entrenado
-        for feature in self.features:
-            if feature not in df_processed.columns:
-                df_processed[feature] = 0.0
-        
-        df_processed = df_processed[self.features]
-        
-        return df_processed
-    
-    def _add_temporal_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Anadir caracteristicas temporales como en el modelo"""
-        
-        # Tendencias de precision
-        accuracy_cols = sorted([col for col in df.columns if 'Accuracy' in col])[:32]
-        if len(accuracy_cols) >= 5:
-            accuracy_values = df[accuracy_cols].values
-            
-            # Tendencia temporal
-            trends = []
-            for row in accuracy_values:
-                valid_values = row[~np.isnan(row)]
-                if len(valid_values) >= 3:
-                    try:
-                        trend = np.polyfit(range(len(valid_values)), valid_values, 1)[0]
-                    except:
-                        trend = 0
-                else:
-                    trend = 0
-                trends.append(trend)
-            
-            df['accuracy_trend'] = trends
-            df['accuracy_mean_first_half'] = df[accuracy_cols[:16]].mean(axis=1)
-            df['accuracy_mean_second_half'] = df[accuracy_cols[16:32]].mean(axis=1)
-            df['accuracy_improvement'] = df['accuracy_mean_second_half'] - df['accuracy_mean_first_half']
-        
-        # Variabilidad en clicks
-        clicks_cols = sorted([col for col in df.columns if 'Clicks' in col])[:32]
-        if clicks_cols:
-            df['clicks_variability'] = df[clicks_cols].std(axis=1, skipna=True)
-            df['clicks_variability'] = df['clicks_variability'].fillna(0)
-            df['clicks_total'] = df[clicks_cols].sum(axis=1)
-        
-        # Ratios globales
-        misses_cols = sorted([col for col in df.columns if 'Misses' in col])[:32]
-        hits_cols = sorted([col for col in df.columns if 'Hits' in col])[:32]
-        if misses_cols and hits_cols:
-            total_misses = df[misses_cols].sum(axis=1)
-            total_hits = df[hits_cols].sum(axis=1)
-            df['global_accuracy'] = total_hits / (total_hits + total_misses + 1e-8)
-            
-            max_misses = df[misses_cols].max(axis=1)
-            df['error_concentration'] = max_misses / (total_misses + 1e-8)
-            
-            consistency_list = []
-            for idx in range(len(df)):
-                acc_row = df.iloc[idx][accuracy_cols].values
-                valid_acc = acc_row[~np.isnan(acc_row)]
-                if len(valid_acc) > 1 and np.mean(valid_acc) > 0:
-                    cv = np.std(valid_acc) / np.mean(valid_acc)
-                    consistency = 1.0 / (1.0 + cv)
-                else:
-                    consistency = 0.5
-                consistency_list.append(consistency)
-            
-            df['consistency_score'] = consistency_list
-        
-        return df
-    
-    def _get_risk_level(self, prob_dislexia: float) -> str:
-        """Determinar nivel de riesgo basado en probabilidad"""
-        if prob_dislexia < 0.05:
-            return "Riesgo Bajo"
-        elif prob_dislexia < 0.30:
-            return "Riesgo Moderado"
-        elif prob_dislexia < 0.70:
-            return "Riesgo Alto"
-        else:
-            return "Riesgo Crítico"
+    def _get_risk_levels(self, prob_dislexia: np.ndarray) -> np.ndarray:
+        """Nivel de riesgo por fila segun la probabilidad de dislexia"""
+        return np.select(
+            [prob_dislexia < 0.05, prob_dislexia < 0.30, prob_dislexia < 0.70],
+            ["Riesgo Bajo", "Riesgo Moderado", "Riesgo Alto"],
+            default="Riesgo Crítico"
+        )
     
-    def _get_recommendation(self, prob_dislexia: float, confidence: float) -> str:
-        """Generar recomendacion basada en prediccion"""
-        
-        if prob_dislexia > 0.7:
-            return "Se recomienda evaluacion profesional especializada en dislexia."
-        elif prob_dislexia > 0.3:
-            return "Se sugiere monitoring continuo y ejercicios de apoyo."
-        elif prob_dislexia > 0.05:
-            return "Desarrollo dentro de rangos normales con seguimiento ocasional."
-        else:
-            return "Desarrollo normal, continuar con actividades regulares."
+    def _get_recommendations(self, prob_dislexia: np.ndarray) -> np.ndarray:
+        """Recomendacion por fila segun la probabilidad de dislexia"""
+        return np.select(
+            [prob_dislexia > 0.7, prob_dislexia > 0.3, prob_dislexia > 0.05],
+            ["Se recomienda evaluacion profesional especializada en dislexia.",
+             "Se sugiere monitoring continuo y ejercicios de apoyo.",
+             "Desarrollo dentro de rangos normales con seguimiento ocasional."],
+            default="Desarrollo normal, continuar con actividades regulares."
+        )
 
 # Predictor listo para importar en app movil
 # Uso: from predictor import DislexiaPredictor
@@ -0,0 +1,382 @@
+"""
+Escritura diferida (write-behind) de resultados en la base de datos
+La evaluación responde apenas tiene la predicción; el resultado se encola y un
+hilo de fondo lo escribe en lotes. Si la base de datos no responde, los
+registros se reintentan y, si siguen fallando, se guardan en un archivo de
+derrame (NDJSON) que se vuelve a intentar cuando la base vuelve. La entrega es
+"al menos una vez": un corte justo después de un commit puede repetir un lote.
+"""
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.utils.log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso en desarrollo
+    fcntl = None
+
+log = get_logger(__name__)
+
+# Errores que indican que la base no está disponible (se reintenta más tarde);
+# cualquier otro error se considera un problema del registro
+_TRANSIENT_ERRORS = (OperationalError, DisconnectionError, PoolTimeoutError)
+
+
+def _is_transient(error):
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def _append_lines(path, lines):
+    """Agregar líneas a un archivo compartido entre procesos (con flock)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    while True:
+        with open(path, 'a', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            # Otro proceso pudo reclamar (renombrar) el archivo mientras se esperaba el lock
+            try:
+                current = os.stat(path).st_ino == os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                current = False
+            if not current:
+                continue
+            f.write(''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+            return
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class WriteBehindQueue:
+    """
+    Cola acotada con un hilo escritor por proceso
+
+    - submit() no toca la base: encola el registro, espera como máximo
+      put_timeout si la cola está llena (contrapresión) y, si sigue llena, lo
+      guarda en el archivo de derrame
+    - Los lotes fallidos por errores transitorios se reintentan con backoff
+      exponencial; agotados los reintentos van al archivo de derrame y la
+      base se da por no disponible durante replay_interval
+    - Los registros rechazados por la base (datos inválidos) van a
+      <spill_path>.rejected para revisarlos a mano
+    - close() deja de aceptar registros y vacía la cola antes de salir
+    """
+
+    def __init__(self, write_fn, capacity=1000, batch_size=50, flush_interval=0.5,
+                 max_retries=3, retry_backoff=0.5, put_timeout=0.05,
+                 spill_path='write_behind_spill.ndjson', replay_interval=30.0):
+        """
+        Args:
+            write_fn: Función (lista de registros) → None que los escribe en una
+                      transacción (DatabaseService.create_test_results)
+            capacity: Registros en memoria como máximo
+            batch_size: Registros por transacción
+            flush_interval: Segundos que se espera para completar un lote
+        """
+        self.write_fn = write_fn
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.put_timeout = put_timeout
+        self.spill_path = spill_path
+        self.rejected_path = spill_path + '.rejected'
+        self.replay_interval = replay_interval
+
+        self._app = None
+        self._queue = queue.Queue(maxsize=capacity)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._stop = threading.Event()
+        self._closed = False
+        self._unavailable_until = 0.0
+
+        # Métricas
+        self._submitted = 0
+        self._written = 0
+        self._batches = 0
+        self._retries = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._rejected = 0
+        self._last_error = None
+        self._last_flush_ms = None
+
+    def _ensure_worker(self):
+        """Iniciar el hilo escritor (también después de un fork)"""
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != pid or not self._worker.is_alive():
+                if self._worker_pid != pid:
+                    self._queue = queue.Queue(maxsize=self.capacity)
+                    self._stop = threading.Event()
+                self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._worker_pid = pid
+                self._worker.start()
+
+    def has_pending_spill(self) -> bool:
+        """Hay registros derramados por este u otro proceso esperando reintento"""
+        return os.path.exists(self.spill_path) or bool(
+            glob.glob(glob.escape(self.spill_path) + '.replay-*'))
+
+    def bind(self, app) -> bool:
+        """
+        Asociar la app de Flask y, si quedó un archivo de derrame (p. ej. de un
+        proceso anterior que se reinició durante un corte de la BD), iniciar
+        el hilo escritor para reintentarlo sin esperar a un submit()
+
+        Returns:
+            True si se inició el hilo escritor
+        """
+        self._app = app
+        if self._closed or not self.has_pending_spill():
+            return False
+        self._ensure_worker()
+        return True
+
+    def stop_worker(self, timeout=10.0):
+        """
+        Detener el hilo escritor de este proceso sin cerrar la cola (el master
+        de gunicorn antes de hacer fork; cada worker lo reinicia con bind)
+        """
+        worker = self._worker
+        if worker is None or self._worker_pid != os.getpid():
+            return
+        self._stop.set()
+        worker.join(timeout)
+        with self._lock:
+            self._worker = None
+            self._stop = threading.Event()
+
+    def submit(self, record, app=None) -> str:
+        """
+        Encolar un registro (dict serializable a JSON)
+
+        Args:
+            app: App de Flask para el contexto del hilo escritor (por defecto,
+                 current_app del request)
+
+        Returns:
+            'queued', o 'spilled' si la cola estaba llena o cerrada
+        """
+        if self._app is None:
+            if app is None:
+                from flask import current_app
+                app = current_app._get_current_object()
+            self._app = app
+
+        self._submitted += 1
+        if not self._closed:
+            self._ensure_worker()
+            try:
+                self._queue.put(record, timeout=self.put_timeout)
+                return 'queued'
+            except queue.Full:
+                pass
+        self._spill([record])
+        return 'spilled'
+
+    def _collect(self):
+        """Esperar el primer registro y completar el lote durante flush_interval"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        next_replay = time.monotonic()
+        while not (self._stop.is_set() and self._queue.empty()):
+            # Un error inesperado (disco lleno, archivo de derrame ilegible...)
+            # no debe terminar el hilo: se registra y se sigue con el próximo lote
+            try:
+                batch = self._collect()
+                if batch:
+                    self._flush(batch)
+                if time.monotonic() >= next_replay:
+                    next_replay = time.monotonic() + self.replay_interval
+                    self._replay_spill()
+            except Exception as e:
+                self._last_error = f"{type(e).__name__}: {e}"
+                log.exception("Error en el hilo de escritura diferida")
+                if self._stop.wait(self.retry_backoff):
+                    continue
+
+    def _write(self, batch):
+        with self._app.app_context():
+            self.write_fn(batch)
+
+    def _flush(self, batch):
+        """Escribir un lote con reintentos; lo que no se pueda escribir se persiste en disco"""
+        if time.monotonic() < self._unavailable_until:
+            self._spill(batch)
+            return
+
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception as e:
+                self._last_error = f"{type(e).__name__}: {e}"
+                if not _is_transient(e):
+                    self._flush_individually(batch)
+                    return
+                if attempt < self.max_retries:
+                    self._retries += 1
+                    if self._stop.wait(self.retry_backoff * 2 ** attempt):
+                        break
+                continue
+            self._batches += 1
+            self._written += len(batch)
+            self._last_flush_ms = (time.perf_counter() - start) * 1000.0
+            return
+
+        log.warning("Base de datos no disponible; resultados guardados en disco",
+                    records=len(batch), spill_path=self.spill_path, error=self._last_error)
+        self._unavailable_until = time.monotonic() + self.replay_interval
+        self._spill(batch)
+
+    def _flush_individually(self, batch):
+        """Aislar los registros inválidos de un lote rechazado"""
+        for record in batch:
+            try:
+                self._write([record])
+            except Exception as e:
+                self._last_error = f"{type(e).__name__}: {e}"
+                if _is_transient(e):
+                    self._spill([record])
+                else:
+                    self._rejected += 1
+                    log.error("Resultado rechazado por la base de datos", error=str(e),
+                              rejected_path=self.rejected_path)
+                    _append_lines(self.rejected_path, [json.dumps(record, default=str) + '\n'])
+            else:
+                self._batches += 1
+                self._written += 1
+
+    def _spill(self, records):
+        self._spilled += len(records)
+        _append_lines(self.spill_path, [json.dumps(record, default=str) + '\n' for record in records])
+
+    def _claimable_files(self):
+        """Archivo de derrame actual y reclamos huérfanos de procesos terminados"""
+        files = []
+        for path in glob.glob(glob.escape(self.spill_path) + '.replay-*'):
+            try:
+                pid = int(path.rsplit('.replay-', 1)[1].split('.')[0])
+            except ValueError:
+                continue
+            if pid == os.getpid() or not _pid_alive(pid):
+                files.append(path)
+        if os.path.exists(self.spill_path):
+            claim = f"{self.spill_path}.replay-{os.getpid()}.{time.time_ns()}"
+            try:
+                with open(self.spill_path, 'a', encoding='utf-8') as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                    os.replace(self.spill_path, claim)
+                files.append(claim)
+            except FileNotFoundError:
+                pass
+        return files
+
+    def _replay_spill(self):
+        """Reintentar los registros derramados si la base está disponible"""
+        if self._app is None or time.monotonic() < self._unavailable_until:
+            return
+        for path in self._claimable_files():
+            records = self._read_spill(path)
+            written_before = self._written
+            for i in range(0, len(records), self.batch_size):
+                self._flush(records[i:i + self.batch_size])
+            self._replayed += self._written - written_before
+            os.remove(path)
+
+    def _read_spill(self, path):
+        """
+        Leer un archivo de derrame; las líneas ilegibles (p. ej. la última
+        línea truncada por un worker terminado a mitad de escritura) van a
+        <spill_path>.rejected en lugar de bloquear el resto del archivo
+        """
+        records, invalid = [], []
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    invalid.append(line if line.endswith('\n') else line + '\n')
+        if invalid:
+            self._rejected += len(invalid)
+            log.error("Líneas ilegibles en el archivo de derrame", lines=len(invalid),
+                      spill_path=path, rejected_path=self.rejected_path)
+            _append_lines(self.rejected_path, invalid)
+        return records
+
+    def close(self, timeout=10.0):
+        """Dejar de aceptar registros y escribir los pendientes (o persistirlos)"""
+        self._closed = True
+        self._stop.set()
+        worker = self._worker
+        if worker is not None and self._worker_pid == os.getpid():
+            worker.join(timeout)
+
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if pending:
+            self._spill(pending)
+
+    def stats(self) -> dict:
+        spill_bytes = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+        return {
+            "enabled": True,
+            "queued": self._queue.qsize(),
+            "capacity": self.capacity,
+            "submitted": self._submitted,
+            "written": self._written,
+            "batches": self._batches,
+            "retries": self._retries,
+            "spilled": self._spilled,
+            "spill_bytes": spill_bytes,
+            "replayed": self._replayed,
+            "rejected": self._rejected,
+            "database_available": time.monotonic() >= self._unavailable_until,
+            "last_flush_ms": self._last_flush_ms,
+            "last_error": self._last_error
+        }
@@ -1,5 +1,20 @@
+import numpy as np
 from flask import jsonify
 
+# Máximo de errores de validación que se reportan por request
+MAX_VALIDATION_ERRORS = 100
+
+
+def _to_float(value):
+    """float(value), o None si no es numérico"""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+_to_float_array = np.frompyfunc(_to_float, 1, 1)
+
 class Response:
     """Utilidad para respuestas estandarizadas"""
     
@@ -34,19 +49,110 @@ class Validator:
     """Validador de entrada"""
     
     @staticmethod
-    def validate_features(features, expected_count=206):
-        """Validar características"""
+    def _expected_count(expected_count):
+        if expected_count is not None:
+            return expected_count
+        from app.models.feature_schema import get_feature_schema
+        return get_feature_schema().n_features
+    
+    @staticmethod
+    def _error(code, message, row=None, index=None):
+        error = {"code": code, "message": message}
+        if row is not None:
+            error["row"] = row
+        if index is not None:
+            error["index"] = index
+        return error
+    
+    @staticmethod
+    def _row_errors(values, expected_count, row=None):
+        """Errores detallados de una fila (solo se usa cuando la conversión rápida falla)"""
+        if not isinstance(values, (list, tuple)):
+            return [Validator._error("type", "features debe ser una lista", row)]
+        if len(values) != expected_count:
+            return [Validator._error(
+                "length",
+                f"Se esperaban {expected_count} características, se recibieron {len(values)}",
+                row
+            )]
+        
+        converted = _to_float_array(np.fromiter(values, dtype=object, count=len(values)))
+        non_numeric = np.equal(converted, None)
+        numbers = np.where(non_numeric, 0.0, converted).astype(np.float64)
+        non_finite = ~non_numeric & ~np.isfinite(numbers)
+        
         errors = []
+        for i in np.flatnonzero(non_numeric | non_finite)[:MAX_VALIDATION_ERRORS]:
+            if non_numeric[i]:
+                errors.append(Validator._error(
+                    "non_numeric", f"Característica {i} no es numérica: {values[i]}", row, int(i)
+                ))
+            else:
+                errors.append(Validator._error(
+                    "non_finite", f"Característica {i} no es un número finito: {values[i]}", row, int(i)
+                ))
+        return errors
+    
+    @staticmethod
+    def feature_matrix(rows, expected_count=None):
+        """
+        Validar y convertir un lote de vectores de features
         
-        if not isinstance(features, list):
-            errors.append("features debe ser una lista")
-        elif len(features) != expected_count:
-            errors.append(f"Se esperaban {expected_count} características, se recibieron {len(features)}")
+        El lote se convierte con una sola llamada a NumPy y los valores no
+        finitos se detectan con una máscara; el detalle por fila solo se
+        calcula si hay errores.
+        
+        Args:
+            rows: Lista de listas de features
+            expected_count: Features por fila (por defecto, las del esquema del modelo)
+        
+        Returns:
+            (X, errors): X es un array (N, expected_count) float64 y errors None,
+            o X es None y errors una lista de dicts con code, message, row e index
+        """
+        expected_count = Validator._expected_count(expected_count)
+        if not isinstance(rows, list) or not rows:
+            return None, [Validator._error("type", "'data' debe ser una lista no vacía")]
+        
+        try:
+            X = np.asarray(rows, dtype=np.float64)
+        except (ValueError, TypeError):
+            X = None
+        
+        if X is not None and X.ndim == 2 and X.shape[1] == expected_count:
+            invalid = ~np.isfinite(X)
+            if not invalid.any():
+                return X, None
+            bad_rows = np.flatnonzero(invalid.any(axis=1))
         else:
-            for i, f in enumerate(features):
-                try:
-                    float(f)
-                except (ValueError, TypeError):
-                    errors.append(f"Característica {i} no es numérica: {f}")
+            bad_rows = range(len(rows))
+        
+        errors = []
+        for row in bad_rows:
+            errors.extend(Validator._row_errors(rows[row], expected_count, int(row)))
+            if len(errors) >= MAX_VALIDATION_ERRORS:
+                break
+        return None, errors[:MAX_VALIDATION_ERRORS]
+    
+    @staticmethod
+    def feature_vector(features, expected_count=None):
+        """
+        Validar y convertir un vector de features
         
-        return errors if errors else None
+        Returns:
+            (x, errors): x es un array (expected_count,) float64 y errors None,
+            o x es None y errors una lista de dicts con code, message e index
+        """
+        if not isinstance(features, list):
+            return None, [Validator._error("type", "features debe ser una lista")]
+        X, errors = Validator.feature_matrix([features], expected_count)
+        if errors:
+            for error in errors:
+                error.pop("row", None)
+            return None, errors
+        return X[0], None
+    
+    @staticmethod
+    def validate_features(features, expected_count=None):
+        """Validar características (lista de errores, o None si son válidas)"""
+        return Validator.feature_vector(features, expected_count)[1]
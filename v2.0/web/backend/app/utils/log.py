@@ -0,0 +1,258 @@
+"""
+Logging estructurado del backend
+Cada evento es una línea JSON ({"ts", "level", "logger", "msg", ...campos})
+escrita por un hilo de fondo: el request solo arma el registro y lo encola
+(QueueHandler), sin esperar a stdout. Si la cola se llena, el registro se
+descarta y se cuenta en lugar de bloquear el request.
+
+    from app.utils.log import get_logger
+    log = get_logger(__name__)
+
+    log.debug("Shapes", rows=3)                 # no cuesta nada si el nivel es INFO
+    log.info("Evaluación", risk="Bajo", sampled=True)  # muestreado con LOG_SAMPLE_RATE
+    if log.payloads_enabled:                    # volcado de payloads (LOG_DEBUG_PAYLOADS)
+        log.debug("Payload", payload=data)
+
+Variables de entorno (ver app/config.py): LOG_LEVEL, LOG_FORMAT (json o
+text), LOG_SAMPLE_RATE, LOG_QUEUE_SIZE, LOG_DEBUG_PAYLOADS, LOG_SQL.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT_LOGGER = 'dyslexia'
+
+# Atributos estándar de LogRecord (todo lo demás son campos del evento)
+_RESERVED = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+_state = {
+    'sample_rate': 1.0,
+    'payloads': False,
+    'handler': None,
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro"""
+
+    def format(self, record):
+        event = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                event[key] = value
+        if record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legible para desarrollo: nivel, logger, mensaje y campos"""
+
+    def format(self, record):
+        fields = ' '.join(f"{key}={value}" for key, value in record.__dict__.items()
+                          if key not in _RESERVED)
+        line = f"[{record.levelname}] {record.name}: {record.getMessage()}"
+        if fields:
+            line = f"{line} {fields}"
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler con cola acotada, descarte en lugar de bloqueo y un hilo
+    escritor por proceso (se reinicia solo después de un fork)
+    """
+
+    def __init__(self, target, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self._listener = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+        self.emitted = 0
+        self.dropped = 0
+        self.emit_seconds = 0.0
+
+    def _ensure_listener(self):
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid != os.getpid():
+                # El hilo del proceso padre no existe en el hijo
+                self.queue = queue.Queue(maxsize=self.maxsize)
+                self._listener = logging.handlers.QueueListener(self.queue, self.target)
+                self._listener.start()
+                self._listener_pid = os.getpid()
+
+    def prepare(self, record):
+        # El mensaje y la traza se resuelven aquí (los argumentos pueden cambiar
+        # después); el formato JSON lo arma el hilo escritor
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        # Costo en el hilo del request: copiar el registro y encolarlo
+        start = time.perf_counter()
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+        self.emit_seconds += time.perf_counter() - start
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+            self.emitted += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+
+    def stats(self):
+        return {
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+            "emit_us_mean": self.emit_seconds / (self.emitted + self.dropped) * 1e6
+                            if self.emitted + self.dropped else None
+        }
+
+
+class StructuredLogger:
+    """
+    Envoltorio de logging.Logger con campos como kwargs
+
+    Los campos van al JSON como claves propias. `sampled=True` marca eventos
+    del camino caliente: se registran con probabilidad LOG_SAMPLE_RATE
+    (WARNING y ERROR nunca se muestrean).
+    """
+
+    __slots__ = ('logger',)
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    @property
+    def payloads_enabled(self):
+        """Volcados de payloads/diccionarios completos (solo con LOG_DEBUG_PAYLOADS)"""
+        return _state['payloads'] and self.logger.isEnabledFor(logging.DEBUG)
+
+    def _log(self, level, msg, fields, exc_info=False):
+        if not self.logger.isEnabledFor(level):
+            return
+        if fields.pop('sampled', False) and level < logging.WARNING:
+            rate = _state['sample_rate']
+            if rate < 1.0 and random.random() >= rate:
+                return
+        # makeRecord + handle en vez de logger.log: evita buscar el archivo y la
+        # línea del llamador en el stack (no se incluyen en el JSON)
+        if exc_info:
+            exc_info = sys.exc_info()
+        record = self.logger.makeRecord(self.logger.name, level, '', 0, msg, (), exc_info or None,
+                                        extra=fields or None)
+        self.logger.handle(record)
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+    def exception(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields, exc_info=True)
+
+
+def get_logger(name) -> StructuredLogger:
+    """Logger hijo de 'dyslexia' (p. ej. get_logger(__name__))"""
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
+
+
+def configure_logging(config):
+    """
+    Configurar el logger raíz 'dyslexia' (idempotente)
+
+    Args:
+        config: Mapeo con LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE,
+                LOG_QUEUE_SIZE, LOG_DEBUG_PAYLOADS y LOG_SQL (app.config)
+    """
+    level = logging.getLevelName(str(config.get('LOG_LEVEL', 'INFO')).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"LOG_LEVEL inválido: {config.get('LOG_LEVEL')}")
+    _state['sample_rate'] = min(1.0, max(0.0, float(config.get('LOG_SAMPLE_RATE', 1.0))))
+    _state['payloads'] = bool(config.get('LOG_DEBUG_PAYLOADS', False))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.propagate = False
+
+    if _state['handler'] is None:
+        target = logging.StreamHandler(sys.stdout)
+        handler = NonBlockingQueueHandler(target, maxsize=int(config.get('LOG_QUEUE_SIZE', 10000)))
+        root.addHandler(handler)
+        atexit.register(stop_logging)
+        _state['handler'] = handler
+    handler = _state['handler']
+    handler.target.setFormatter(
+        TextFormatter() if config.get('LOG_FORMAT', 'json') == 'text' else JsonFormatter()
+    )
+
+    # SQL de SQLAlchemy por la misma cola, en vez de SQLALCHEMY_ECHO (que
+    # escribe cada sentencia directo en stdout desde el hilo del request)
+    if config.get('LOG_SQL', False):
+        sql_logger = logging.getLogger('sqlalchemy.engine')
+        sql_logger.setLevel(logging.INFO)
+        sql_logger.propagate = False
+        if handler not in sql_logger.handlers:
+            sql_logger.addHandler(handler)
+    return handler
+
+
+def stop_logging():
+    """Escribir los registros pendientes y detener el hilo escritor del proceso"""
+    if _state['handler'] is not None:
+        _state['handler'].stop()
+
+
+def logging_stats() -> dict:
+    """Registros emitidos, descartados y costo medio por registro en el hilo que loguea"""
+    handler = _state['handler']
+    if handler is None:
+        return {"configured": False}
+    stats = handler.stats()
+    stats["level"] = logging.getLevelName(logging.getLogger(ROOT_LOGGER).level)
+    stats["sample_rate"] = _state['sample_rate']
+    return stats
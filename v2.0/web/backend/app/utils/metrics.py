@@ -0,0 +1,533 @@
+"""
+Métricas de latencia y de requests en formato Prometheus
+Histogramas de buckets fijos (observar = una búsqueda binaria y dos sumas bajo
+un lock), contadores y colectores que leen el estado de otros componentes
+(cache, modelo, pool...) al momento de exportar. Todo se expone en texto de
+Prometheus en GET /api/metrics.
+
+    from app.utils.metrics import stage
+
+    with stage('scaling'):
+        X_scaled = preprocessor.scale(X)
+
+Las etapas se etiquetan con el endpoint del request en curso (url_rule de
+Flask); fuera de un request (hilos de micro-batching, escritura diferida,
+warm-up) la etiqueta es 'background'.
+
+Con varios workers de gunicorn (METRICS_MULTIPROC_DIR), cada worker escribe
+sus histogramas y contadores en un archivo del directorio compartido y el
+worker que atiende el scrape los suma: las series son las de todo el servidor
+y siguen siendo monótonas aunque el scrape llegue a otro worker o un worker se
+recicle. Los gauges de los colectores (cache, pool, cola...) describen al
+worker que respondió y llevan la etiqueta pid.
+"""
+import bisect
+import contextvars
+import functools
+import glob
+import json
+import os
+import threading
+import time
+
+from app.utils.log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso en desarrollo
+    fcntl = None
+
+log = get_logger(__name__)
+
+# Límites superiores de los buckets, en segundos (10 µs a 10 s)
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+BACKGROUND = 'background'
+
+_endpoint = contextvars.ContextVar('metrics_endpoint', default=BACKGROUND)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'sum', 'count', 'lock')
+
+    def __init__(self, n_buckets):
+        self.counts = [0] * (n_buckets + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+
+class Histogram:
+    """Histograma con etiquetas (una serie por combinación de valores)"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _get(self, labels):
+        series = self._series.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(labels, _HistogramSeries(len(self.buckets)))
+        return series
+
+    def observe(self, value, *labels):
+        series = self._get(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with series.lock:
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def snapshot(self):
+        """{labels: (conteos por bucket, suma, total)}"""
+        with self._lock:
+            items = list(self._series.items())
+        result = {}
+        for labels, series in items:
+            with series.lock:
+                result[labels] = (list(series.counts), series.sum, series.count)
+        return result
+
+    def quantile(self, q, counts):
+        """Cuantil aproximado (interpolación lineal dentro del bucket)"""
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # por encima del último límite
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    @staticmethod
+    def merge(total, values):
+        """Sumar un snapshot de otro proceso a total (en el lugar)"""
+        for labels, (counts, total_sum, count) in values.items():
+            current = total.get(labels)
+            if current is None:
+                total[labels] = (list(counts), total_sum, count)
+            else:
+                total[labels] = ([a + b for a, b in zip(current[0], counts)],
+                                 current[1] + total_sum, current[2] + count)
+
+    def render(self, snapshot=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        for labels, (counts, total_sum, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Counter:
+    """Contador monótono con etiquetas"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total, values):
+        """Sumar un snapshot de otro proceso a total (en el lugar)"""
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def render(self, snapshot=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Métricas del proceso y colectores de estado externo"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._store = None
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        Agregar una función que retorna (name, type, documentation, samples),
+        con samples = [(dict de etiquetas, valor)], leída en cada exportación
+        """
+        self._collectors.append(collector)
+
+    @property
+    def metrics(self):
+        return list(self._metrics)
+
+    def enable_multiprocess(self, directory, interval=1.0):
+        """Sumar las métricas de los workers que comparten directory"""
+        if self._store is None or self._store.directory != directory:
+            self._store = MultiprocessStore(self, directory, interval)
+        return self._store
+
+    def after_fork(self):
+        """
+        Worker recién creado: descartar lo heredado del master (se contaría
+        una vez por worker) y empezar a publicar las métricas propias
+        """
+        for metric in self._metrics:
+            metric.reset()
+        if self._store is not None:
+            self._store.start()
+
+    def close(self):
+        """Publicar el último snapshot del proceso (al terminar un worker)"""
+        if self._store is not None:
+            self._store.stop()
+
+    def snapshots(self):
+        """{nombre: snapshot} del servidor (todos los workers) o del proceso"""
+        if self._store is not None:
+            return self._store.merged()
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render(self) -> str:
+        """Texto de Prometheus (exposition format 0.0.4)"""
+        lines = []
+        snapshots = self.snapshots()
+        for metric in self._metrics:
+            lines.extend(metric.render(snapshots.get(metric.name, {})))
+        pid = str(os.getpid())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                lines.append(f"# Error en colector {getattr(collector, '__name__', collector)}: {_escape(e)}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    # Estado de este worker: la etiqueta pid separa sus series
+                    labels = {**labels, 'pid': labels.get('pid', pid)}
+                    label_text = _format_labels(labels.keys(), labels.values())
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class MultiprocessStore:
+    """
+    Métricas compartidas entre los workers de gunicorn
+
+    Cada worker escribe su snapshot cada interval segundos, antes de responder
+    un scrape y al terminar en <directory>/metrics-<pid>-<inicio>.json. Un
+    scrape suma los archivos (también el propio, recién escrito): cada archivo
+    solo crece, así que ningún total retrocede aunque el siguiente scrape lo
+    atienda otro worker con una copia algo más vieja del primero. Los
+    archivos de workers terminados se acumulan en metrics-archive.json, así
+    que los totales no retroceden cuando un worker se recicla. El master vacía
+    el directorio al arrancar (clear).
+    """
+
+    ARCHIVE = 'metrics-archive.json'
+
+    def __init__(self, registry, directory, interval=1.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._path = None
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def clear(directory):
+        """Borrar los archivos de una ejecución anterior (master, antes de crear workers)"""
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(glob.escape(directory), 'metrics-*.json')):
+            os.remove(path)
+
+    def start(self):
+        """Iniciar el hilo que publica el snapshot de este proceso"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._pid = os.getpid()
+            self._path = os.path.join(self.directory, f"metrics-{self._pid}-{time.time_ns()}.json")
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._pid == os.getpid():
+            self._stop.set()
+            self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except Exception:
+                log.exception("No se pudieron publicar las métricas del worker", path=self._path)
+
+    def _own_snapshots(self):
+        return {metric.name: metric.snapshot() for metric in self.registry.metrics}
+
+    @staticmethod
+    def _dump(snapshots):
+        return {name: [[list(labels), value] for labels, value in values.items()]
+                for name, values in snapshots.items()}
+
+    @staticmethod
+    def _load(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {name: {tuple(labels): value for labels, value in values}
+                for name, values in data.items()}
+
+    @staticmethod
+    def _write_json(path, snapshots):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(MultiprocessStore._dump(snapshots), f)
+        os.replace(tmp_path, path)
+
+    def write(self):
+        """Publicar el snapshot de este proceso"""
+        if self._path is not None and self._pid == os.getpid():
+            with self._write_lock:
+                self._write_json(self._path, self._own_snapshots())
+
+    def _merge_into(self, total, snapshots):
+        merges = {metric.name: metric.merge for metric in self.registry.metrics}
+        for name, values in snapshots.items():
+            if name in merges:
+                merges[name](total.setdefault(name, {}), values)
+
+    def _is_dead(self, path):
+        try:
+            pid = int(os.path.basename(path).split('-')[1])
+        except (IndexError, ValueError):
+            return False
+        # Mismo pid con otro archivo: un worker anterior cuyo pid se reutilizó
+        return not _pid_alive(pid) or pid == os.getpid()
+
+    def _archive_dead(self):
+        """Mover los snapshots de workers terminados al archivo acumulado"""
+        dead = [path for path in glob.glob(os.path.join(glob.escape(self.directory), 'metrics-*-*.json'))
+                if path != self._path and self._is_dead(path)]
+        if not dead:
+            return
+        archive_path = os.path.join(self.directory, self.ARCHIVE)
+        archive = self._load(archive_path) if os.path.exists(archive_path) else {}
+        for path in dead:
+            try:
+                self._merge_into(archive, self._load(path))
+            except (OSError, ValueError):
+                continue
+        self._write_json(archive_path, archive)
+        for path in dead:
+            os.remove(path)
+
+    def merged(self):
+        """{nombre: snapshot} sumado entre todos los workers (vivos y terminados)"""
+        total = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self.write()
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._archive_dead()
+            for path in glob.glob(os.path.join(glob.escape(self.directory), 'metrics-*.json')):
+                try:
+                    self._merge_into(total, self._load(path))
+                except (OSError, ValueError):
+                    continue  # archivo ilegible
+        if self._path is None or self._pid != os.getpid():
+            # Proceso que no publica (sin gunicorn): sus valores en vivo
+            self._merge_into(total, self._own_snapshots())
+        return total
+
+
+METRICS = MetricsRegistry()
+
+REQUEST_DURATION = METRICS.histogram(
+    'dyslexia_request_duration_seconds', 'Latencia de los requests por endpoint', ('endpoint', 'method'))
+REQUESTS = METRICS.counter(
+    'dyslexia_requests_total', 'Requests atendidos por endpoint y status', ('endpoint', 'method', 'status'))
+REQUEST_ERRORS = METRICS.counter(
+    'dyslexia_request_errors_total', 'Requests con status 5xx o excepción no manejada', ('endpoint',))
+STAGE_DURATION = METRICS.histogram(
+    'dyslexia_stage_duration_seconds', 'Latencia de cada etapa del procesamiento por endpoint',
+    ('endpoint', 'stage'))
+
+
+class stage:
+    """Context manager que mide una etapa en STAGE_DURATION"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_DURATION.observe(time.perf_counter() - self.start, _endpoint.get(), self.name)
+        return False
+
+
+def timed(stage_name):
+    """Decorador equivalente a envolver la función en stage(stage_name)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_DURATION.observe(time.perf_counter() - start, _endpoint.get(), stage_name)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Registrar los hooks que miden cada request de la app"""
+    from flask import g, request
+
+    if app.config.get('METRICS_MULTIPROC_DIR'):
+        METRICS.enable_multiprocess(app.config['METRICS_MULTIPROC_DIR'],
+                                    app.config.get('METRICS_WRITE_INTERVAL', 1.0))
+
+    @app.before_request
+    def _start_request_timer():
+        rule = request.url_rule
+        g.metrics_endpoint = rule.rule if rule is not None else 'unmatched'
+        g.metrics_token = _endpoint.set(g.metrics_endpoint)
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            endpoint = g.metrics_endpoint
+            REQUEST_DURATION.observe(time.perf_counter() - start, endpoint, request.method)
+            REQUESTS.inc(endpoint, request.method, str(response.status_code))
+            if response.status_code >= 500:
+                REQUEST_ERRORS.inc(endpoint)
+        return response
+
+    @app.teardown_request
+    def _finish_request(exception=None):
+        if exception is not None and g.pop('metrics_start', None) is not None:
+            REQUESTS.inc(g.metrics_endpoint, request.method, '500')
+            REQUEST_ERRORS.inc(g.metrics_endpoint)
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            try:
+                _endpoint.reset(token)
+            except ValueError:
+                pass  # el request terminó en otro contexto (respuestas en streaming)
+
+
+def _process_info():
+    return [('dyslexia_process_info', 'gauge', 'Proceso que respondió el scrape',
+             [({'pid': os.getpid()}, 1)])]
+
+
+METRICS.register_collector(_process_info)
+
+
+def latency_summary() -> dict:
+    """Resumen de los histogramas para la vista JSON (ms, cuantiles aproximados)"""
+    summary = {}
+    snapshots = METRICS.snapshots()
+    for histogram, key in ((REQUEST_DURATION, 'requests'), (STAGE_DURATION, 'stages')):
+        section = summary.setdefault(key, {})
+        for labels, (counts, total_sum, count) in snapshots.get(histogram.name, {}).items():
+            p50 = histogram.quantile(0.50, counts)
+            p99 = histogram.quantile(0.99, counts)
+            section.setdefault(labels[0], {})[labels[1]] = {
+                "count": count,
+                "mean_ms": total_sum / count * 1000.0 if count else None,
+                "p50_ms": p50 * 1000.0 if p50 is not None else None,
+                "p99_ms": p99 * 1000.0 if p99 is not None else None
+            }
+    return summary
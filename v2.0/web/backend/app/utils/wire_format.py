@@ -0,0 +1,171 @@
+"""
+Formato binario compacto para /api/activities/rounds/evaluate
+Alternativa al JSON para enlaces móviles lentos: un header fijo con los datos
+demográficos, un bloque JSON opcional con los campos de texto (userId,
+childId, nombres...), la tabla de actividades y las rondas empaquetadas como
+una matriz numérica que el servidor lee directamente con np.frombuffer.
+
+Se negocia con `Content-Type: application/vnd.dyslexia.rounds`; cualquier otro
+Content-Type sigue el camino JSON.
+
+Layout (little-endian):
+
+    offset  tamaño  campo
+    0       4       magic b'DYSR'
+    4       1       versión (1)
+    5       1       bytes por valor: 4 (float32) u 8 (float64)
+    6       1       flags: bit0 gender Male, bit1 native_lang, bit2 other_lang
+    7       1       n_fields: columnas por ronda (ver ROUND_FIELDS)
+    8       2       age (uint16)
+    10      2       n_activities (uint16)
+    12      4       metadata_len (uint32)
+    16      ...     metadata: JSON UTF-8 (metadata_len bytes, puede ser 0)
+    ...     ...     por actividad: name_len (uint8), name UTF-8, n_rounds (uint16)
+    ...     ...     rondas: sum(n_rounds) × n_fields valores, fila por ronda
+
+Las columnas siguen ROUND_FIELDS; un cliente puede enviar menos (las que
+faltan valen 0, como un campo ausente en JSON) o más (se ignoran).
+"""
+import json
+import struct
+
+import numpy as np
+
+CONTENT_TYPE = 'application/vnd.dyslexia.rounds'
+
+MAGIC = b'DYSR'
+VERSION = 1
+
+# Columnas de la matriz de rondas; las 6 primeras son las del modelo
+ROUND_FIELDS = ('clicks', 'hits', 'misses', 'score', 'accuracy', 'missrate', 'attempts', 'time')
+
+# Columnas que se guardan como enteros en la base de datos
+_INTEGER_FIELDS = ('clicks', 'hits', 'misses', 'attempts')
+
+_HEADER = struct.Struct('<4sBBBBHHI')
+_DTYPES = {4: np.dtype('<f4'), 8: np.dtype('<f8')}
+
+_FLAG_MALE = 0x01
+_FLAG_NATIVE_LANG = 0x02
+_FLAG_OTHER_LANG = 0x04
+
+
+class WireFormatError(ValueError):
+    """Cuerpo binario mal formado"""
+
+
+def encode_rounds(data, value_size=4) -> bytes:
+    """
+    Codificar un payload con el formato JSON del endpoint
+
+    Lo usan los clientes en Python, los tests manuales y benchmark.py; la app
+    Flutter implementa el mismo layout.
+
+    Args:
+        data: Dict con 'user', 'activities' y campos opcionales de texto
+        value_size: 4 (float32, la mitad de bytes) u 8 (float64, sin redondeo)
+    """
+    if value_size not in _DTYPES:
+        raise WireFormatError(f"value_size debe ser 4 u 8, no {value_size}")
+
+    user = data.get('user', {})
+    flags = 0
+    if str(user.get('gender', 'Male')).lower() == 'male':
+        flags |= _FLAG_MALE
+    if user.get('native_lang', True):
+        flags |= _FLAG_NATIVE_LANG
+    if user.get('other_lang', False):
+        flags |= _FLAG_OTHER_LANG
+
+    metadata = {key: value for key, value in data.items() if key not in ('user', 'activities')}
+    metadata_bytes = json.dumps(metadata, separators=(',', ':')).encode('utf-8') if metadata else b''
+
+    activities = data.get('activities', [])
+    parts = [_HEADER.pack(MAGIC, VERSION, value_size, flags, len(ROUND_FIELDS),
+                          int(user.get('age', 8)), len(activities), len(metadata_bytes)),
+             metadata_bytes]
+    rows = []
+    for activity in activities:
+        name = activity.get('name', '').encode('utf-8')
+        rounds = activity.get('rounds', [])
+        parts.append(struct.pack('<B', len(name)) + name + struct.pack('<H', len(rounds)))
+        rows.extend([round_data.get(field, 0) for field in ROUND_FIELDS] for round_data in rounds)
+
+    values = np.array(rows, dtype=_DTYPES[value_size]).reshape(-1, len(ROUND_FIELDS))
+    parts.append(values.tobytes())
+    return b''.join(parts)
+
+
+def decode_rounds(body: bytes):
+    """
+    Decodificar un cuerpo binario
+
+    Returns:
+        (data, rounds): data tiene la forma del payload JSON, pero cada
+        actividad lleva 'round_count' en lugar de la lista 'rounds';
+        rounds es un array (n_rondas, len(ROUND_FIELDS)) float64 con las
+        rondas de todas las actividades en orden.
+    """
+    if len(body) < _HEADER.size:
+        raise WireFormatError("Cuerpo binario demasiado corto")
+    magic, version, value_size, flags, n_fields, age, n_activities, metadata_len = \
+        _HEADER.unpack_from(body, 0)
+    if magic != MAGIC:
+        raise WireFormatError("Cuerpo binario sin la firma DYSR")
+    if version != VERSION:
+        raise WireFormatError(f"Versión de formato binario no soportada: {version}")
+    if value_size not in _DTYPES:
+        raise WireFormatError(f"Tamaño de valor inválido: {value_size}")
+
+    offset = _HEADER.size
+    data = {}
+    if metadata_len:
+        try:
+            data = json.loads(body[offset:offset + metadata_len].decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise WireFormatError(f"Metadata inválida: {e}")
+        if not isinstance(data, dict):
+            raise WireFormatError("La metadata debe ser un objeto JSON")
+        offset += metadata_len
+
+    data['user'] = {
+        'gender': 'Male' if flags & _FLAG_MALE else 'Female',
+        'age': age,
+        'native_lang': bool(flags & _FLAG_NATIVE_LANG),
+        'other_lang': bool(flags & _FLAG_OTHER_LANG)
+    }
+
+    activities = []
+    try:
+        for _ in range(n_activities):
+            name_len = body[offset]
+            name = body[offset + 1:offset + 1 + name_len].decode('utf-8')
+            offset += 1 + name_len
+            (round_count,) = struct.unpack_from('<H', body, offset)
+            offset += 2
+            activities.append({'name': name, 'round_count': round_count})
+    except (IndexError, struct.error, UnicodeDecodeError):
+        raise WireFormatError("Tabla de actividades truncada")
+    data['activities'] = activities
+
+    n_rounds = sum(activity['round_count'] for activity in activities)
+    dtype = _DTYPES[value_size]
+    expected = n_rounds * n_fields * dtype.itemsize
+    if len(body) - offset != expected:
+        raise WireFormatError(
+            f"Se esperaban {expected} bytes de rondas, se recibieron {len(body) - offset}"
+        )
+
+    packed = np.frombuffer(body, dtype=dtype, count=n_rounds * n_fields, offset=offset)
+    rounds = np.zeros((n_rounds, len(ROUND_FIELDS)))
+    width = min(n_fields, len(ROUND_FIELDS))
+    rounds[:, :width] = packed.reshape(n_rounds, n_fields)[:, :width]
+    return data, rounds
+
+
+def rounds_to_records(rounds: np.ndarray):
+    """Filas de la matriz de rondas como dicts (formato JSON de cada ronda)"""
+    columns = {field: rounds[:, i].tolist() for i, field in enumerate(ROUND_FIELDS)}
+    for field in _INTEGER_FIELDS:
+        columns[field] = [int(value) for value in columns[field]]
+    return [dict(zip(ROUND_FIELDS, values)) for values in zip(*(columns[f] for f in ROUND_FIELDS))]
@@ -0,0 +1,474 @@
+# ==============================================
+#  BENCHMARKS DE RENDIMIENTO - BACKEND ML
+# ==============================================
+"""
+Mide la latencia de las rutas calientes del backend.
+
+Uso:
+    python benchmark.py inference [--repeat 200]
+    python benchmark.py microbatch [--repeat 200] [--concurrency 16]
+    python benchmark.py trees [--repeat 200]
+    python benchmark.py coldstart [--repeat 200]
+    python benchmark.py preprocess [--repeat 200]
+    python benchmark.py features [--repeat 200]
+    python benchmark.py wire [--repeat 200]
+    python benchmark.py db [--repeat 200] [--database-uri sqlite://]
+    python benchmark.py log [--repeat 200]
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def _sample_payload(n_rounds=48, seed=0):
+    """Genera un payload de /api/activities/rounds/evaluate sintético"""
+    rng = np.random.default_rng(seed)
+    rounds = []
+    for _ in range(n_rounds):
+        clicks = int(rng.integers(1, 12))
+        hits = int(rng.integers(0, clicks + 1))
+        misses = clicks - hits
+        rounds.append({
+            'clicks': clicks,
+            'hits': hits,
+            'misses': misses,
+            'score': hits,
+            'accuracy': hits / clicks,
+            'missrate': misses / clicks
+        })
+    return {
+        'user': {'gender': 'Male', 'age': 9, 'native_lang': True, 'other_lang': False},
+        'activities': [{'name': 'screening_test', 'rounds': rounds}]
+    }
+
+
+def _measure(fn, repeat, warmup=5):
+    """Ejecuta fn `repeat` veces y retorna las latencias en milisegundos"""
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings[i] = (time.perf_counter() - start) * 1000.0
+    return timings
+
+
+def _report(name, timings, unit='ms'):
+    print(
+        f"  {name:<32} mean={timings.mean():8.3f} {unit}  "
+        f"p50={np.percentile(timings, 50):8.3f} {unit}  "
+        f"p99={np.percentile(timings, 99):8.3f} {unit}"
+    )
+
+
+def bench_inference(args):
+    """Inferencia por request: ruta anterior (3 llamadas) vs primitiva fusionada"""
+    from app.models.model_manager import ModelManager
+    from app.services.feature_extractor import FeatureExtractor
+
+    manager = ModelManager()
+    features = FeatureExtractor().combine_all_features(_sample_payload())
+    X_scaled = manager.scaler.transform(np.asarray(features, dtype=np.float64).reshape(1, -1))
+
+    def legacy():
+        manager.model.predict(X_scaled)[0]
+        manager.model.predict_proba(X_scaled)[0][1]
+        max(manager.model.predict_proba(X_scaled)[0])
+
+    def fused():
+        manager._infer(X_scaled)
+
+    print(f"Inferencia de 1 fila ({args.repeat} repeticiones)")
+    legacy_t = _measure(legacy, args.repeat)
+    fused_t = _measure(fused, args.repeat)
+    _report("predict + 2x predict_proba", legacy_t)
+    _report("_infer (fusionada)", fused_t)
+    print(f"  Speedup (media): {legacy_t.mean() / fused_t.mean():.2f}x")
+
+
+def _run_concurrent(fn, concurrency, per_thread):
+    """Ejecuta fn desde varios hilos; retorna (latencias ms, segundos totales)"""
+    timings = [[] for _ in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def client(slot):
+        barrier.wait()
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            fn()
+            timings[slot].append((time.perf_counter() - start) * 1000.0)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return np.concatenate([np.asarray(t) for t in timings]), time.perf_counter() - start
+
+
+def bench_microbatch(args):
+    """Clientes concurrentes: una inferencia por request vs micro-batching"""
+    from app.config import Config
+    from app.models.model_manager import ModelManager
+    from app.services.feature_extractor import FeatureExtractor
+    from app.services.micro_batcher import MicroBatcher
+
+    manager = ModelManager()
+    row = np.asarray(FeatureExtractor().combine_all_features(_sample_payload()), dtype=np.float64)
+    batcher = MicroBatcher(
+        manager.predict_batch,
+        n_features=row.size,
+        window_ms=Config.MICROBATCH_WINDOW_MS,
+        max_batch_size=Config.MICROBATCH_MAX_SIZE
+    )
+    per_thread = max(1, args.repeat // args.concurrency)
+    total = per_thread * args.concurrency
+
+    print(f"{args.concurrency} clientes concurrentes, {total} requests")
+    for name, fn in [
+        ("1 inferencia por request", lambda: manager.predict_batch(row.reshape(1, -1))),
+        ("micro-batching", lambda: batcher.predict(row)),
+    ]:
+        timings, elapsed = _run_concurrent(fn, args.concurrency, per_thread)
+        _report(name, timings)
+        print(f"  {'':<32} throughput={total / elapsed:8.1f} req/s")
+
+    stats = batcher.stats()
+    print(f"  Lote medio: {stats['avg_batch_size']:.1f}  "
+          f"espera media en cola: {stats['avg_queue_wait_ms']:.2f} ms")
+
+
+def bench_trees(args):
+    """Ensemble calibrado: sklearn/XGBoost vs runtime de arrays planos"""
+    import joblib
+    from app.config import Config
+    from app.models.tree_runtime import FlatTreeEnsemble
+
+    model = joblib.load(Config.MODEL_PATH)
+    start = time.perf_counter()
+    flat = FlatTreeEnsemble.from_model(model)
+    print(f"Exportación: {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{len(flat.tree_root)} árboles, {flat.node_feature.size} nodos")
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(10000, model.n_features_in_))
+    X[rng.random(X.shape) < 0.05] = np.nan
+
+    diff = np.abs(model.predict_proba(X) - flat.predict_proba(X))
+    print(f"Equivalencia (10000 filas): max |dif| = {diff.max():.3e}, "
+          f"idénticas = {(diff == 0).all(axis=1).mean():.2%}")
+
+    for rows in (1, 100, 10000):
+        batch = X[:rows]
+        repeat = max(3, args.repeat // rows)
+        print(f"Lote de {rows} filas ({repeat} repeticiones)")
+        sklearn_t = _measure(lambda: model.predict_proba(batch), repeat, warmup=1)
+        flat_t = _measure(lambda: flat.predict_proba(batch), repeat, warmup=1)
+        _report("CalibratedClassifierCV", sklearn_t)
+        _report("FlatTreeEnsemble", flat_t)
+        print(f"  Speedup (media): {sklearn_t.mean() / flat_t.mean():.2f}x")
+
+
+_COLDSTART_PICKLES = """
+import time
+start = time.perf_counter()
+import joblib
+from app.config import Config
+model = joblib.load(Config.MODEL_PATH)
+imputer = joblib.load(Config.IMPUTER_PATH)
+scaler = joblib.load(Config.SCALER_PATH)
+print(time.perf_counter() - start)
+"""
+
+_COLDSTART_BUNDLE = """
+import time
+start = time.perf_counter()
+from app.config import Config
+from app.models.model_bundle import ModelBundle
+bundle = ModelBundle.load(Config.MODEL_BUNDLE_PATH)
+print(time.perf_counter() - start)
+"""
+
+
+def bench_coldstart(args):
+    """Carga de artefactos en un proceso nuevo: pickles de joblib vs bundle mapeado"""
+    import subprocess
+    import sys
+    from app.config import Config
+
+    if not os.path.exists(Config.MODEL_BUNDLE_PATH):
+        print(f"No existe {Config.MODEL_BUNDLE_PATH}; generarlo con: python export_bundle.py")
+        return
+
+    def run(code):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return float(output.stdout.strip().splitlines()[-1]) * 1000.0
+
+    repeat = max(3, args.repeat // 40)
+    print(f"Carga en proceso nuevo ({repeat} repeticiones, incluye imports)")
+    _report("joblib (modelo+imputer+scaler)", np.array([run(_COLDSTART_PICKLES) for _ in range(repeat)]))
+    _report("ModelBundle (np.memmap)", np.array([run(_COLDSTART_BUNDLE) for _ in range(repeat)]))
+
+
+def bench_preprocess(args):
+    """Preprocesamiento: imputer + scaler de sklearn vs etapa fusionada"""
+    import warnings
+    from app.config import Config
+    from app.models.model_registry import load_artifacts
+    from app.models.temporal_features import compute_temporal_features
+
+    # Los objetos de sklearn se ajustaron con DataFrames; aquí se les pasan arrays
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    artifacts = load_artifacts(Config.MODEL_PATH, Config.IMPUTER_PATH,
+                               Config.SCALER_PATH, Config.INFO_PATH)
+    schema, fused = artifacts.schema, artifacts.preprocessor
+
+    def sklearn_preprocess(batch):
+        """Ruta anterior: imputer de sklearn + features temporales (sin scaling)"""
+        X_imputed = artifacts.imputer.transform(batch)
+        X_full = np.zeros((len(batch), schema.n_features))
+        X_full[:, schema.base_index] = X_imputed
+        groups = schema.base_temporal_index
+        derived = compute_temporal_features(
+            X_imputed[:, groups['Accuracy']], X_imputed[:, groups['Clicks']],
+            X_imputed[:, groups['Hits']], X_imputed[:, groups['Misses']]
+        )
+        present = schema.derived_index >= 0
+        X_full[:, schema.derived_index[present]] = derived[:, present]
+        return X_full
+
+    rng = np.random.default_rng(0)
+    statistics = np.asarray(artifacts.imputer.statistics_, dtype=np.float64)
+    X_base = statistics * rng.uniform(0.5, 1.5, size=(1000, schema.n_base))
+    X_base[rng.random(X_base.shape) < 0.1] = np.nan
+    X_full = artifacts.scaler.transform(sklearn_preprocess(X_base))
+    X_full = X_full * artifacts.scaler.scale_ + artifacts.scaler.mean_
+
+    def sklearn_base(batch):
+        return artifacts.scaler.transform(sklearn_preprocess(batch))
+
+    identical = (np.array_equal(sklearn_base(X_base), fused.transform_base(X_base)) and
+                 np.array_equal(artifacts.scaler.transform(X_full), fused.scale(X_full)))
+    print(f"Salidas idénticas bit a bit: {identical}")
+
+    for rows in (1, 1000):
+        base, full = X_base[:rows], X_full[:rows]
+        repeat = max(3, args.repeat // max(1, rows // 100))
+        print(f"Lote de {rows} filas ({repeat} repeticiones)")
+        _report("imputer+features+scaler", _measure(lambda: sklearn_base(base), repeat))
+        _report("transform_base (fusionada)", _measure(lambda: fused.transform_base(base), repeat))
+        _report("scaler.transform", _measure(lambda: artifacts.scaler.transform(full), repeat))
+        _report("scale (fusionada)", _measure(lambda: fused.scale(full), repeat))
+
+
+def bench_features(args):
+    """Extracción de features: combine_all_features en un loop vs combine_many"""
+    from app.services.feature_extractor import FeatureExtractor
+
+    extractor = FeatureExtractor()
+    payloads = [_sample_payload(n_rounds=(20, 32, 48)[i % 3], seed=i) for i in range(10000)]
+
+    matrix = extractor.combine_many(payloads)
+    loop = np.array([extractor.combine_all_features(p) for p in payloads])
+    print(f"Equivalencia ({len(payloads)} sesiones): max |dif| = {np.abs(matrix - loop).max():.3e}")
+
+    print(f"Sesión individual ({args.repeat} repeticiones)")
+    _report("combine_all_features", _measure(lambda: extractor.combine_all_features(payloads[2]), args.repeat))
+
+    repeat = max(3, args.repeat // 40)
+    print(f"{len(payloads)} sesiones ({repeat} repeticiones)")
+    loop_t = _measure(lambda: [extractor.combine_all_features(p) for p in payloads], repeat, warmup=1)
+    many_t = _measure(lambda: extractor.combine_many(payloads), repeat, warmup=1)
+    _report("loop de combine_all_features", loop_t)
+    _report("combine_many", many_t)
+    print(f"  Speedup (media): {loop_t.mean() / many_t.mean():.2f}x")
+
+
+def bench_wire(args):
+    """Cuerpo de /api/activities/rounds/evaluate: JSON vs formato binario"""
+    import json
+    from app.services.feature_extractor import FeatureExtractor
+    from app.utils import wire_format
+
+    extractor = FeatureExtractor()
+    payload = _sample_payload()
+    json_body = json.dumps(payload).encode('utf-8')
+    binary_body = wire_format.encode_rounds(payload)
+
+    def from_json():
+        extractor.combine_all_features(json.loads(json_body))
+
+    def from_binary():
+        data, rounds = wire_format.decode_rounds(binary_body)
+        extractor.combine_rounds(data['user'], rounds)
+
+    print(f"Payload de 48 rondas: JSON {len(json_body)} bytes, binario {len(binary_body)} bytes "
+          f"({len(binary_body) / len(json_body):.0%})")
+    print(f"Parseo + features ({args.repeat} repeticiones)")
+    json_t = _measure(from_json, args.repeat)
+    binary_t = _measure(from_binary, args.repeat)
+    _report("json.loads + combine_all_features", json_t)
+    _report("decode_rounds + combine_rounds", binary_t)
+    print(f"  Speedup (media): {json_t.mean() / binary_t.mean():.2f}x")
+
+
+def _sample_result(seed, n_rounds=48):
+    """Resultado de evaluación como lo arma /api/activities/rounds/evaluate"""
+    rounds = _sample_payload(n_rounds=n_rounds, seed=seed)['activities'][0]['rounds']
+    return {
+        'user_id': f'bench-{seed % 10}',
+        'user_info': {'name': 'Benchmark', 'age': 9, 'gender': 'Male'},
+        'activity_id': 'screening_test',
+        'activity_name': 'Prueba de Cribado',
+        'result': 'NO',
+        'probability': 12.5,
+        'confidence': 75.0,
+        'risk_level': 'Bajo',
+        'details': {'total_rounds': n_rounds},
+        'rounds': [
+            {'round_number': i + 1, 'clicks': r['clicks'], 'hits': r['hits'], 'misses': r['misses'],
+             'score': r['score'], 'attempts': 1, 'time_seconds': 2.5}
+            for i, r in enumerate(rounds)
+        ]
+    }
+
+
+def bench_db(args):
+    """
+    Persistencia de resultados: un ActivityRound ORM por ronda vs INSERT multi-fila
+
+    Inserta filas de prueba: con --database-uri usar una base desechable
+    (p. ej. mysql+pymysql://root:@localhost:3306/dyslexia_bench)
+    """
+    from flask import Flask
+    from sqlalchemy import event
+    from app.models.database import db, ActivityRound
+    from app.services.database_service import DatabaseService
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    def orm_reference(results_data):
+        """Camino anterior: un objeto ActivityRound y un add() por ronda"""
+        for data in results_data:
+            round_rows = []
+            DatabaseService._add_test_result(data, round_rows)
+            for row in round_rows:
+                db.session.add(ActivityRound(**row))
+        db.session.commit()
+
+    with app.app_context():
+        db.create_all()
+        statements = [0]
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements[0] += 1
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+        seeds = iter(range(10 ** 9))
+        print(f"Resultados de 48 rondas en {db.engine.url.render_as_string(hide_password=True)}")
+        for batch_size in (1, 50):
+            repeat = max(3, args.repeat // batch_size)
+            print(f"Lotes de {batch_size} resultado(s) ({repeat} repeticiones)")
+            for name, write in (("ORM por ronda (anterior)", orm_reference),
+                                ("executemany", DatabaseService.create_test_results)):
+                statements[0] = 0
+                timings = _measure(
+                    lambda: write([_sample_result(next(seeds)) for _ in range(batch_size)]),
+                    repeat, warmup=0
+                ) / batch_size
+                _report(name, timings)
+                print(f"  {'':<32} {statements[0] / (repeat * batch_size):.1f} sentencias por evaluación")
+
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def bench_log(args):
+    """Costo de logging por evaluación: prints anteriores vs logging estructurado"""
+    import contextlib
+    from app.utils.log import configure_logging, get_logger, logging_stats
+
+    payload = _sample_payload()
+    devnull = open(os.devnull, 'w')
+
+    def prints_reference():
+        """Los prints que hacía una evaluación (api.py + ModelManager.predict)"""
+        with contextlib.redirect_stdout(devnull):
+            print("[RECV] Datos recibidos en /activities/rounds/evaluate")
+            print(f"   Data es None: {payload is None}")
+            print(f"   Keys en data: {list(payload.keys())}")
+            print(f"   User: {payload['user']}")
+            print(f"   Activities: {len(payload['activities'])} actividades")
+            for i, act in enumerate(payload['activities']):
+                print(f"     [{i}] {act.get('name', 'SIN_NOMBRE')}: {len(act['rounds'])} rondas")
+            print(f"🔍 Predicción - Features esperadas: {205}")
+            print(f"🔍 Predicción - Features recibidas: {205}")
+            print(f"🔍 Array shape antes de scaler: {(1, 205)}")
+            print(f"🔍 Array shape después de scaler: {(1, 205)}")
+            print(f"✅ Predicción exitosa: {0}, probabilidad: {0.1234:.2%}")
+
+    log = get_logger('benchmark')
+
+    def structured():
+        """Los eventos que registra ahora una evaluación"""
+        if log.payloads_enabled:
+            log.debug("Evaluación recibida", user=payload['user'],
+                      activities={a['name']: len(a['rounds']) for a in payload['activities']})
+        log.debug("Predicción", prediction=0, probability=0.1234)
+        log.debug("Evaluación completada", sampled=True, endpoint='rounds/evaluate',
+                  risk_level='Bajo', rounds=48, binary=False, duration_ms=1.0)
+
+    repeat = args.repeat * 10
+    print(f"Logging de una evaluación ({repeat} repeticiones, salida a {os.devnull})")
+    _report("prints (anterior)", _measure(prints_reference, repeat) * 1000.0, unit='µs')
+    for name, config in (
+        ("INFO", {'LOG_LEVEL': 'INFO'}),
+        ("DEBUG", {'LOG_LEVEL': 'DEBUG'}),
+        ("DEBUG, muestreo 0.1", {'LOG_LEVEL': 'DEBUG', 'LOG_SAMPLE_RATE': 0.1}),
+        ("DEBUG + payloads", {'LOG_LEVEL': 'DEBUG', 'LOG_DEBUG_PAYLOADS': True}),
+    ):
+        handler = configure_logging(config)
+        handler.target.setStream(devnull)
+        _report(f"logging {name}", _measure(structured, repeat) * 1000.0, unit='µs')
+    stats = logging_stats()
+    print(f"  Registros emitidos: {stats['emitted']}, descartados (cola llena): {stats['dropped']}")
+    handler.stop()
+
+
+BENCHMARKS = {
+    'inference': bench_inference,
+    'microbatch': bench_microbatch,
+    'trees': bench_trees,
+    'coldstart': bench_coldstart,
+    'preprocess': bench_preprocess,
+    'features': bench_features,
+    'wire': bench_wire,
+    'db': bench_db,
+    'log': bench_log,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del backend de dislexia")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--database-uri', default='sqlite://',
+                        help="Base de datos para el benchmark db (por defecto, SQLite en memoria)")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
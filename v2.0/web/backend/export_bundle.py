@@ -0,0 +1,69 @@
+# ==============================================
+#  EXPORTAR BUNDLE DEL MODELO
+# ==============================================
+"""
+Convierte los artefactos entrenados (modelo_dislexia.pkl, imputer.pkl,
+scaler.pkl y modelo_info.json) en un único bundle mapeable en memoria que
+ModelManager carga sin pickle.
+
+Uso:
+    python export_bundle.py [--output pkl/modelo_dislexia.bundle]
+"""
+
+import argparse
+import json
+import os
+
+import joblib
+import numpy as np
+
+from app.config import Config
+from app.models.model_bundle import ModelBundle, build_bundle_arrays, file_sha256, write_bundle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar el modelo a un bundle mapeable")
+    parser.add_argument('--output', default=Config.MODEL_BUNDLE_PATH)
+    args = parser.parse_args()
+
+    model = joblib.load(Config.MODEL_PATH)
+    imputer = joblib.load(Config.IMPUTER_PATH)
+    scaler = joblib.load(Config.SCALER_PATH)
+    with open(Config.INFO_PATH, 'r') as f:
+        model_info = json.load(f)
+
+    # Huellas de los archivos de origen: el backend no usa un bundle que no
+    # corresponda a los pickles y modelo_info.json presentes
+    sources = {name: file_sha256(path) for name, path in (
+        ('model', Config.MODEL_PATH), ('imputer', Config.IMPUTER_PATH),
+        ('scaler', Config.SCALER_PATH), ('info', Config.INFO_PATH)
+    )}
+    write_bundle(args.output, build_bundle_arrays(model, imputer, scaler), model_info, sources)
+    bundle = ModelBundle.load(args.output)
+    print(f"[OK] Bundle escrito: {args.output} ({os.path.getsize(args.output) / 1024:.1f} KB, "
+          f"{len(bundle.model.tree_root)} árboles)")
+
+    # Verificar contra los objetos sklearn con datos sintéticos
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, len(imputer.statistics_))) * np.nanstd(imputer.statistics_) + imputer.statistics_
+    X[rng.random(X.shape) < 0.1] = np.nan
+
+    X_imputed = imputer.transform(X)
+    imputer_diff = np.abs(bundle.imputer.transform(X) - X_imputed).max()
+
+    schema = bundle.schema
+    X_full = np.zeros((len(X), schema.n_features))
+    X_full[:, schema.base_index] = X_imputed
+    scaler_diff = np.abs(bundle.scaler.transform(X_full) - scaler.transform(X_full)).max()
+
+    X_scaled = scaler.transform(X_full)
+    proba_diff = np.abs(bundle.model.predict_proba(X_scaled) - model.predict_proba(X_scaled)).max()
+
+    print(f"[OK] Máx. diferencia imputer={imputer_diff:.2e} scaler={scaler_diff:.2e} "
+          f"probabilidad={proba_diff:.2e}")
+    if max(imputer_diff, scaler_diff) > 0 or proba_diff > 1e-6:
+        print("[WARN] El bundle no reproduce exactamente los artefactos originales")
+
+
+if __name__ == '__main__':
+    main()
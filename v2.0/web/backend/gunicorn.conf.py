@@ -0,0 +1,149 @@
+# ==============================================
+#  SERVIDOR DE PRODUCCIÓN - GUNICORN
+# ==============================================
+"""
+Configuración de gunicorn para producción (pre-fork, varios workers con hilos).
+
+    gunicorn -c gunicorn.conf.py run:app
+
+El master importa la app (preload_app) y con ella carga el modelo antes de
+hacer fork, así que las páginas de solo lectura del modelo se comparten entre
+workers por copy-on-write (con el bundle, además, vía np.memmap). gc.freeze()
+saca esos objetos de las pasadas del recolector para que no se copien.
+
+Variables de entorno:
+    PORT                     Puerto (8080)
+    WEB_CONCURRENCY          Workers (por defecto, uno por CPU)
+    WEB_THREADS              Hilos por worker (4)
+    OMP_NUM_THREADS          Hilos de OpenMP por worker para XGBoost
+                             (por defecto, CPUs / workers)
+    WEB_MAX_REQUESTS         Requests antes de reciclar un worker (2000, 0 = nunca)
+    WEB_MAX_REQUESTS_JITTER  Aleatoriedad del reciclado (10% de WEB_MAX_REQUESTS)
+    WEB_TIMEOUT              Segundos sin respuesta antes de reiniciar un worker (60)
+    WEB_GRACEFUL_TIMEOUT     Segundos para terminar los requests en curso (30)
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_MAX_CONNECTIONS
+                             Pool de conexiones por worker (ver app/config.py)
+    METRICS_MULTIPROC_DIR    Directorio donde los workers publican sus métricas
+                             para sumarlas en GET /api/metrics (por defecto,
+                             uno temporal por servidor)
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+cpu_count = os.cpu_count() or 1
+
+workers = int(os.getenv('WEB_CONCURRENCY', cpu_count))
+threads = int(os.getenv('WEB_THREADS', 4))
+if workers < 1 or threads < 1:
+    raise ValueError("WEB_CONCURRENCY y WEB_THREADS deben ser >= 1")
+
+# Hilos de OpenMP/BLAS por worker: deben fijarse antes de importar numpy y
+# xgboost (el master importa la app después de leer este archivo). Con más
+# workers × hilos de OpenMP que CPUs, los workers se quitan CPU entre sí.
+if 'OMP_NUM_THREADS' not in os.environ:
+    os.environ['OMP_NUM_THREADS'] = str(max(1, cpu_count // workers))
+omp_threads = int(os.environ['OMP_NUM_THREADS'])
+for variable in ('OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(variable, os.environ['OMP_NUM_THREADS'])
+
+# Valores efectivos, visibles para la app en cada worker
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['WEB_THREADS'] = str(threads)
+
+# Métricas sumadas entre workers: cada scrape llega a un worker cualquiera
+_default_metrics_dir = os.path.join(tempfile.gettempdir(), f"dyslexia-metrics-{os.getpid()}")
+os.environ.setdefault('METRICS_MULTIPROC_DIR', _default_metrics_dir)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+worker_class = 'gthread'
+preload_app = True
+
+# Reciclado gradual: cada worker termina sus requests y el master crea otro
+# desde la copia precargada (sin volver a leer el modelo)
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', max_requests // 10))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Master arrancando: avisar si la combinación de workers e hilos sobresuscribe la máquina"""
+    if workers * omp_threads > cpu_count:
+        server.log.warning(f"[WARN] {workers} workers × OMP_NUM_THREADS={omp_threads} superan las "
+                           f"{cpu_count} CPUs: la inferencia de XGBoost competirá por CPU")
+    if workers > 2 * cpu_count:
+        server.log.warning(f"[WARN] WEB_CONCURRENCY={workers} es más del doble de CPUs ({cpu_count}); "
+                           f"cada worker mantiene su propio pool de conexiones a la BD")
+
+
+def when_ready(server):
+    """Master listo, antes de crear los workers"""
+    from app.config import Config
+    from app.routes.api import prediction_service, result_writer
+
+    # Cada worker abre su propio pool de conexiones a MySQL
+    connections = workers * (Config.DB_POOL_SIZE + Config.DB_MAX_OVERFLOW)
+    if connections > Config.DB_MAX_CONNECTIONS:
+        server.log.warning(f"[WARN] {workers} workers × (DB_POOL_SIZE={Config.DB_POOL_SIZE} + "
+                           f"DB_MAX_OVERFLOW={Config.DB_MAX_OVERFLOW}) = {connections} conexiones "
+                           f"superan DB_MAX_CONNECTIONS={Config.DB_MAX_CONNECTIONS}")
+
+    # Métricas de una ejecución anterior en el mismo directorio
+    from app.utils.metrics import MultiprocessStore
+    MultiprocessStore.clear(Config.METRICS_MULTIPROC_DIR)
+
+    # El watcher y el escritor diferido corren en cada worker, no en el
+    # master: un hilo activo al hacer fork puede dejar locks tomados en el hijo
+    prediction_service.model_manager.registry.stop_watcher()
+    if result_writer is not None:
+        result_writer.stop_worker()
+
+    # Los objetos cargados hasta aquí (modelo incluido) no vuelven a ser
+    # recorridos por el GC, así que sus páginas siguen compartidas
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"[OK] Modelo precargado; {workers} workers × {threads} hilos, "
+                    f"OMP_NUM_THREADS={omp_threads}")
+
+
+def post_fork(server, worker):
+    """Worker recién creado: conexiones y hilos propios"""
+    from app.models.database import db
+    from app.routes.api import prediction_service, result_writer
+    from app.utils.metrics import METRICS
+    from run import app
+
+    # Las conexiones heredadas del master no se comparten entre procesos
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    prediction_service.after_fork()
+    if result_writer is not None:
+        # Reintentar el archivo de derrame sin esperar a la primera evaluación
+        result_writer.bind(app)
+    METRICS.after_fork()
+
+
+def worker_exit(server, worker):
+    """Worker terminando (reciclado o apagado): escribir los resultados pendientes"""
+    from app.config import Config
+    from app.routes.api import result_writer
+    from app.utils.log import stop_logging
+    from app.utils.metrics import METRICS
+
+    if result_writer is not None:
+        result_writer.close(Config.WRITE_BEHIND_DRAIN_TIMEOUT)
+    METRICS.close()
+    stop_logging()
+
+
+def on_exit(server):
+    """Master terminando: borrar el directorio temporal de métricas"""
+    if os.environ.get('METRICS_MULTIPROC_DIR') == _default_metrics_dir:
+        shutil.rmtree(_default_metrics_dir, ignore_errors=True)
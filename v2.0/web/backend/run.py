@@ -1,6 +1,8 @@
 # ==============================================
 #  PUNTO DE ENTRADA - BACKEND FLASK
 # ==============================================
+# python run.py levanta el servidor de desarrollo de Flask (un proceso).
+# En producción: gunicorn -c gunicorn.conf.py run:app
 
 import os
 from app import create_app
@@ -0,0 +1,222 @@
+# ==============================================
+#  SCORING MASIVO OFFLINE - CSV FORMATO DYT
+# ==============================================
+"""
+Evalúa exportaciones con el formato de Dyt-desktop.csv / Dyt-tablet.csv
+(separadas por ';') fuera del servidor web, con el mismo preprocesamiento que
+DislexiaPredictor (imputer, features temporales, scaler y modelo calibrado).
+
+El archivo se divide en rangos de bytes alineados a líneas; cada worker de un
+pool de procesos carga el modelo una sola vez, parsea su rango y lo evalúa, así
+que tanto el parseo como la inferencia usan todos los núcleos. Los resultados se
+escriben en el orden del archivo de entrada.
+
+Uso:
+    python score_csv.py ../../dataset/Dyt-desktop.csv -o resultados.csv
+    python score_csv.py sesiones.csv -o resultados.parquet --workers 8 --keep Dyslexia
+
+Requiere que los campos no contengan saltos de línea entre comillas (el formato
+Dyt es numérico). La salida Parquet necesita pyarrow.
+"""
+
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+
+# Codificación de columnas categóricas (igual que py/modelo_dislexia.py)
+CATEGORICAL_COLUMNS = {
+    'Gender': {'Male': 1, 'Female': 0},
+    'Nativelang': {'Yes': 1, 'No': 0},
+    'Otherlang': {'Yes': 1, 'No': 0},
+}
+
+# Columnas de DislexiaPredictor.predict_array que se escriben en la salida
+OUTPUT_COLUMNS = (
+    'prediccion',
+    'probabilidad_dislexia',
+    'probabilidad_normal',
+    'probabilidad_modelo',
+    'nivel_riesgo',
+    'confianza',
+    'global_accuracy',
+)
+
+_worker = {}
+
+
+def _read_header(path, sep):
+    with open(path, 'rb') as f:
+        line = f.readline()
+        data_start = f.tell()
+    columns = pd.read_csv(io.BytesIO(line), sep=sep, nrows=0, encoding='utf-8-sig').columns
+    return list(columns), data_start
+
+
+def _split_ranges(path, data_start, chunk_bytes):
+    """Rangos [inicio, fin) de bytes que terminan en un fin de línea"""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        start = data_start
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def encode_frame(df, base_names):
+    """Bloque del CSV → matriz (N, n_base) float64 en el orden del esquema"""
+    columns = {}
+    for name in base_names:
+        if name not in df:
+            columns[name] = np.full(len(df), np.nan)
+        elif name in CATEGORICAL_COLUMNS:
+            columns[name] = df[name].map(CATEGORICAL_COLUMNS[name]).to_numpy(dtype=np.float64)
+        elif df[name].dtype == object:
+            columns[name] = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            columns[name] = df[name].to_numpy(dtype=np.float64)
+
+    X_base = np.empty((len(df), len(base_names)))
+    for j, name in enumerate(base_names):
+        X_base[:, j] = columns[name]
+    return X_base
+
+
+def _init_worker(args, columns):
+    """Cargar el predictor una vez por proceso"""
+    from app.models.model_registry import ModelRegistry, load_artifacts
+    from app.services.predictor import DislexiaPredictor
+
+    bundle_path = args.bundle if args.bundle and os.path.exists(args.bundle) else None
+    registry = ModelRegistry(loader=lambda: load_artifacts(
+        Config.MODEL_PATH, Config.IMPUTER_PATH, Config.SCALER_PATH, Config.INFO_PATH,
+        bundle_path=bundle_path
+    ))
+    _worker['predictor'] = DislexiaPredictor(registry=registry)
+    _worker['path'] = args.input
+    _worker['sep'] = args.sep
+    _worker['columns'] = columns
+    _worker['keep'] = args.keep
+
+
+def _score_range(byte_range):
+    """Parsear y evaluar un rango del archivo en el worker"""
+    start, end = byte_range
+    with open(_worker['path'], 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    df = pd.read_csv(io.BytesIO(data), sep=_worker['sep'], header=None, names=_worker['columns'])
+    predictor = _worker['predictor']
+    X_base = encode_frame(df, predictor.schema.base_names)
+    result = predictor.predict_array(X_base)
+
+    output = {name: result[name] for name in OUTPUT_COLUMNS}
+    for name in _worker['keep']:
+        output[name] = df[name].to_numpy() if name in df else np.full(len(df), None)
+    return len(df), end - start, output
+
+
+class _Writer:
+    """Salida incremental en CSV o Parquet"""
+
+    def __init__(self, path, sep):
+        self.path = path
+        self.sep = sep
+        self.parquet = path.lower().endswith('.parquet')
+        self._writer = None
+        self._first = True
+
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise SystemExit("[ERROR] La salida Parquet requiere pyarrow (pip install pyarrow)")
+        else:
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self._file, sep=self.sep, header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self.parquet:
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring masivo de CSV con formato Dyt")
+    parser.add_argument('input', help="CSV separado por ';' con el formato de Dyt-desktop.csv")
+    parser.add_argument('-o', '--output', required=True, help="Archivo de salida (.csv o .parquet)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-mb', type=float, default=8.0, help="Tamaño de cada bloque en MB")
+    parser.add_argument('--sep', default=';')
+    parser.add_argument('--keep', nargs='*', default=[],
+                        help="Columnas de entrada que se copian a la salida (p. ej. Dyslexia)")
+    parser.add_argument('--bundle', default=Config.MODEL_BUNDLE_PATH,
+                        help="Bundle del modelo (si no existe se usan los pickles)")
+    args = parser.parse_args()
+
+    # Un hilo por worker: el paralelismo viene del pool de procesos
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    columns, data_start = _read_header(args.input, args.sep)
+    ranges = _split_ranges(args.input, data_start, int(args.chunk_mb * 1024 * 1024))
+    total_bytes = sum(end - start for start, end in ranges)
+    print(f"[INFO] {args.input}: {total_bytes / 1024 / 1024:.1f} MB en {len(ranges)} bloques, "
+          f"{args.workers} workers")
+
+    writer = _Writer(args.output, args.sep)
+    rows = done_bytes = 0
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(args, columns)) as executor:
+            for i, (n_rows, n_bytes, output) in enumerate(executor.map(_score_range, ranges), 1):
+                frame = pd.DataFrame({'row': np.arange(rows, rows + n_rows)})
+                for name in args.keep:
+                    frame[name] = output[name]
+                for name in OUTPUT_COLUMNS:
+                    frame[name] = output[name]
+                writer.write(frame)
+
+                rows += n_rows
+                done_bytes += n_bytes
+                elapsed = time.perf_counter() - start_time
+                print(f"  [{i}/{len(ranges)}] {done_bytes / total_bytes:6.1%}  {rows:>10,} filas  "
+                      f"{rows / elapsed:>10,.0f} filas/s", flush=True)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"[OK] {rows:,} filas evaluadas en {elapsed:.1f}s "
+          f"({rows / elapsed if elapsed else 0:,.0f} filas/s) → {args.output}")
+
+
+if __name__ == '__main__':
+    main()